@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Try to import decouple, fallback to os.environ if not available
 try:
     from decouple import config, Csv
@@ -77,6 +79,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware
+    'core.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
 ]
 
@@ -100,7 +104,7 @@ ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.timing.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -140,6 +144,37 @@ else:
     }
 
 
+# Cache
+# Dashboard fragments, ICS ETags and the version keys of the in-process
+# snapshots (catalog, config, directory, evaluation years, matching) live here.
+# A write in one process only reaches the others through this cache, so every
+# worker and every cron command must share it: Redis at REDIS_URL. The local
+# memory fallback is per process and only fit for a single runserver.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+elif DEBUG:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'pal-cache',
+        }
+    }
+else:
+    raise ImproperlyConfigured(
+        'REDIS_URL must be set when DEBUG is off: workers and management commands '
+        'share cached data and invalidations through it'
+    )
+
+
+# Requests slower than this many milliseconds are logged with their costliest queries
+SLOW_REQUEST_MS = config('SLOW_REQUEST_MS', default=500, cast=int)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
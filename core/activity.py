@@ -0,0 +1,151 @@
+"""Per-user activity summaries read by the student and tutor dashboards
+
+Dashboards read the user's summary for the active evaluation year. Its
+counters cover that year's sessions, except the total minutes, which cover
+every session the user has had. With no active year there is nothing to
+scope to, so the summary read (``evaluation_year=None``) covers all sessions.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Exists, Min, OuterRef, Q, Sum
+from django.utils import timezone
+
+from .evaluation_years import active_year
+
+
+def period_starts(now):
+    """Aware datetimes for the start of this week, next week, this month and next month"""
+    today = timezone.localdate(now)
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+
+    def at_midnight(day):
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    return (at_midnight(week_start), at_midnight(week_start + timedelta(days=7)),
+            at_midnight(month_start), at_midnight(next_month))
+
+
+def current_summary_year():
+    """Evaluation year dashboards summarize (the active one, or None for all sessions if none is active)"""
+    year = active_year()
+    return year.id if year else None
+
+
+def _summary_years(evaluation_year_ids):
+    # The summary dashboards read holds lifetime totals, so any session change concerns it too
+    return set(evaluation_year_ids) | {current_summary_year()}
+
+
+def _year_filter(evaluation_year_ids):
+    years = set(evaluation_year_ids)
+    condition = Q(evaluation_year_id__in=years - {None})
+    if None in years:
+        condition |= Q(evaluation_year__isnull=True)
+    return condition
+
+
+def compute_activity(user_id, evaluation_year_id, now=None):
+    """Compute every summary counter for one user and evaluation year in a single query.
+
+    The ``evaluation_year_id=None`` summary covers all of the user's sessions;
+    the ``*_total_minutes`` counters always do.
+    """
+    from .models import Feedback, Session
+
+    now = now or timezone.now()
+    week_start, next_week, month_start, next_month = period_starts(now)
+
+    sessions = Session.objects.filter(Q(learner_id=user_id) | Q(tutor_id=user_id))
+    in_year = Q(evaluation_year_id=evaluation_year_id) if evaluation_year_id else Q()
+
+    as_learner = Q(learner_id=user_id) & in_year
+    as_tutor = Q(tutor_id=user_id) & in_year
+    upcoming = Q(status='Scheduled', session_date__gte=now)
+    completed = Q(status='Completed')
+    has_feedback = Exists(Feedback.objects.filter(learner_id=user_id, session=OuterRef('pk')))
+
+    stats = sessions.aggregate(
+        learner_upcoming_count=Count('id', filter=as_learner & upcoming),
+        learner_upcoming_this_week=Count('id', filter=as_learner & upcoming & Q(session_date__lt=next_week)),
+        pending_feedback_count=Count('id', filter=as_learner & completed & ~Q(has_feedback)),
+        learner_completed_count=Count('id', filter=as_learner & completed),
+        learner_minutes=Sum('duration', filter=as_learner & completed),
+        learner_month_minutes=Sum('duration', filter=as_learner & completed & Q(session_date__gte=month_start)),
+        tutor_upcoming_count=Count('id', filter=as_tutor & upcoming),
+        tutor_completed_count=Count('id', filter=as_tutor & completed),
+        tutor_minutes=Sum('duration', filter=as_tutor & completed),
+        learner_total_minutes=Sum('duration', filter=Q(learner_id=user_id) & completed),
+        tutor_total_minutes=Sum('duration', filter=Q(tutor_id=user_id) & completed),
+        next_session=Min('session_date', filter=in_year & upcoming),
+    )
+
+    # Counters depend on the clock: they must be recomputed once the next session
+    # starts or the week/month bucket changes, whichever comes first
+    next_session = stats.pop('next_session')
+    rollovers = [next_week, next_month] + ([next_session] if next_session else [])
+
+    for key in ('learner_minutes', 'learner_month_minutes', 'tutor_minutes', 'learner_total_minutes',
+                'tutor_total_minutes'):
+        stats[key] = stats[key] or 0
+    stats.update(
+        week_start=week_start.date(),
+        month_start=month_start.date(),
+        next_rollover=min(rollovers),
+    )
+    return stats
+
+
+def refresh_activity(user_ids, evaluation_year_id):
+    """Recompute the summaries of ``user_ids`` for one evaluation year"""
+    from .models import User, UserActivitySummary
+
+    # Users may be gone by the time a cascade delete commits
+    existing = User.objects.filter(pk__in=set(user_ids)).values_list('pk', flat=True)
+    now = timezone.now()
+    for user_id in existing:
+        UserActivitySummary.objects.update_or_create(
+            user_id=user_id,
+            evaluation_year_id=evaluation_year_id,
+            defaults=compute_activity(user_id, evaluation_year_id, now),
+        )
+
+
+def expire_activity(user_ids, evaluation_year_id):
+    """Mark summaries stale in one query; they are recomputed when next read (or by the --stale rebuild)"""
+    from .models import UserActivitySummary
+
+    UserActivitySummary.objects.filter(
+        _year_filter(_summary_years([evaluation_year_id])), user_id__in=set(user_ids)
+    ).update(next_rollover=timezone.now())
+
+
+def schedule_activity_refresh(user_ids, evaluation_year_ids):
+    """Refresh summaries once the current transaction commits"""
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if not user_ids:
+        return
+    for evaluation_year_id in _summary_years(evaluation_year_ids):
+        transaction.on_commit(
+            lambda year_id=evaluation_year_id: refresh_activity(user_ids, year_id)
+        )
+
+
+def get_activity_summary(user):
+    """Return the user's summary for the current evaluation year, recomputing it if stale"""
+    from .models import UserActivitySummary
+
+    now = timezone.now()
+    # Without an active year this is the summary of all the user's sessions
+    evaluation_year_id = current_summary_year()
+    summary = UserActivitySummary.objects.filter(user=user, evaluation_year_id=evaluation_year_id).first()
+
+    if summary is None or summary.next_rollover <= now:
+        summary, _ = UserActivitySummary.objects.update_or_create(
+            user=user,
+            evaluation_year_id=evaluation_year_id,
+            defaults=compute_activity(user.pk, evaluation_year_id, now),
+        )
+    return summary
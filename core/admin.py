@@ -1,10 +1,28 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Program, Year, Course, Student, TutorApplication, Session, Feedback, Config, EvaluationYear
+from django.db.models import Count
+from .models import (
+    User, Program, Year, Course, Student, StudentCourse, TutorApplication, Session, SessionSeries, Feedback,
+    Config, EvaluationYear, TopicAlias, TopicCount, CommentTermFrequency, UserActivitySummary, TutorWeeklyLoad,
+    Watermark,
+)
+from .availability import DAYS, SLOTS, available_in, slot_bit
+from .bulk import delete_feedback, set_application_status, set_session_status, set_training_completed
+from .paginator import EstimatedCountPaginator
+from .scheduling import schedule_week
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelists of tables too big to COUNT(*) on every page view"""
+    paginator = EstimatedCountPaginator
+    # Skip the second count of the unfiltered table shown next to search results
+    show_full_result_count = False
 
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     list_display = ['email', 'first_name', 'last_name', 'role', 'student_id', 'is_active']
     list_filter = ['role', 'is_active', 'created_at']
     search_fields = ['email', 'first_name', 'last_name', 'student_id']
@@ -61,6 +79,7 @@ class CourseInline(admin.TabularInline):
 class YearAdmin(admin.ModelAdmin):
     list_display = ['program', 'year_number', 'name']
     list_filter = ['program']
+    list_select_related = ['program']
     ordering = ['program', 'year_number']
     search_fields = ['name', 'program__name']
     inlines = [CourseInline]
@@ -80,9 +99,10 @@ class CourseAdmin(admin.ModelAdmin):
 
 
 @admin.register(Student)
-class StudentAdmin(admin.ModelAdmin):
+class StudentAdmin(LargeTableAdmin):
     list_display = ['user', 'program', 'year', 'has_disciplinary_warning', 'created_at']
     list_filter = ['program', 'year', 'has_disciplinary_warning']
+    list_select_related = ['user', 'program', 'year__program']
     search_fields = ['user__email', 'user__first_name', 'user__last_name', 'user__student_id']
     autocomplete_fields = ['user', 'program', 'year', 'study_year']
 
@@ -99,11 +119,51 @@ class StudentAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(StudentCourse)
+class StudentCourseAdmin(LargeTableAdmin):
+    list_display = ['student', 'course', 'program', 'year', 'created_at']
+    list_filter = ['program', 'year']
+    search_fields = ['student__user__email', 'student__user__first_name', 'student__user__last_name',
+                     'course__code']
+    list_select_related = ['student__user', 'student__program', 'student__year', 'course', 'program', 'year']
+    raw_id_fields = ['student', 'course']
+    actions = ['schedule_next_week']
+
+    @admin.action(description='Schedule sessions next week for selected enrollments')
+    def schedule_next_week(self, request, queryset):
+        schedule = schedule_week(queryset)
+        self.message_user(
+            request,
+            f'Created {schedule.created} sessions for the week of {schedule.week_start:%Y-%m-%d}; '
+            f'{len(schedule.unmatched)} enrollments left unmatched',
+        )
+
+
+class AvailabilityFilter(admin.SimpleListFilter):
+    """Tutors free in a given day and time slot, e.g. Monday evening"""
+    title = 'available'
+    parameter_name = 'available'
+
+    def lookups(self, request, model_admin):
+        return [(f'{day}-{slot}', f'{day} {slot.lower()}') for day in DAYS for slot in SLOTS]
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        day, _, slot = self.value().partition('-')
+        try:
+            mask = slot_bit(day, slot)
+        except KeyError:
+            return queryset.none()
+        return available_in(queryset, mask)
+
+
 @admin.register(TutorApplication)
 class TutorApplicationAdmin(admin.ModelAdmin):
     list_display = ['user', 'program', 'year', 'gpa', 'status', 'get_course_count', 'training_completed', 'created_at']
-    list_filter = ['status', 'program', 'training_completed', 'wants_training', 'wants_certificate']
+    list_filter = ['status', 'program', AvailabilityFilter, 'training_completed', 'wants_training', 'wants_certificate']
     search_fields = ['user__email', 'user__first_name', 'user__last_name', 'mobile']
+    list_select_related = ['user', 'program', 'year__program']
     filter_horizontal = ['courses']
     readonly_fields = ['created_at', 'updated_at', 'get_course_count']
 
@@ -134,15 +194,45 @@ class TutorApplicationAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        # One COUNT per page instead of one per row
+        return super().get_queryset(request).annotate(course_count=Count('courses'))
+
+    actions = ['approve_selected', 'reject_selected', 'mark_training_completed', 'mark_training_not_completed']
+
+    @admin.action(description='Approve selected applications')
+    def approve_selected(self, request, queryset):
+        changed = set_application_status(queryset, 'Approved')
+        self.message_user(request, f'Approved {changed} applications')
+
+    @admin.action(description='Reject selected applications')
+    def reject_selected(self, request, queryset):
+        changed = set_application_status(queryset, 'Rejected')
+        self.message_user(request, f'Rejected {changed} applications')
+
+    @admin.action(description='Mark training completed')
+    def mark_training_completed(self, request, queryset):
+        changed = set_training_completed(queryset, True)
+        self.message_user(request, f'Marked training completed for {changed} applications')
+
+    @admin.action(description='Mark training not completed')
+    def mark_training_not_completed(self, request, queryset):
+        changed = set_training_completed(queryset, False)
+        self.message_user(request, f'Marked training not completed for {changed} applications')
+
+    @admin.display(description='Courses Selected', ordering='course_count')
     def get_course_count(self, obj):
-        return obj.get_course_count()
-    get_course_count.short_description = 'Courses Selected'
+        # Not annotated on the add form
+        if not hasattr(obj, 'course_count'):
+            return obj.get_course_count() if obj.pk else 0
+        return obj.course_count
 
 
 @admin.register(Session)
-class SessionAdmin(admin.ModelAdmin):
+class SessionAdmin(LargeTableAdmin):
     list_display = ['tutor', 'learner', 'course', 'evaluation_year', 'session_date', 'duration', 'status']
     list_filter = ['status', 'evaluation_year', 'course__program']
+    list_select_related = ['tutor', 'learner', 'course', 'evaluation_year']
     search_fields = ['tutor__email', 'learner__email', 'course__name']
     date_hierarchy = 'session_date'
     autocomplete_fields = ['tutor', 'learner', 'course', 'evaluation_year']
@@ -154,16 +244,43 @@ class SessionAdmin(admin.ModelAdmin):
         ('Session Details', {
             'fields': ('course', 'evaluation_year', 'session_date', 'duration', 'status')
         }),
+        ('Series', {
+            'fields': ('series', 'occurrence_date'),
+            'classes': ('collapse',)
+        }),
         ('Notes', {
             'fields': ('notes',),
             'classes': ('collapse',)
         }),
     )
+    raw_id_fields = ['series']
+    actions = ['mark_completed', 'mark_cancelled']
+
+    @admin.action(description='Mark selected scheduled sessions completed')
+    def mark_completed(self, request, queryset):
+        changed = set_session_status(queryset, 'Completed')
+        self.message_user(request, f'Marked {changed} sessions completed')
+
+    @admin.action(description='Cancel selected scheduled sessions')
+    def mark_cancelled(self, request, queryset):
+        changed = set_session_status(queryset, 'Cancelled')
+        self.message_user(request, f'Cancelled {changed} sessions')
+
+
+@admin.register(SessionSeries)
+class SessionSeriesAdmin(admin.ModelAdmin):
+    list_display = ['tutor', 'learner', 'course', 'recurrence', 'start_date', 'end_date', 'start_time', 'duration']
+    list_filter = ['recurrence', 'evaluation_year', 'course__program']
+    search_fields = ['tutor__email', 'learner__email', 'course__name']
+    date_hierarchy = 'start_date'
+    autocomplete_fields = ['tutor', 'learner', 'course', 'evaluation_year']
+    list_select_related = ['tutor', 'learner', 'course']
 
 
 @admin.register(Feedback)
-class FeedbackAdmin(admin.ModelAdmin):
+class FeedbackAdmin(LargeTableAdmin):
     list_display = ['learner', 'tutor', 'topic', 'explanation_rating', 'usefulness_rating', 'attend_again', 'created_at']
+    list_select_related = ['learner', 'tutor']
     list_filter = ['explanation_rating', 'usefulness_rating', 'attend_again', 'well_organized', 'duration', 'program', 'year']
     readonly_fields = ['created_at', 'updated_at', 'session_date', 'get_average_rating']
     search_fields = ['learner__email', 'tutor__email', 'topic']
@@ -196,8 +313,58 @@ class FeedbackAdmin(admin.ModelAdmin):
         return f"{obj.get_average_rating():.2f}"
     get_average_rating.short_description = 'Average Rating'
 
+    def delete_queryset(self, request, queryset):
+        # "Delete selected" releases topic and keyword counts once for the set
+        delete_feedback(queryset)
+
 
 @admin.register(Config)
 class ConfigAdmin(admin.ModelAdmin):
     list_display = ['key', 'value', 'description', 'updated_at']
     search_fields = ['key']
+
+
+@admin.register(TopicAlias)
+class TopicAliasAdmin(admin.ModelAdmin):
+    list_display = ['alias', 'topic_key', 'created_at']
+    search_fields = ['alias', 'topic_key']
+
+
+@admin.register(TopicCount)
+class TopicCountAdmin(admin.ModelAdmin):
+    list_display = ['label', 'topic_key', 'program', 'month', 'count']
+    list_filter = ['program', 'month']
+    search_fields = ['topic_key', 'label']
+    list_select_related = ['program']
+
+
+@admin.register(CommentTermFrequency)
+class CommentTermFrequencyAdmin(LargeTableAdmin):
+    list_display = ['term', 'tutor', 'program', 'month', 'count']
+    list_filter = ['program', 'month']
+    search_fields = ['term', 'tutor__first_name', 'tutor__last_name']
+    list_select_related = ['tutor', 'program']
+
+
+@admin.register(UserActivitySummary)
+class UserActivitySummaryAdmin(LargeTableAdmin):
+    list_display = ['user', 'evaluation_year', 'learner_upcoming_count', 'pending_feedback_count',
+                    'learner_minutes', 'tutor_completed_count', 'tutor_minutes', 'next_rollover']
+    list_filter = ['evaluation_year']
+    search_fields = ['user__email', 'user__first_name', 'user__last_name']
+    list_select_related = ['user', 'evaluation_year']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(TutorWeeklyLoad)
+class TutorWeeklyLoadAdmin(admin.ModelAdmin):
+    list_display = ['tutor', 'week_start', 'sessions', 'updated_at']
+    list_filter = ['week_start']
+    search_fields = ['tutor__email', 'tutor__first_name', 'tutor__last_name']
+    list_select_related = ['tutor']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(Watermark)
+class WatermarkAdmin(admin.ModelAdmin):
+    list_display = ['name', 'value', 'updated_at']
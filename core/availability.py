@@ -0,0 +1,114 @@
+"""Weekly availability as a 21-bit day x time-slot mask
+
+Bit ``day * 3 + slot`` is set when the tutor is available in that slot, e.g.
+Monday morning is bit 0 and Sunday evening bit 20. A mask of 0 means the
+tutor stated no preference. In-process code works on the mask; queries go
+through ``TutorAvailabilitySlot``, one row per set bit, whose (slot,
+application) index serves "available in" filters.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count
+from django.utils import timezone
+
+DAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+SLOTS = ('Morning', 'Afternoon', 'Evening')
+
+ALL_SLOTS = (1 << (len(DAYS) * len(SLOTS))) - 1
+
+# Start hour of each slot when a session is placed in it
+SLOT_HOURS = (9, 14, 18)
+
+_DAY_INDEX = {day.lower(): i for i, day in enumerate(DAYS)}
+_SLOT_INDEX = {slot.lower(): i for i, slot in enumerate(SLOTS)}
+
+
+def slot_bit(day, slot):
+    """Bit for one day and time slot given by name ('Monday', 'Evening')"""
+    return 1 << (_DAY_INDEX[day.lower()] * len(SLOTS) + _SLOT_INDEX[slot.lower()])
+
+
+def _split(value):
+    if isinstance(value, str):
+        value = value.split(',')
+    return [part.strip().lower() for part in value or () if part and part.strip()]
+
+
+def build_mask(days=(), slots=()):
+    """Mask for every combination of ``days`` and ``slots``.
+
+    Both accept a list of names or a comma-separated string; unknown names are
+    ignored. An empty dimension means "any", so ``build_mask('Monday')`` is all
+    of Monday. Returns 0 when neither is given.
+    """
+    day_indexes = [_DAY_INDEX[d] for d in _split(days) if d in _DAY_INDEX]
+    slot_indexes = [_SLOT_INDEX[s] for s in _split(slots) if s in _SLOT_INDEX]
+    if not day_indexes and not slot_indexes:
+        return 0
+    day_indexes = day_indexes or range(len(DAYS))
+    slot_indexes = slot_indexes or range(len(SLOTS))
+    mask = 0
+    for day in day_indexes:
+        for slot in slot_indexes:
+            mask |= 1 << (day * len(SLOTS) + slot)
+    return mask
+
+
+def mask_days(mask):
+    """Names of the days with at least one available slot"""
+    return [day for i, day in enumerate(DAYS) if mask >> (i * len(SLOTS)) & 0b111]
+
+
+def mask_slots(mask):
+    """Names of the slots available on at least one day"""
+    return [slot for i, slot in enumerate(SLOTS) if any(mask >> (d * len(SLOTS) + i) & 1 for d in range(len(DAYS)))]
+
+
+def slot_start(week_start, index):
+    """Aware datetime at which slot ``index`` starts in the week beginning on ``week_start`` (a date)"""
+    day = week_start + timedelta(days=index // len(SLOTS))
+    return timezone.make_aware(datetime.combine(day, time(SLOT_HOURS[index % len(SLOTS)])))
+
+
+def slot_indexes(mask):
+    """Bit indexes set in ``mask``, Monday morning first"""
+    return [i for i in range(len(DAYS) * len(SLOTS)) if mask >> i & 1]
+
+
+def overlap(requested, available):
+    """Share of the requested slots covered by ``available`` (0.0 - 1.0)"""
+    if not requested:
+        return 1.0
+    return bin(requested & available).count('1') / bin(requested).count('1')
+
+
+def store_slots(application_id, mask):
+    """Make the application's ``TutorAvailabilitySlot`` rows match ``mask``"""
+    from .models import TutorAvailabilitySlot
+
+    wanted = set(slot_indexes(mask))
+    stored = set(TutorAvailabilitySlot.objects.filter(application_id=application_id).values_list('slot', flat=True))
+    if stored - wanted:
+        TutorAvailabilitySlot.objects.filter(application_id=application_id, slot__in=stored - wanted).delete()
+    TutorAvailabilitySlot.objects.bulk_create([
+        TutorAvailabilitySlot(application_id=application_id, slot=slot) for slot in sorted(wanted - stored)
+    ])
+
+
+def available_in(queryset, mask, field='pk'):
+    """Filter to applications (``field`` holds their id) available in at least one slot of ``mask``"""
+    from .models import TutorAvailabilitySlot
+
+    slots = TutorAvailabilitySlot.objects.filter(slot__in=slot_indexes(mask))
+    return queryset.filter(**{f'{field}__in': slots.values('application_id')})
+
+
+def available_in_all(queryset, mask, field='pk'):
+    """Filter to applications (``field`` holds their id) available in every slot of ``mask``"""
+    from .models import TutorAvailabilitySlot
+
+    wanted = slot_indexes(mask)
+    slots = TutorAvailabilitySlot.objects.filter(slot__in=wanted).values('application_id').annotate(
+        slots=Count('slot')
+    ).filter(slots=len(wanted)).values('application_id')
+    return queryset.filter(**{f'{field}__in': slots})
@@ -0,0 +1,121 @@
+"""Set-based bulk changes for admin actions and management commands
+
+Saving rows one by one runs every signal handler per row: a summary refresh,
+a cache invalidation and counter updates each time. These helpers change a
+whole selection with one UPDATE (or DELETE) per batch of rows and then do the
+bookkeeping the signals would have done, once for the batch.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .activity import expire_activity
+from .directory import schedule_directory_invalidation
+from .fragments import schedule_fragment_invalidation
+from .keywords import add_state, apply_deltas
+from .matching import schedule_matching_invalidation
+from .reconciliation import close_sessions
+from .topics import topic_month
+
+# Rows updated per statement when a change has to be applied in chunks
+BATCH_SIZE = 1000
+
+
+def _batches(queryset, size=BATCH_SIZE):
+    """The selection as subqueries over consecutive pk ranges of at most ``size`` rows
+
+    Admin querysets may carry annotations and ordering that UPDATE cannot use,
+    so callers filter on ``pk__in=batch``. Only the upper pk of each range is
+    read, never the whole list of ids.
+    """
+    selection = queryset.order_by('pk').values('pk')
+    lower = None
+    while True:
+        page = selection if lower is None else selection.filter(pk__gt=lower)
+        upper = page.values_list('pk', flat=True)[size - 1:size]
+        upper = upper[0] if upper else None
+        yield (page if upper is None else page.filter(pk__lte=upper)).order_by()
+        if upper is None:
+            return
+        lower = upper
+
+
+def set_application_status(queryset, status):
+    """Approve or reject the selected tutor applications; returns how many changed"""
+    from .models import TutorApplication
+
+    if status not in dict(TutorApplication.STATUS_CHOICES):
+        raise ValueError(f'Unknown application status: {status}')
+    changed = 0
+    for batch in _batches(queryset):
+        with transaction.atomic():
+            # updated_at lets the matching index pick the rows up incrementally
+            updated = TutorApplication.objects.filter(pk__in=batch).exclude(status=status).update(
+                status=status, updated_at=timezone.now()
+            )
+            if updated:
+                schedule_directory_invalidation()
+                schedule_fragment_invalidation([])
+        changed += updated
+    return changed
+
+
+def set_training_completed(queryset, completed=True):
+    """Set ``training_completed`` on the selected tutor applications; returns how many changed"""
+    from .models import TutorApplication
+
+    return sum(
+        TutorApplication.objects.filter(pk__in=batch).exclude(training_completed=completed).update(
+            training_completed=completed, updated_at=timezone.now()
+        )
+        for batch in _batches(queryset)
+    )
+
+
+def set_session_status(queryset, status):
+    """Mark the selected scheduled sessions completed or cancelled; returns how many changed"""
+    now = timezone.now()
+    return sum(close_sessions(batch, status, now) for batch in _batches(queryset.filter(status='Scheduled')))
+
+
+def delete_feedback(queryset):
+    """Delete the selected feedback and release its topic and keyword counts; returns how many were deleted"""
+    return sum(_delete_feedback_batch(batch) for batch in _batches(queryset))
+
+
+def _delete_feedback_batch(batch):
+    from .models import Feedback, Session
+    from .signals import bulk_change, bump_topic_count
+
+    with transaction.atomic():
+        rows = list(Feedback.objects.select_for_update().filter(pk__in=batch).values_list(
+            'pk', 'program_id', 'session_date', 'topic_key', 'indexed_terms', 'learner_id', 'session_id'
+        ))
+        if not rows:
+            return 0
+
+        topics = Counter((program_id, topic_month(session_date), topic_key)
+                         for _, program_id, session_date, topic_key, _, _, _ in rows)
+        for (program_id, month, topic_key), count in topics.items():
+            bump_topic_count(program_id, month, topic_key, label='', delta=-count)
+
+        terms = Counter()
+        for row in rows:
+            add_state(terms, row[4], -1)
+        apply_deltas(terms)
+
+        # The per-row delete handlers would repeat the work done above
+        with bulk_change():
+            Feedback.objects.filter(pk__in=[row[0] for row in rows]).delete()
+
+        # Learners whose linked sessions are pending feedback again
+        learners_by_year = defaultdict(set)
+        linked = {row[6]: row[5] for row in rows if row[6]}
+        for session_id, year_id in Session.objects.filter(pk__in=linked).values_list('pk', 'evaluation_year_id'):
+            learners_by_year[year_id].add(linked[session_id])
+        for year_id, learner_ids in learners_by_year.items():
+            transaction.on_commit(lambda learner_ids=learner_ids, year_id=year_id: expire_activity(learner_ids, year_id))
+        schedule_fragment_invalidation({row[5] for row in rows})
+        schedule_matching_invalidation()
+    return len(rows)
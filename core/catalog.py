@@ -0,0 +1,150 @@
+"""Read-only in-process snapshot of the Program -> Year -> Course tree
+
+The catalog changes a few times a year but is read on every registration
+step, so each process keeps an immutable snapshot and rebuilds it only when
+the shared version stamp in the cache changes. Program/Year/Course signals
+replace the stamp; with a shared cache (REDIS_URL) this reaches every worker.
+"""
+from dataclasses import dataclass
+from types import MappingProxyType
+
+from .snapshot import VersionedSnapshot
+
+
+@dataclass(frozen=True)
+class CatalogProgram:
+    id: int
+    name: str
+    code: str
+
+    def __str__(self):
+        return self.name
+
+
+@dataclass(frozen=True)
+class CatalogYear:
+    id: int
+    program_id: int
+    year_number: int
+    name: str
+
+
+@dataclass(frozen=True)
+class CatalogCourse:
+    id: int
+    program_id: int
+    year: CatalogYear
+    code: str
+    name: str
+    description: str
+
+    def __str__(self):
+        return f"{self.code} - {self.name}"
+
+
+class Catalog:
+    """One immutable snapshot of the catalog, tagged with the version it was built for"""
+
+    def __init__(self, version, programs, years, courses):
+        self.version = version
+        self.programs = tuple(programs)
+        self._programs = MappingProxyType({p.id: p for p in programs})
+        self._years = MappingProxyType({y.id: y for y in years})
+        self._courses = MappingProxyType({c.id: c for c in courses})
+
+        years_by_program = {}
+        for year in sorted(years, key=lambda y: (y.program_id, y.year_number)):
+            years_by_program.setdefault(year.program_id, []).append(year)
+        self._years_by_program = MappingProxyType(
+            {program_id: tuple(items) for program_id, items in years_by_program.items()}
+        )
+
+        courses = sorted(courses, key=lambda c: (c.year.year_number, c.code))
+        courses_by_program = {}
+        for course in courses:
+            courses_by_program.setdefault(course.program_id, []).append(course)
+        self._courses_by_program = MappingProxyType(
+            {program_id: tuple(items) for program_id, items in courses_by_program.items()}
+        )
+
+        # Cumulative visibility: Year 1 up to and including each year of the program
+        cumulative = {}
+        for program_id, program_years in self._years_by_program.items():
+            program_courses = self._courses_by_program.get(program_id, ())
+            for year in program_years:
+                cumulative[(program_id, year.year_number)] = tuple(
+                    c for c in program_courses if c.year.year_number <= year.year_number
+                )
+        self._cumulative = MappingProxyType(cumulative)
+
+    def program(self, program_id):
+        return self._programs.get(_as_id(program_id))
+
+    def year(self, year_id):
+        return self._years.get(_as_id(year_id))
+
+    def course(self, course_id):
+        return self._courses.get(_as_id(course_id))
+
+    def years_for_program(self, program_id, below=None):
+        """Years of a program ordered by number, optionally only those below ``below``"""
+        years = self._years_by_program.get(_as_id(program_id), ())
+        if below is not None:
+            years = tuple(y for y in years if y.year_number < below)
+        return years
+
+    def program_courses(self, program_id):
+        return self._courses_by_program.get(_as_id(program_id), ())
+
+    def cumulative_courses(self, program_id, year_number):
+        """Courses from Year 1 up to and including ``year_number``"""
+        program_id = _as_id(program_id)
+        courses = self._cumulative.get((program_id, year_number))
+        if courses is None:
+            # year_number is not one of the program's years
+            courses = tuple(
+                c for c in self.program_courses(program_id) if c.year.year_number <= year_number
+            )
+        return courses
+
+
+def _as_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def load_catalog(version):
+    """Build a snapshot from the database (three queries)"""
+    from .models import Course, Program, Year
+
+    programs = [CatalogProgram(*row) for row in Program.objects.values_list('id', 'name', 'code')]
+    years = {
+        row[0]: CatalogYear(*row)
+        for row in Year.objects.values_list('id', 'program_id', 'year_number', 'name')
+    }
+    courses = [
+        CatalogCourse(course_id, program_id, years[year_id], code, name, description)
+        for course_id, program_id, year_id, code, name, description in Course.objects.values_list(
+            'id', 'program_id', 'year_id', 'code', 'name', 'description'
+        )
+    ]
+    return Catalog(version, programs, years.values(), courses)
+
+
+_snapshot = VersionedSnapshot('catalog:version', load_catalog)
+
+
+def get_catalog():
+    """Return the current snapshot, rebuilding it if another process changed the catalog"""
+    return _snapshot.get()
+
+
+def invalidate_catalog():
+    """Publish a new catalog version and drop this process's snapshot"""
+    _snapshot.invalidate()
+
+
+def schedule_catalog_invalidation():
+    _snapshot.schedule_invalidation()
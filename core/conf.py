@@ -0,0 +1,103 @@
+"""Typed, cached access to the Config table
+
+Every setting the code reads is declared in ``SETTINGS`` with its type and
+default. Values are read from a process-local snapshot of the table, so hot
+paths never query it; writes publish a new version so every worker reloads.
+"""
+from collections import namedtuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from .snapshot import VersionedSnapshot
+
+# ``minimum`` and ``maximum`` bound the value (inclusive); None leaves that side open
+Setting = namedtuple('Setting', ['cast', 'default', 'description', 'minimum', 'maximum'], defaults=(None, None))
+
+SETTINGS = {
+    'maxCourseSelections': Setting(int, 3, 'Maximum courses a student can select', 1, 20),
+    'minGpaForTutor': Setting(float, 3.0, 'Minimum GPA required to apply as a tutor', 0.0, 4.0),
+}
+
+
+def _parse(setting, raw):
+    """Typed value of ``raw``; raises ``ValueError`` saying why when it is not of the type or out of range"""
+    try:
+        value = setting.cast(raw)
+    except (TypeError, ValueError):
+        raise ValueError(f'expected {setting.cast.__name__}')
+    # Written so that NaN fails both comparisons
+    if setting.minimum is not None and not value >= setting.minimum:
+        raise ValueError(f'must be at least {setting.minimum}')
+    if setting.maximum is not None and not value <= setting.maximum:
+        raise ValueError(f'must be at most {setting.maximum}')
+    return value
+
+
+def load_config(version):
+    from .models import Config
+
+    return dict(Config.objects.values_list('key', 'value'))
+
+
+_snapshot = VersionedSnapshot('config:version', load_config)
+
+
+def get_setting(key):
+    """Typed value of a declared setting, falling back to its default when unset or invalid"""
+    setting = SETTINGS[key]
+    raw = _snapshot.get().get(key)
+    if raw is None:
+        return setting.default
+    try:
+        return _parse(setting, raw)
+    except ValueError:
+        return setting.default
+
+
+def get_settings():
+    """Typed values of every declared setting"""
+    return {key: get_setting(key) for key in SETTINGS}
+
+
+def update_settings(values):
+    """Validate and store declared settings, writing only the keys whose value changed.
+
+    Raises ``ValueError`` naming the first value that does not match its type
+    or range, before anything is written. Returns the list of changed keys.
+    """
+    from .models import Config
+
+    current = _snapshot.get()
+    changed = {}
+    for key, raw in values.items():
+        setting = SETTINGS.get(key)
+        if setting is None:
+            continue
+        raw = str(raw).strip()
+        try:
+            _parse(setting, raw)
+        except ValueError as e:
+            raise ValueError(f'Invalid value for {key}: {raw!r} ({e})')
+        if current.get(key) != raw:
+            changed[key] = raw
+
+    if changed:
+        now = timezone.now()
+        with transaction.atomic():
+            Config.objects.bulk_create(
+                [
+                    Config(key=key, value=raw, description=SETTINGS[key].description, updated_at=now)
+                    for key, raw in changed.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['key'],
+                update_fields=['value', 'updated_at'],
+            )
+            # bulk_create sends no signals, so publish the new version here
+            _snapshot.schedule_invalidation()
+    return list(changed)
+
+
+def schedule_config_invalidation():
+    _snapshot.schedule_invalidation()
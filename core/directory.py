@@ -0,0 +1,234 @@
+"""Directories behind the tutor and learner pickers
+
+Learners pick the tutor of a session from the approved tutors of their
+program who are in the same or a later year. Each process keeps a snapshot of
+approved tutors, the eligible list of every (program, learner year) built on
+first use, and a sorted index of name tokens so prefix searches are a binary
+search instead of a scan. TutorApplication and User signals publish a new
+version.
+
+Tutors pick the learner of a session through a typeahead scoped to the
+courses they teach, so the create-session page never lists the whole cohort.
+"""
+import threading
+from bisect import bisect_left
+from collections import namedtuple
+from dataclasses import dataclass
+
+from django.db.models import Q
+
+from .snapshot import VersionedSnapshot
+
+DEFAULT_LIMIT = 10
+
+
+def is_near_peer(tutor_year, learner_year):
+    """The near-peer rule: a tutor teaches learners of their own or an earlier year (any year when unknown)"""
+    return learner_year is None or tutor_year >= learner_year
+
+
+def near_peer_learners(field, tutor_year):
+    """``is_near_peer`` as a filter on the learner year number ``field``"""
+    return Q(**{f'{field}__lte': tutor_year})
+
+
+@dataclass(frozen=True)
+class DirectoryTutor:
+    id: int
+    name: str
+
+    def as_dict(self):
+        return {'id': self.id, 'name': self.name}
+
+
+class TutorDirectory:
+    """One immutable snapshot of the approved tutors"""
+
+    def __init__(self, version, tutors, years):
+        self.version = version
+        self._tutors = {tutor.id: tutor for tutor in tutors}
+        # program id -> {tutor id: highest year of an approved application}
+        self._years = years
+        self._eligible = {}
+        self._lock = threading.Lock()
+
+        # Every word of the name and the full name, so 'jo', 'smi' and 'john sm' all match
+        tokens = []
+        for tutor in tutors:
+            name = tutor.name.lower()
+            for token in set(name.split()) | {name}:
+                tokens.append((token, name, tutor.id))
+        tokens.sort()
+        self._tokens = [token for token, _, _ in tokens]
+        self._token_ids = [tutor_id for _, _, tutor_id in tokens]
+
+    def tutor(self, tutor_id):
+        return self._tutors.get(tutor_id)
+
+    def eligible(self, program_id=None, learner_year=None):
+        """Tutors a learner can pick, sorted by name (all approved tutors without a profile)"""
+        key = (program_id, learner_year)
+        eligible = self._eligible.get(key)
+        if eligible is None:
+            if program_id is None:
+                ids = self._tutors
+            else:
+                ids = [
+                    tutor_id for tutor_id, year in self._years.get(program_id, {}).items()
+                    if is_near_peer(year, learner_year)
+                ]
+            tutors = tuple(sorted((self._tutors[i] for i in ids), key=lambda t: (t.name.lower(), t.id)))
+            eligible = (tutors, frozenset(t.id for t in tutors))
+            with self._lock:
+                self._eligible[key] = eligible
+        return eligible[0]
+
+    def is_eligible(self, tutor_id, program_id=None, learner_year=None):
+        self.eligible(program_id, learner_year)
+        return tutor_id in self._eligible[(program_id, learner_year)][1]
+
+    def search(self, query, program_id=None, learner_year=None, limit=DEFAULT_LIMIT):
+        """Eligible tutors with a name word (or the full name) starting with ``query``"""
+        query = ' '.join(query.lower().split())
+        if not query:
+            return list(self.eligible(program_id, learner_year)[:limit])
+        self.eligible(program_id, learner_year)
+        allowed = self._eligible[(program_id, learner_year)][1]
+
+        found = []
+        seen = set()
+        position = bisect_left(self._tokens, query)
+        while position < len(self._tokens) and self._tokens[position].startswith(query):
+            tutor_id = self._token_ids[position]
+            if tutor_id in allowed and tutor_id not in seen:
+                seen.add(tutor_id)
+                found.append(self._tutors[tutor_id])
+                if len(found) >= limit:
+                    break
+            position += 1
+        return found
+
+
+def load_directory(version):
+    """Build a snapshot from the database (one query)"""
+    from .models import TutorApplication
+
+    tutors = {}
+    years = {}
+    rows = TutorApplication.objects.filter(status='Approved', user__is_active=True).values_list(
+        'user_id', 'user__first_name', 'user__last_name', 'program_id', 'year__year_number'
+    )
+    for user_id, first_name, last_name, program_id, year_number in rows:
+        tutors[user_id] = DirectoryTutor(user_id, f'{first_name} {last_name}'.strip())
+        program_years = years.setdefault(program_id, {})
+        program_years[user_id] = max(year_number, program_years.get(user_id, year_number))
+    return TutorDirectory(version, list(tutors.values()), years)
+
+
+_snapshot = VersionedSnapshot('tutor-directory:version', load_directory)
+
+
+def get_directory():
+    return _snapshot.get()
+
+
+def confirm_tutor(tutor_id, program_id=None, learner_year=None):
+    """Whether a learner may pick the tutor, asking the database when the snapshot says no
+
+    A tutor approved by another process (e.g. the bulk_update command) may
+    not have reached this snapshot yet; finding them republishes the directory.
+    """
+    from .models import TutorApplication
+
+    if get_directory().is_eligible(tutor_id, program_id, learner_year):
+        return True
+    applications = TutorApplication.objects.filter(user_id=tutor_id, status='Approved', user__is_active=True)
+    if program_id is not None:
+        applications = applications.filter(program_id=program_id)
+    if learner_year is not None:
+        applications = applications.filter(year__year_number__gte=learner_year)
+    if not applications.exists():
+        return False
+    _snapshot.invalidate()
+    return True
+
+
+def learner_scope(learner):
+    """(program id, year number) that decides which tutors ``learner`` may pick; (None, None) without a profile"""
+    from .models import Student
+
+    if learner is None or not learner.is_authenticated:
+        return None, None
+    scope = Student.objects.filter(user=learner).values_list('program_id', 'year__year_number').first()
+    return scope or (None, None)
+
+
+def schedule_directory_invalidation():
+    _snapshot.schedule_invalidation()
+
+
+TeachingScope = namedtuple('TeachingScope', ['course_ids', 'max_year', 'weekly_capacity'])
+
+
+def teaching_scope(tutor):
+    """Courses, highest year and weekly limit over the tutor's approved applications (one query)"""
+    from .models import TutorApplication
+
+    rows = TutorApplication.objects.filter(user=tutor, status='Approved').values_list(
+        'courses', 'year__year_number', 'max_sessions_per_week'
+    )
+    course_ids, max_year, capacity = set(), None, None
+    for course_id, year_number, max_sessions in rows:
+        if course_id is not None:
+            course_ids.add(course_id)
+        max_year = max(max_year or 0, year_number)
+        if max_sessions:
+            capacity = max(capacity or 0, max_sessions)
+    return TeachingScope(frozenset(course_ids), max_year, capacity)
+
+
+def scoped_learners(scope, course_id=None):
+    """Student profiles a tutor with ``scope`` may book: near peers taking one of the tutor's courses
+
+    Learners are matched on their enrollments through the (course, year)
+    index. Students who registered before course choices were stored have no
+    enrollments; they count as taking every course of their program up to
+    their year, the courses registration offered them.
+    """
+    from .catalog import get_catalog
+    from .models import Student
+
+    course_ids = scope.course_ids
+    if course_id is not None:
+        course_ids = course_ids & {course_id}
+    if not course_ids or scope.max_year is None:
+        return Student.objects.none()
+
+    catalog = get_catalog()
+    offered = Q()
+    for course in filter(None, map(catalog.course, course_ids)):
+        offered |= Q(program_id=course.program_id, year__year_number__gte=course.year.year_number)
+    enrolled = Q(enrollments__course_id__in=course_ids) & near_peer_learners('enrollments__year__year_number',
+                                                                             scope.max_year)
+    legacy = Q(enrollments__isnull=True) & near_peer_learners('year__year_number', scope.max_year) & offered
+    return Student.objects.filter(enrolled | legacy if offered else enrolled, user__is_active=True)
+
+
+def search_learners(scope, query, course_id=None, limit=DEFAULT_LIMIT):
+    """Learners in the tutor's scope (see ``scoped_learners``), matched by name or student ID prefix"""
+    students = scoped_learners(scope, course_id)
+    words = query.split()
+    for word in words:
+        students = students.filter(
+            Q(user__first_name__istartswith=word)
+            | Q(user__last_name__istartswith=word)
+            | Q(user__student_id__istartswith=word)
+        )
+    rows = students.values_list(
+        'user_id', 'user__first_name', 'user__last_name', 'user__student_id', 'year__year_number',
+    ).order_by('user__first_name', 'user__last_name', 'user_id').distinct()
+    return [
+        {'id': user_id, 'name': f'{first_name} {last_name}'.strip(), 'student_id': student_id,
+         'year_number': year_number}
+        for user_id, first_name, last_name, student_id, year_number in rows[:limit]
+    ]
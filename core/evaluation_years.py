@@ -0,0 +1,125 @@
+"""In-process interval table of evaluation years
+
+Sessions belong to the evaluation year whose start_date..end_date covers
+their date. The handful of years is kept per process as a table sorted by
+start date, so resolving a date is a binary search instead of a query on
+every form and analytics page. EvaluationYear signals publish a new version.
+
+Session saves trust the table: the shared cache version is replaced on
+every EvaluationYear save and delete. Bulk writers (the scheduler) can
+compare it with a one-row fingerprint of the database first, which costs a
+query once per batch instead of once per row.
+"""
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import date, datetime
+
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .snapshot import VersionedSnapshot
+
+
+@dataclass(frozen=True)
+class YearSpan:
+    id: int
+    year: str
+    start_date: date
+    end_date: date
+    is_active: bool
+
+    def __contains__(self, day):
+        return self.start_date <= day <= self.end_date
+
+
+class YearTable:
+    """One immutable snapshot of the evaluation years, sorted by start date"""
+
+    def __init__(self, version, spans, fingerprint=None):
+        self.version = version
+        self.fingerprint = fingerprint
+        self.spans = tuple(sorted(spans, key=lambda span: (span.start_date, span.id)))
+        self._starts = [span.start_date for span in self.spans]
+        # Latest end date among the spans up to each position, to stop the
+        # backwards walk early when years overlap
+        self._reach = []
+        for span in self.spans:
+            self._reach.append(max(span.end_date, self._reach[-1]) if self._reach else span.end_date)
+        self._by_id = {span.id: span for span in self.spans}
+        self.active = next((span for span in self.spans if span.is_active), None)
+
+    def get(self, year_id):
+        return self._by_id.get(year_id)
+
+    def covering(self, value):
+        """Year whose date range contains ``value`` (a date or datetime); the latest-starting one if several do"""
+        day = timezone.localdate(value) if isinstance(value, datetime) else value
+        position = bisect_right(self._starts, day) - 1
+        while position >= 0 and self._reach[position] >= day:
+            if day in self.spans[position]:
+                return self.spans[position]
+            position -= 1
+        return None
+
+    def resolve(self, value):
+        """Year a session on ``value`` belongs to: the covering one, else the active one"""
+        span = self.covering(value) if value is not None else None
+        return span or self.active
+
+
+def database_fingerprint():
+    """``(row count, latest updated_at)`` of the years; changes with every save and delete"""
+    from .models import EvaluationYear
+
+    totals = EvaluationYear.objects.aggregate(count=Count('id'), changed=Max('updated_at'))
+    return totals['count'], totals['changed']
+
+
+def load_year_table(version):
+    """Build a snapshot from the database (one query)"""
+    from .models import EvaluationYear
+
+    rows = list(EvaluationYear.objects.values_list('id', 'year', 'start_date', 'end_date', 'is_active', 'updated_at'))
+    fingerprint = (len(rows), max((row[-1] for row in rows), default=None))
+    return YearTable(version, [YearSpan(*row[:-1]) for row in rows], fingerprint)
+
+
+_snapshot = VersionedSnapshot('evaluation-years:version', load_year_table)
+
+
+def get_year_table():
+    return _snapshot.get()
+
+
+def verified_year_table():
+    """The table, rebuilt (and republished) first if the database no longer matches it"""
+    table = _snapshot.get()
+    if table.fingerprint != database_fingerprint():
+        _snapshot.invalidate()
+        table = _snapshot.get()
+    return table
+
+
+def resolve_year_id(value):
+    """Id of the evaluation year for a session on ``value``, or None when there is none"""
+    span = get_year_table().resolve(value)
+    return span.id if span else None
+
+
+def active_year():
+    return get_year_table().active
+
+
+def year_choices():
+    """``(id, name)`` of every year, latest first, for filter forms"""
+    return [(span.id, span.year) for span in sorted(get_year_table().spans, key=lambda span: span.start_date,
+                                                       reverse=True)]
+
+
+def invalidate_year_table():
+    """Publish a new version and drop this process's table"""
+    _snapshot.invalidate()
+
+
+def schedule_year_invalidation():
+    _snapshot.schedule_invalidation()
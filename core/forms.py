@@ -1,7 +1,20 @@
+from collections import Counter
+from datetime import timedelta
+
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.core.validators import RegexValidator
-from .models import User, Student, TutorApplication, Program, Year, Course, Session, Feedback, EvaluationYear
+from django.db import transaction
+from django.utils import timezone
+from .models import (
+    User, Student, TutorApplication, Program, Year, Course, Session, SessionSeries, Feedback, EvaluationYear,
+)
+from .catalog import get_catalog
+from .directory import confirm_tutor, get_directory, learner_scope, scoped_learners, teaching_scope
+from .evaluation_years import active_year, get_year_table, year_choices
+from .overlaps import find_overlaps_many, session_end
+from .series import occurrence_start
+from .workload import reserve_load, tutor_loads, week_of
 
 
 class AdminUserCreationForm(forms.ModelForm):
@@ -252,36 +265,51 @@ class StudentProgramForm(forms.Form):
                 pass
 
 
-class StudentCourseSelectionForm(forms.Form):
-    """Step 3: Course Selection - Cumulative course visibility (Year 1 up to student's year)"""
-    courses = forms.ModelMultipleChoiceField(
-        queryset=Course.objects.none(),
+class CatalogCourseSelectionForm(forms.Form):
+    """Base for course selection steps: choices come from the catalog snapshot, not the database
+
+    ``available_courses`` lists the selectable catalog courses and cleaned
+    ``courses`` is a list of them (each has ``id``, ``code``, ``name`` and ``year``).
+    """
+    courses = forms.TypedMultipleChoiceField(
+        coerce=int,
         widget=forms.CheckboxSelectMultiple,
         required=True
     )
 
+    def set_available_courses(self, courses):
+        self.available_courses = courses
+        self.fields['courses'].choices = [(course.id, str(course)) for course in courses]
+
+    def clean_courses(self):
+        catalog = get_catalog()
+        course_ids = dict.fromkeys(self.cleaned_data.get('courses') or [])
+        return [course for course in map(catalog.course, course_ids) if course is not None]
+
+
+class StudentCourseSelectionForm(CatalogCourseSelectionForm):
+    """Step 3: Course Selection - Cumulative course visibility (Year 1 up to student's year)"""
+
     def __init__(self, *args, **kwargs):
         program_id = kwargs.pop('program_id', None)
         year_number = kwargs.pop('year_number', None)
         max_selections = kwargs.pop('max_selections', 3)
         super().__init__(*args, **kwargs)
 
+        catalog = get_catalog()
         if program_id and year_number:
             # Cumulative course visibility: Show courses from Year 1 up to and including student's year
-            self.fields['courses'].queryset = Course.objects.filter(
-                program_id=program_id,
-                year__year_number__lte=year_number
-            ).select_related('year').order_by('year__year_number', 'code')
+            self.set_available_courses(catalog.cumulative_courses(program_id, year_number))
         elif program_id:
             # Fallback: Show all courses if year_number not provided
-            self.fields['courses'].queryset = Course.objects.filter(
-                year__program_id=program_id
-            ).select_related('year').order_by('year__year_number', 'code')
+            self.set_available_courses(catalog.program_courses(program_id))
+        else:
+            self.set_available_courses(())
 
         self.max_selections = max_selections
 
     def clean_courses(self):
-        courses = self.cleaned_data.get('courses')
+        courses = super().clean_courses()
         if len(courses) > self.max_selections:
             raise forms.ValidationError(f"You can select a maximum of {self.max_selections} courses")
         return courses
@@ -415,30 +443,26 @@ class TutorApplicationStep2Form(forms.Form):
                 pass
 
 
-class TutorApplicationStep3Form(forms.Form):
+class TutorApplicationStep3Form(CatalogCourseSelectionForm):
     """Step 3: Course Selection - Limit to exactly 3 courses"""
-    courses = forms.ModelMultipleChoiceField(
-        queryset=Course.objects.none(),
-        widget=forms.CheckboxSelectMultiple,
-        required=True,
-        label="Select EXACTLY THREE courses you can tutor",
-        help_text="You must select exactly 3 courses from your program (up to and including your year)"
-    )
 
     def __init__(self, *args, **kwargs):
         program_id = kwargs.pop('program_id', None)
         year_number = kwargs.pop('year_number', None)
         super().__init__(*args, **kwargs)
 
+        self.fields['courses'].label = "Select EXACTLY THREE courses you can tutor"
+        self.fields['courses'].help_text = (
+            "You must select exactly 3 courses from your program (up to and including your year)"
+        )
         if program_id and year_number:
             # Show courses from selected program, only up to and including the applicant's year
-            self.fields['courses'].queryset = Course.objects.filter(
-                program_id=program_id,
-                year__year_number__lte=year_number
-            ).select_related('year').order_by('year__year_number', 'code')
+            self.set_available_courses(get_catalog().cumulative_courses(program_id, year_number))
+        else:
+            self.set_available_courses(())
 
     def clean_courses(self):
-        courses = self.cleaned_data.get('courses')
+        courses = super().clean_courses()
         if len(courses) != 3:
             raise forms.ValidationError("You must select exactly 3 courses.")
         return courses
@@ -460,10 +484,7 @@ class LearnerFeedbackForm(forms.ModelForm):
                 'class': 'w-full px-4 py-3 border rounded-lg',
                 'required': True
             }),
-            'tutor': forms.Select(attrs={
-                'class': 'w-full px-4 py-3 border rounded-lg',
-                'required': True
-            }),
+            'tutor': forms.HiddenInput(),
             'topic': forms.TextInput(attrs={
                 'class': 'w-full px-4 py-3 border rounded-lg',
                 'placeholder': 'Enter session title/topic',
@@ -506,40 +527,25 @@ class LearnerFeedbackForm(forms.ModelForm):
             except:
                 pass  # No student profile, let user select
 
-        # Get approved tutor IDs
-        approved_tutor_ids = []
+        # Eligible tutors come from the in-process directory and the page
+        # fetches them through the typeahead endpoint, so nothing here grows
+        # with the number of tutors
+        self.tutor_scope = learner_scope(learner)
+        self.fields['tutor'].queryset = User.objects.all()
 
-        if learner:
-            try:
-                student = learner.student_profile
-                # Filter tutors: Approved tutors in same program, years >= learner's year (near-peer)
-                approved_tutor_ids = TutorApplication.objects.filter(
-                    status='Approved',
-                    program=student.program,
-                    year__year_number__gte=student.year.year_number
-                ).values_list('user_id', flat=True)
-            except:
-                # Fallback: all approved tutors if no student profile
-                approved_tutor_ids = TutorApplication.objects.filter(
-                    status='Approved'
-                ).values_list('user_id', flat=True)
-        else:
-            # Fallback: all approved tutors
-            approved_tutor_ids = TutorApplication.objects.filter(
-                status='Approved'
-            ).values_list('user_id', flat=True)
-
-        # Set queryset
-        self.fields['tutor'].queryset = User.objects.filter(
-            id__in=approved_tutor_ids
-        ).order_by('first_name', 'last_name')
+    @property
+    def selected_tutor(self):
+        """Directory entry of the submitted tutor, to show it again after a validation error"""
+        try:
+            return get_directory().tutor(int(self['tutor'].value()))
+        except (TypeError, ValueError):
+            return None
 
-        # Add searchable class for JavaScript enhancement
-        self.fields['tutor'].widget.attrs.update({
-            'class': 'w-full px-4 py-3 border border-neutral-300 dark:border-neutral-dark-300 rounded-lg bg-neutral-50 dark:bg-neutral-dark-50 text-neutral-900 dark:text-neutral-dark-900 focus:ring-2 focus:ring-primary-500 dark:focus:ring-primary-dark-500 focus:border-transparent searchable-select',
-            'id': 'id_tutor',
-            'required': True
-        })
+    def clean_tutor(self):
+        tutor = self.cleaned_data.get('tutor')
+        if tutor and not confirm_tutor(tutor.pk, *self.tutor_scope):
+            raise forms.ValidationError('Select a tutor from the list.')
+        return tutor
 
 
 class SessionFeedbackForm(forms.ModelForm):
@@ -561,28 +567,165 @@ class SessionCreateForm(forms.ModelForm):
         model = Session
         fields = ['learner', 'course', 'evaluation_year', 'session_date', 'duration', 'notes']
         widgets = {
+            # Picked through the learner typeahead instead of a list of every student
+            'learner': forms.HiddenInput(),
             'session_date': forms.DateTimeInput(attrs={'type': 'datetime-local'}),
             'notes': forms.Textarea(attrs={'rows': 3}),
         }
 
+    repeat = forms.ChoiceField(
+        choices=[('', 'Does not repeat')] + SessionSeries.RECURRENCE_CHOICES,
+        required=False,
+    )
+    repeat_until = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'type': 'date'}),
+        help_text="Defaults to the end of the evaluation year",
+    )
+
     def __init__(self, *args, **kwargs):
         tutor = kwargs.pop('tutor', None)
         super().__init__(*args, **kwargs)
+        self.tutor = tutor
+        self.scope = None
+        self.weekly_capacity = None
 
         if tutor:
-            # Only show students as learners
+            # Only students can be learners
             self.fields['learner'].queryset = User.objects.filter(role='Student')
             # Only show courses the tutor can teach
-            tutor_apps = TutorApplication.objects.filter(user=tutor, status='Approved')
-            course_ids = []
-            for app in tutor_apps:
-                course_ids.extend(app.courses.values_list('id', flat=True))
-            self.fields['course'].queryset = Course.objects.filter(id__in=course_ids)
+            scope = self.scope = teaching_scope(tutor)
+            self.weekly_capacity = scope.weekly_capacity
+            self.fields['course'].queryset = Course.objects.filter(id__in=scope.course_ids)
 
         # Set default evaluation year to active year
-        active_year = EvaluationYear.objects.filter(is_active=True).first()
-        if active_year:
-            self.fields['evaluation_year'].initial = active_year
+        year = active_year()
+        if year:
+            self.fields['evaluation_year'].initial = year.id
+
+    @property
+    def selected_learner(self):
+        """Submitted learner, to show it again after a validation error"""
+        try:
+            return User.objects.filter(pk=int(self['learner'].value()), role='Student').first()
+        except (TypeError, ValueError):
+            return None
+
+    def clean(self):
+        cleaned_data = super().clean()
+        session_date = cleaned_data.get('session_date')
+
+        if cleaned_data.get('repeat') and session_date:
+            evaluation_year = cleaned_data.get('evaluation_year')
+            repeat_until = cleaned_data.get('repeat_until') or (evaluation_year and evaluation_year.end_date)
+            if not repeat_until:
+                self.add_error('repeat_until', "Choose when the sessions stop repeating")
+            elif repeat_until < timezone.localdate(session_date):
+                self.add_error('repeat_until', "Must be on or after the first session")
+            else:
+                cleaned_data['repeat_until'] = repeat_until
+
+        # The same scope as the learner typeahead, so a posted id cannot reach other students
+        learner = cleaned_data.get('learner')
+        course = cleaned_data.get('course')
+        in_scope = scoped_learners(self.scope, course.pk).filter(user=learner) if self.scope and course else None
+        if learner and in_scope is not None and not in_scope.exists():
+            self.add_error('learner', "This student is not taking this course in your year or an earlier one")
+
+        duration = cleaned_data.get('duration')
+        if not (self.tutor and session_date and duration) or self.errors:
+            return cleaned_data
+
+        # Every date of a new series is checked, not only the first
+        starts = self.occurrence_starts()
+        overlaps = find_overlaps_many(starts, duration, tutor_id=self.tutor.pk,
+                                      learner_id=learner.pk if learner else None,
+                                      exclude_pk=self.instance.pk)
+        if overlaps:
+            booking, (_, tutor_id, _, start, length) = overlaps[0]
+            who = 'You have' if tutor_id == self.tutor.pk else 'This student has'
+            on = f"On {timezone.localtime(booking):%d %b %Y}: " if len(starts) > 1 else ''
+            self.add_error('session_date', (
+                f"{on}{who} another session from {timezone.localtime(start):%d %b %Y %H:%M} "
+                f"to {timezone.localtime(session_end(start, length)):%H:%M}"
+            ))
+
+        # Weekly limit the tutor chose when applying (read from the load counters, not a COUNT)
+        if self.weekly_capacity:
+            added = Counter(week_of(start) for start in starts)
+            booked = tutor_loads(self.tutor.pk, added)
+            full = next((week for week in sorted(added) if booked[week] + added[week] > self.weekly_capacity), None)
+            if full:
+                self.add_error('session_date', (
+                    f"You already have {booked[full]} sessions in the week of {full:%d %b %Y} "
+                    f"(your maximum is {self.weekly_capacity} per week)"
+                ))
+
+        return cleaned_data
+
+    def occurrence_starts(self):
+        """Start of every session the submitted form books"""
+        data = self.cleaned_data
+        if not data.get('repeat'):
+            return [data['session_date']]
+        series = self.build_series()
+        return [occurrence_start(series, day)
+                for day in series.occurrence_dates(series.start_date, series.end_date + timedelta(days=1))]
+
+    def book(self):
+        """Save the series or session; returns it, or None after adding an error when the week just filled up
+
+        Run it inside a transaction holding the tutor's lock (see ``workload.lock_tutor``).
+        """
+        if self.cleaned_data['repeat']:
+            # Occurrences are expanded on demand; rows are only created once completed
+            series = self.build_series()
+            if self.weekly_capacity:
+                weeks = sorted(week_of(start) for start in self.occurrence_starts())
+                savepoint = transaction.savepoint()
+                for week in weeks:
+                    if not reserve_load(self.tutor.pk, week, self.weekly_capacity):
+                        transaction.savepoint_rollback(savepoint)
+                        self.add_error('session_date', (
+                            f"The week of {week:%d %b %Y} is already full "
+                            f"(your maximum is {self.weekly_capacity} per week)"
+                        ))
+                        return None
+                transaction.savepoint_commit(savepoint)
+                series._reserved_loads = Counter((self.tutor.pk, week) for week in weeks)
+            series.save()
+            return series
+
+        session = self.save(commit=False)
+        session.tutor = self.tutor
+        if self.weekly_capacity:
+            week = week_of(session.session_date)
+            if not reserve_load(self.tutor.pk, week, self.weekly_capacity):
+                self.add_error('session_date', (
+                    f"The week of {week:%d %b %Y} is already full "
+                    f"(your maximum is {self.weekly_capacity} per week)"
+                ))
+                return None
+            session._reserved_week = (self.tutor.pk, week)
+        session.save()
+        return session
+
+    def build_series(self):
+        """Unsaved series for a repeating session; its first occurrence is ``session_date``"""
+        data = self.cleaned_data
+        start = timezone.localtime(data['session_date'])
+        return SessionSeries(
+            tutor=self.tutor,
+            learner=data['learner'],
+            course=data['course'],
+            evaluation_year=data.get('evaluation_year'),
+            recurrence=data['repeat'],
+            start_date=start.date(),
+            end_date=data['repeat_until'],
+            start_time=start.time(),
+            duration=data['duration'],
+            notes=data.get('notes', ''),
+        )
 
 
 class EvaluationYearForm(forms.ModelForm):
@@ -616,10 +759,11 @@ class EvaluationYearForm(forms.ModelForm):
 
 class AnalyticsFilterForm(forms.Form):
     """Form for filtering analytics dashboard"""
-    evaluation_year = forms.ModelChoiceField(
-        queryset=EvaluationYear.objects.all().order_by('-start_date'),
+    # Choices and the cleaned value (a YearSpan) come from the in-process year table
+    evaluation_year = forms.TypedChoiceField(
         required=False,
-        empty_label="All Years",
+        coerce=lambda value: get_year_table().get(int(value)),
+        empty_value=None,
         label="Evaluation Year"
     )
     program = forms.ModelChoiceField(
@@ -641,9 +785,10 @@ class AnalyticsFilterForm(forms.Form):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.fields['evaluation_year'].choices = [('', "All Years")] + year_choices()
         # Set default to active evaluation year
-        active_year = EvaluationYear.objects.filter(is_active=True).first()
-        if active_year and not self.data:
-            self.fields['evaluation_year'].initial = active_year
-            self.fields['start_date'].initial = active_year.start_date
-            self.fields['end_date'].initial = active_year.end_date
+        year = active_year()
+        if year and not self.data:
+            self.fields['evaluation_year'].initial = year.id
+            self.fields['start_date'].initial = year.start_date
+            self.fields['end_date'].initial = year.end_date
@@ -0,0 +1,164 @@
+"""Cached dashboard fragments loaded lazily over HTMX"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .activity import get_activity_summary
+from .models import Session, Student, TutorApplication, User
+from .series import upcoming_occurrences
+
+# Fragments are also dropped after this long, so time-based content
+# (e.g. a session moving from upcoming to past) never stays stale for long
+FRAGMENT_TIMEOUT = 300
+
+# Scope shared by fragments that show the same data to every admin
+GLOBAL_SCOPE = 'global'
+
+
+def _version_key(scope):
+    return f'dashboard:version:{scope}'
+
+
+def fragment_version(scope):
+    """Current version stamp of a scope.
+
+    Versions are timestamps rather than counters so that a version evicted
+    from the cache is replaced by a new one instead of restarting at a value
+    older fragments were cached under.
+    """
+    return cache.get_or_set(_version_key(scope), time.time_ns, None)
+
+
+def invalidate_fragments(user_ids):
+    """Orphan the cached fragments of ``user_ids`` and the shared admin fragments"""
+    scopes = {str(user_id) for user_id in user_ids if user_id}
+    scopes.add(GLOBAL_SCOPE)
+    version = time.time_ns()
+    cache.set_many({_version_key(scope): version for scope in scopes}, None)
+
+
+def schedule_fragment_invalidation(user_ids):
+    """Invalidate fragments once the current transaction commits.
+
+    Callbacks run in registration order, so scheduling this after an activity
+    refresh guarantees fragments are never re-cached from a stale summary.
+    """
+    user_ids = set(user_ids)
+    transaction.on_commit(lambda: invalidate_fragments(user_ids))
+
+
+def render_fragment(request, name, template_name, get_context, scope):
+    """Return a fragment's HTML from the cache, rendering it on a miss"""
+    key = f'dashboard:fragment:{name}:{scope}:{fragment_version(scope)}'
+    html = cache.get(key)
+    if html is None:
+        html = render_to_string(template_name, get_context(), request=request)
+        cache.set(key, html, FRAGMENT_TIMEOUT)
+    return html
+
+
+# Context builders, one per panel. Each receives the requesting user.
+
+def admin_stats_fragment(user):
+    return {
+        'stats': {
+            'total_users': User.objects.count(),
+            'total_students': User.objects.filter(role='Student').count(),
+            'total_tutors': User.objects.filter(role='Tutor').count(),
+            'total_sessions': Session.objects.count(),
+            'pending_applications': TutorApplication.objects.filter(status='Pending').count(),
+        }
+    }
+
+
+def admin_recent_users_fragment(user):
+    return {'recent_users': User.objects.all()[:10]}
+
+
+def admin_recent_applications_fragment(user):
+    return {
+        'recent_applications': TutorApplication.objects.select_related('user', 'program', 'year')[:10]
+    }
+
+
+def student_stats_fragment(user):
+    # Student profile (if any) together with the number of courses it enrolled in
+    student = Student.objects.filter(user=user).annotate(
+        registered_courses_count=Count('enrollments')
+    ).first()
+    # Counters are read from the user's precomputed activity summary
+    summary = get_activity_summary(user)
+    return {
+        'upcoming_count': summary.learner_upcoming_count,
+        'upcoming_this_week': summary.learner_upcoming_this_week,
+        'registered_courses_count': student.registered_courses_count if student else 0,
+        'pending_feedback_count': summary.pending_feedback_count,
+        'total_hours': summary.learner_total_hours,
+        'hours_this_month': summary.learner_month_hours,
+    }
+
+
+def student_upcoming_fragment(user):
+    # Upcoming Sessions (as learner, first 5), recurring occurrences expanded in between
+    now = timezone.now()
+    sessions = list(Session.objects.filter(
+        learner=user,
+        session_date__gte=now,
+        status='Scheduled'
+    ).select_related('tutor', 'course').order_by('session_date')[:5])
+    occurrences = upcoming_occurrences(user, now=now, role='learner')
+    return {
+        'upcoming_sessions': sorted(sessions + occurrences, key=lambda session: session.session_date)[:5]
+    }
+
+
+def student_recent_fragment(user):
+    # Recent Sessions (last 5)
+    return {
+        'recent_sessions': list(Session.objects.filter(
+            Q(learner=user) | Q(tutor=user)
+        ).select_related('tutor', 'learner', 'course').order_by('-session_date')[:5])
+    }
+
+
+def student_pending_fragment(user):
+    return {'pending_feedback_count': get_activity_summary(user).pending_feedback_count}
+
+
+def enhanced_stats_fragment(user):
+    if user.role == 'Student':
+        summary = get_activity_summary(user)
+        return {
+            'student': Student.objects.filter(user=user).select_related('program', 'year').first(),
+            'completed_sessions': summary.learner_completed_count,
+            'upcoming_count': summary.learner_upcoming_count,
+            'pending_feedback_count': summary.pending_feedback_count,
+        }
+    if user.role == 'Tutor':
+        summary = get_activity_summary(user)
+        return {
+            'total_hours': summary.tutor_total_hours,
+            'total_sessions': summary.tutor_completed_count,
+            'upcoming_count': summary.tutor_upcoming_count,
+        }
+    return {}
+
+
+# (dashboard, panel) -> (template, context builder)
+DASHBOARD_FRAGMENTS = {
+    ('admin', 'stats'): ('core/fragments/admin_stats.html', admin_stats_fragment),
+    ('admin', 'recent_users'): ('core/fragments/admin_recent_users.html', admin_recent_users_fragment),
+    ('admin', 'recent_applications'): (
+        'core/fragments/admin_recent_applications.html', admin_recent_applications_fragment
+    ),
+    ('student', 'stats'): ('core/fragments/student_stats.html', student_stats_fragment),
+    ('student', 'upcoming'): ('core/fragments/student_upcoming.html', student_upcoming_fragment),
+    ('student', 'recent'): ('core/fragments/student_recent.html', student_recent_fragment),
+    ('student', 'pending'): ('core/fragments/student_pending.html', student_pending_fragment),
+    ('enhanced', 'stats'): ('core/fragments/enhanced_stats.html', enhanced_stats_fragment),
+}
+
@@ -0,0 +1,283 @@
+"""iCalendar (ICS) feeds of a user's sessions for phone and desktop calendars
+
+Calendar clients cannot log in, so each feed URL carries a signed token of
+the user id and the user's ``calendar_key``; replacing the key revokes every
+URL issued before. Clients poll every few minutes: the ETag is a per-user
+stamp in the shared cache, replaced whenever a session or series of the user
+(or the name of someone they meet) changes, so an unchanged feed is answered
+with a 304 without touching the session tables. A changed feed is streamed
+from the (tutor, session_date) and (learner, session_date) indexes; recurring
+series go out as one event with an RRULE, in local time described by a
+VTIMEZONE, instead of one event per week.
+"""
+import secrets
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .catalog import get_catalog
+
+FEED_SALT = 'core.ics.feed'
+
+# Past sessions kept in the feed; older ones stay in the calendars that already have them
+FEED_HISTORY_DAYS = 180
+
+# Rows fetched per database round trip while streaming
+FEED_CHUNK_SIZE = 500
+
+_STATUSES = {'Scheduled': 'CONFIRMED', 'Completed': 'CONFIRMED', 'Cancelled': 'CANCELLED'}
+
+
+def feed_token(user):
+    """Signed feed token of ``user``, giving them a calendar key on first use"""
+    if not user.calendar_key:
+        rotate_feed_key(user)
+    return signing.Signer(salt=FEED_SALT).sign(f'{user.pk}.{user.calendar_key}')
+
+
+def rotate_feed_key(user):
+    """Give ``user`` a new calendar key, revoking their existing feed URLs"""
+    user.calendar_key = secrets.token_hex(16)
+    user.save(update_fields=['calendar_key'])
+
+
+def feed_user_id(token):
+    """Id of the active user a feed token belongs to, or None for a forged, revoked or malformed token"""
+    from .models import User
+
+    try:
+        user_id, key = signing.Signer(salt=FEED_SALT).unsign(token).split('.')
+        user_id = int(user_id)
+    except (signing.BadSignature, ValueError):
+        return None
+    if not key or not User.objects.filter(pk=user_id, calendar_key=key, is_active=True).exists():
+        return None
+    return user_id
+
+
+def _stamp_key(user_id):
+    return f'ics:stamp:{user_id}'
+
+
+def feed_etag(user_id):
+    """Changes whenever a session or series of the user is created, edited or deleted"""
+    # A timestamp, so a stamp evicted from the cache comes back as a value no client has seen
+    stamp = cache.get_or_set(_stamp_key(user_id), time.time_ns, None)
+    # Course names appear in the events too
+    return f'ics-{user_id}-{stamp}-{get_catalog().version}'
+
+
+def invalidate_feeds(user_ids):
+    stamp = time.time_ns()
+    cache.set_many({_stamp_key(user_id): stamp for user_id in set(user_ids) if user_id}, None)
+
+
+def schedule_feed_invalidation(user_ids):
+    """Give the users' feeds a new ETag once the current transaction commits"""
+    user_ids = set(user_ids)
+    transaction.on_commit(lambda: invalidate_feeds(user_ids))
+
+
+def counterpart_ids(user_id):
+    """Users who have a session or series with ``user_id``, whose feeds show their name"""
+    from .models import Session, SessionSeries
+
+    ids = set()
+    for model in (Session, SessionSeries):
+        ids.update(model.objects.filter(tutor_id=user_id).values_list('learner_id', flat=True).distinct())
+        ids.update(model.objects.filter(learner_id=user_id).values_list('tutor_id', flat=True).distinct())
+    return ids
+
+
+def _escape(value):
+    return (value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _line(name, value):
+    """One content line, folded at 75 octets as RFC 5545 requires"""
+    line = f'{name}:{value}'.encode()
+    chunks = []
+    while len(line) > 75:
+        cut = 75 if not chunks else 74
+        # Never split a multi-byte character
+        while cut and (line[cut] & 0xC0) == 0x80:
+            cut -= 1
+        chunks.append(line[:cut])
+        line = line[cut:]
+    chunks.append(line)
+    return (b'\r\n '.join(chunks) + b'\r\n').decode()
+
+
+def _utc(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _local(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def _offset(delta):
+    minutes = int(delta.total_seconds()) // 60
+    sign = '-' if minutes < 0 else '+'
+    return f'{sign}{abs(minutes) // 60:02d}{abs(minutes) % 60:02d}'
+
+
+def _transitions(zone, year):
+    """(UTC instant, offset before, offset after) of each offset change of ``zone`` during ``year``"""
+    def offset(instant):
+        return instant.astimezone(zone).utcoffset()
+
+    instant = datetime(year, 1, 1, tzinfo=dt_timezone.utc)
+    end = datetime(year + 1, 1, 1, tzinfo=dt_timezone.utc)
+    changes = []
+    while instant < end:
+        following = instant + timedelta(days=1)
+        if offset(instant) != offset(following):
+            # Narrow the change down to the minute
+            low, high = instant, following
+            while high - low > timedelta(minutes=1):
+                middle = low + (high - low) / 2
+                low, high = (middle, high) if offset(middle) == offset(low) else (low, middle)
+            # Offsets change on whole minutes, and exactly one lies in (low, high]
+            changes.append((high.replace(second=0, microsecond=0), offset(low), offset(high)))
+        instant = following
+    return changes
+
+
+def vtimezone(tzid, first_year, last_year):
+    """VTIMEZONE describing ``tzid`` from ``first_year`` to ``last_year``, which TZID= times refer to"""
+    zone = ZoneInfo(tzid)
+    start = datetime(first_year, 1, 1, tzinfo=dt_timezone.utc).astimezone(zone)
+    lines = ['BEGIN:VTIMEZONE\r\n', _line('TZID', tzid)]
+
+    def observance(kind, local_start, before, after, name):
+        return [f'BEGIN:{kind}\r\n', _line('DTSTART', _local(local_start)),
+                _line('TZOFFSETFROM', _offset(before)), _line('TZOFFSETTO', _offset(after)),
+                _line('TZNAME', _escape(name or tzid)), f'END:{kind}\r\n']
+
+    # The offset in force before the first change covered
+    lines += observance('DAYLIGHT' if start.dst() else 'STANDARD', datetime(1970, 1, 1),
+                        start.utcoffset(), start.utcoffset(), start.tzname())
+    for year in range(first_year, last_year + 1):
+        for instant, before, after in _transitions(zone, year):
+            local = instant.astimezone(zone)
+            lines += observance('DAYLIGHT' if local.dst() else 'STANDARD',
+                                (instant + before).replace(tzinfo=None), before, after, local.tzname())
+    lines.append('END:VTIMEZONE\r\n')
+    return ''.join(lines)
+
+
+def _summary(course_code, course_name, role, first_name, last_name):
+    other = f'{first_name} {last_name}'.strip()
+    return f'PAL {course_code} {course_name} ({role}: {other})'
+
+
+def session_rows(user_id, since):
+    """Sessions of ``user_id`` as tutor or learner starting from ``since``, earliest first"""
+    from .models import Session
+
+    fields = (
+        'pk', 'session_date', 'duration', 'status', 'notes', 'updated_at', 'tutor_id',
+        'course__code', 'course__name', 'tutor__first_name', 'tutor__last_name',
+        'learner__first_name', 'learner__last_name',
+    )
+    window = Session.objects.filter(session_date__gte=since, series__isnull=True)
+    probes = [window.filter(**{field: user_id}).values_list(*fields).order_by()
+              for field in ('tutor_id', 'learner_id')]
+    return probes[0].union(probes[1]).order_by('session_date')
+
+
+def series_rows(user_id, since):
+    from .models import SessionSeries
+
+    return SessionSeries.objects.filter(
+        Q(tutor_id=user_id) | Q(learner_id=user_id), end_date__gte=timezone.localdate(since),
+    ).select_related('tutor', 'learner', 'course').prefetch_related('sessions')
+
+
+def _event(uid, start, duration, summary, status, stamp, notes):
+    yield 'BEGIN:VEVENT\r\n'
+    yield _line('UID', uid)
+    yield _line('DTSTAMP', _utc(stamp))
+    yield _line('DTSTART', _utc(start))
+    yield _line('DURATION', f'PT{duration}M')
+    yield _line('SUMMARY', _escape(summary))
+    yield _line('STATUS', status)
+    if notes:
+        yield _line('DESCRIPTION', _escape(notes))
+    yield 'END:VEVENT\r\n'
+
+
+def _rule_event(series, uid, summary):
+    tzid = settings.TIME_ZONE
+    # Times repeat in local time, so the event keeps its hour across DST changes
+    start = datetime.combine(series.start_date, series.start_time)
+    until = timezone.make_aware(datetime.combine(series.end_date, series.start_time))
+    interval = ';INTERVAL=2' if series.recurrence == 'biweekly' else ''
+    # Recorded occurrences are sent as events of their own
+    excluded = set(series.exceptions) | {session.occurrence_date.isoformat() for session in series.sessions.all()}
+
+    yield 'BEGIN:VEVENT\r\n'
+    yield _line('UID', uid)
+    yield _line('DTSTAMP', _utc(series.updated_at))
+    yield _line(f'DTSTART;TZID={tzid}', _local(start))
+    yield _line('DURATION', f'PT{series.duration}M')
+    yield _line('RRULE', f'FREQ=WEEKLY{interval};UNTIL={_utc(until)}')
+    for day in sorted(excluded):
+        yield _line(f'EXDATE;TZID={tzid}', _local(datetime.combine(date.fromisoformat(day), series.start_time)))
+    yield _line('SUMMARY', _escape(summary))
+    yield _line('STATUS', 'CONFIRMED')
+    if series.notes:
+        yield _line('DESCRIPTION', _escape(series.notes))
+    yield 'END:VEVENT\r\n'
+
+
+def _series_events(series, user_id, host):
+    role, other = ('Learner', series.learner) if series.tutor_id == user_id else ('Tutor', series.tutor)
+    summary = _summary(series.course.code, series.course.name, role, other.first_name, other.last_name)
+
+    yield ''.join(_rule_event(series, f'series-{series.pk}@{host}', summary))
+    for session in series.sessions.all():
+        yield ''.join(_event(f'session-{session.pk}@{host}', session.session_date, session.duration, summary,
+                             _STATUSES.get(session.status, 'CONFIRMED'), session.updated_at, session.notes))
+
+
+def stream_feed(user_id, host, now=None):
+    """Chunks of the ICS document of ``user_id``'s sessions"""
+    since = (now or timezone.now()) - timedelta(days=FEED_HISTORY_DAYS)
+
+    yield ''.join([
+        'BEGIN:VCALENDAR\r\n',
+        _line('VERSION', '2.0'),
+        _line('PRODID', '-//AGU PAL//Sessions//EN'),
+        _line('CALSCALE', 'GREGORIAN'),
+        _line('X-WR-CALNAME', 'PAL Sessions'),
+    ])
+
+    rows = session_rows(user_id, since).iterator(chunk_size=FEED_CHUNK_SIZE)
+    for (pk, start, duration, status, notes, updated_at, tutor_id, course_code, course_name,
+         tutor_first, tutor_last, learner_first, learner_last) in rows:
+        if tutor_id == user_id:
+            summary = _summary(course_code, course_name, 'Learner', learner_first, learner_last)
+        else:
+            summary = _summary(course_code, course_name, 'Tutor', tutor_first, tutor_last)
+        yield ''.join(_event(f'session-{pk}@{host}', start, duration, summary,
+                             _STATUSES.get(status, 'CONFIRMED'), updated_at, notes))
+
+    series_list = list(series_rows(user_id, since))
+    if series_list:
+        # Series repeat in local time; the zone they refer to comes before them
+        yield vtimezone(settings.TIME_ZONE, min(series.start_date for series in series_list).year,
+                        max(series.end_date for series in series_list).year)
+    for series in series_list:
+        yield from _series_events(series, user_id, host)
+
+    yield 'END:VCALENDAR\r\n'
@@ -0,0 +1,152 @@
+"""Incremental term-frequency index over feedback comments"""
+import re
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .topics import topic_month
+
+WATERMARK_NAME = 'comment_terms'
+
+# Rows committed slightly out of updated_at order are picked up again on the next run
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+TOKEN_RE = re.compile(r"[a-z]+(?:'[a-z]+)?")
+MIN_TERM_LENGTH = 3
+MAX_TERM_LENGTH = 50
+
+STOP_WORDS = frozenset("""
+    about above after again against all also and any are aren't because been before being below
+    between both but can can't could couldn't did didn't does doesn't doing don't down during each
+    few for from further had hadn't has hasn't have haven't having her here hers herself him
+    himself his how i'm i've into isn't it's its itself just let's more most much mustn't myself
+    nor not now off once only other ought our ours ourselves out over own really same session
+    sessions shan't she she's should shouldn't some such than that that's the their theirs them
+    themselves then there there's these they they're this those through too under until very was
+    wasn't we're were weren't what what's when where which while who whom why will with won't
+    would wouldn't you you're your yours yourself yourselves
+""".split())
+
+
+def tokenize(text):
+    """Count the meaningful terms in a comment"""
+    terms = Counter()
+    for token in TOKEN_RE.findall((text or '').lower()):
+        if MIN_TERM_LENGTH <= len(token) <= MAX_TERM_LENGTH and token not in STOP_WORDS:
+            terms[token] += 1
+    return terms
+
+
+def comment_state(feedback):
+    """Bucket and term counts a feedback contributes to the index"""
+    terms = tokenize(feedback.comments)
+    if not terms:
+        return None
+    return {
+        'tutor': feedback.tutor_id,
+        'program': feedback.program_id,
+        'month': topic_month(feedback.session_date).isoformat(),
+        'terms': dict(terms),
+    }
+
+
+def add_state(deltas, state, sign):
+    """Accumulate the contribution of an indexed state into ``deltas``"""
+    if not state:
+        return
+    bucket = (state['tutor'], state['program'], date.fromisoformat(state['month']))
+    for term, count in state['terms'].items():
+        deltas[bucket + (term,)] += sign * count
+
+
+def apply_deltas(deltas):
+    """Apply accumulated count changes with atomic upserts, safe against concurrent indexers
+
+    Missing rows are inserted at zero (conflicts ignored, so two indexers can
+    create the same term at once), then counts move with one ``F()`` UPDATE
+    per bucket and delta, and rows that dropped to zero are deleted.
+    """
+    from .models import CommentTermFrequency
+
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    by_change = defaultdict(set)
+    for (tutor_id, program_id, month, term), delta in deltas.items():
+        by_change[(tutor_id, program_id, month, delta)].add(term)
+
+    with transaction.atomic():
+        CommentTermFrequency.objects.bulk_create(
+            [CommentTermFrequency(tutor_id=tutor_id, program_id=program_id, month=month, term=term, count=0)
+             for (tutor_id, program_id, month, term), delta in deltas.items() if delta > 0],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+        touched = Q()
+        for (tutor_id, program_id, month, delta), terms in by_change.items():
+            bucket = Q(tutor_id=tutor_id, program_id=program_id, month=month, term__in=terms)
+            CommentTermFrequency.objects.filter(bucket).update(count=F('count') + delta)
+            touched |= bucket
+        CommentTermFrequency.objects.filter(touched, count__lte=0).delete()
+
+
+def index_feedbacks(feedbacks):
+    """Re-index a batch of feedbacks, counting only what changed since their last indexing"""
+    from .models import Feedback
+
+    deltas = Counter()
+    changed = []
+    for feedback in feedbacks:
+        state = comment_state(feedback)
+        if state == feedback.indexed_terms:
+            continue
+        add_state(deltas, feedback.indexed_terms, -1)
+        add_state(deltas, state, 1)
+        feedback.indexed_terms = state
+        changed.append(feedback)
+
+    with transaction.atomic():
+        apply_deltas(deltas)
+        # bulk_update leaves updated_at alone, so indexing never re-triggers itself
+        Feedback.objects.bulk_update(changed, ['indexed_terms'], batch_size=500)
+    return len(changed)
+
+
+def update_comment_index(batch_size=1000, full=False):
+    """Index feedback changed since the last run and advance the watermark.
+
+    Returns ``(scanned, changed)``.
+    """
+    from .models import CommentTermFrequency, Feedback, Watermark
+
+    watermark, _ = Watermark.objects.get_or_create(name=WATERMARK_NAME)
+    if full:
+        CommentTermFrequency.objects.all().delete()
+        Feedback.objects.exclude(indexed_terms=None).update(indexed_terms=None)
+        watermark.value = None
+
+    started_at = timezone.now()
+    feedbacks = Feedback.objects.only(
+        'id', 'tutor_id', 'program_id', 'session_date', 'comments', 'indexed_terms', 'updated_at'
+    ).order_by('updated_at', 'id')
+    if watermark.value:
+        feedbacks = feedbacks.filter(updated_at__gte=watermark.value - WATERMARK_OVERLAP)
+
+    scanned = changed = 0
+    batch = []
+    for feedback in feedbacks.iterator(chunk_size=batch_size):
+        batch.append(feedback)
+        if len(batch) >= batch_size:
+            scanned += len(batch)
+            changed += index_feedbacks(batch)
+            batch = []
+    scanned += len(batch)
+    changed += index_feedbacks(batch)
+
+    watermark.value = started_at
+    watermark.save()
+    return scanned, changed
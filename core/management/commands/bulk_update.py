@@ -0,0 +1,64 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.bulk import delete_feedback, set_application_status, set_session_status, set_training_completed
+from core.models import Feedback, Session, TutorApplication
+
+# action -> (model, program lookup, date lookup, change)
+ACTIONS = {
+    'approve-applications': (TutorApplication, 'program__code', 'created_at',
+                             lambda qs: set_application_status(qs, 'Approved')),
+    'reject-applications': (TutorApplication, 'program__code', 'created_at',
+                            lambda qs: set_application_status(qs, 'Rejected')),
+    'complete-training': (TutorApplication, 'program__code', 'created_at',
+                          lambda qs: set_training_completed(qs, True)),
+    'complete-sessions': (Session, 'course__program__code', 'session_date',
+                          lambda qs: set_session_status(qs, 'Completed')),
+    'cancel-sessions': (Session, 'course__program__code', 'session_date',
+                        lambda qs: set_session_status(qs, 'Cancelled')),
+    'delete-feedback': (Feedback, 'program__code', 'created_at', delete_feedback),
+}
+
+
+class Command(BaseCommand):
+    help = 'Approve applications, close sessions or delete feedback in bulk with set-based updates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=sorted(ACTIONS))
+        parser.add_argument('--ids', help='Comma-separated ids to limit the selection to')
+        parser.add_argument('--program', help='Program code, e.g. MD')
+        parser.add_argument('--status', help='Only rows currently in this status (applications and sessions)')
+        parser.add_argument('--before', help='Only rows dated before YYYY-MM-DD (session date, else creation date)')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows are selected')
+
+    def handle(self, *args, **options):
+        model, program_lookup, date_lookup, change = ACTIONS[options['action']]
+        queryset = model.objects.all()
+
+        if options['ids']:
+            try:
+                ids = [int(value) for value in options['ids'].split(',') if value.strip()]
+            except ValueError:
+                raise CommandError('--ids must be comma-separated numbers')
+            queryset = queryset.filter(pk__in=ids)
+        if options['program']:
+            queryset = queryset.filter(**{program_lookup: options['program']})
+        if options['status']:
+            if model is Feedback:
+                raise CommandError('Feedback has no status')
+            queryset = queryset.filter(status=options['status'])
+        if options['before']:
+            try:
+                before = datetime.strptime(options['before'], '%Y-%m-%d')
+            except ValueError:
+                raise CommandError('--before must be a date (YYYY-MM-DD)')
+            queryset = queryset.filter(**{f'{date_lookup}__lt': timezone.make_aware(before)})
+
+        if options['dry_run']:
+            self.stdout.write(f"{queryset.count()} {model._meta.verbose_name_plural} selected")
+            return
+
+        changed = change(queryset)
+        self.stdout.write(self.style.SUCCESS(f"{options['action']}: {changed} {model._meta.verbose_name_plural} changed"))
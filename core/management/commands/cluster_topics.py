@@ -0,0 +1,95 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, DateField
+from django.db.models.functions import TruncMonth
+
+from core.models import Feedback, TopicAlias, TopicCount
+from core.topics import DEFAULT_SIMILARITY, canonical_labels, cluster_topic_keys, normalize_topic
+
+
+class Command(BaseCommand):
+    help = 'Normalize feedback topics, merge near-duplicates and rebuild the topic count index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, default=DEFAULT_SIMILARITY,
+                            help=f'Trigram similarity needed to merge two topics (default {DEFAULT_SIMILARITY})')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report the clusters that would be merged')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # 1. Backfill keys for feedback saved before the topic index existed
+        backfilled = 0
+        pending = Feedback.objects.filter(topic_key='').exclude(topic='').only('id', 'topic')
+        batch = []
+        for feedback in pending.iterator(chunk_size=batch_size):
+            feedback.topic_key = normalize_topic(feedback.topic)
+            batch.append(feedback)
+            if len(batch) >= batch_size:
+                backfilled += self._save_keys(batch, options['dry_run'])
+                batch = []
+        backfilled += self._save_keys(batch, options['dry_run'])
+        self.stdout.write(f'Backfilled {backfilled} topic keys')
+
+        # 2. Cluster distinct keys with trigram similarity
+        key_counts = dict(
+            Feedback.objects.exclude(topic_key='').values_list('topic_key').annotate(n=Count('id'))
+        )
+        aliases = cluster_topic_keys(key_counts, threshold=options['threshold'])
+        for alias, canonical in sorted(aliases.items(), key=lambda item: item[1]):
+            self.stdout.write(f'  {alias!r} -> {canonical!r}')
+        self.stdout.write(f'Merged {len(aliases)} of {len(key_counts)} topic keys')
+
+        if options['dry_run']:
+            return
+
+        with transaction.atomic():
+            # Point existing aliases at the new canonical keys and record the new ones
+            for alias, canonical in aliases.items():
+                TopicAlias.objects.filter(topic_key=alias).update(topic_key=canonical)
+            TopicAlias.objects.bulk_create(
+                [TopicAlias(alias=alias, topic_key=canonical) for alias, canonical in aliases.items()],
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=['alias'],
+                update_fields=['topic_key'],
+            )
+
+            by_canonical = {}
+            for alias, canonical in aliases.items():
+                by_canonical.setdefault(canonical, []).append(alias)
+            for canonical, merged in by_canonical.items():
+                Feedback.objects.filter(topic_key__in=merged).update(topic_key=canonical)
+
+            # 3. Rebuild the per program/month counts from scratch, labelled with
+            # the most used spelling of each topic
+            labels = canonical_labels(
+                Feedback.objects.exclude(topic_key='').values_list('topic_key', 'topic').annotate(n=Count('id'))
+            )
+            rows = (
+                Feedback.objects.exclude(topic_key='')
+                .annotate(month=TruncMonth('session_date', output_field=DateField()))
+                .values('program_id', 'month', 'topic_key')
+                .annotate(count=Count('id'))
+            )
+            TopicCount.objects.all().delete()
+            TopicCount.objects.bulk_create(
+                [
+                    TopicCount(program_id=row['program_id'], month=row['month'],
+                               topic_key=row['topic_key'], label=labels[row['topic_key']],
+                               count=row['count'])
+                    for row in rows
+                ],
+                batch_size=batch_size,
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Topic index rebuilt: {TopicCount.objects.count()} program/month buckets'
+        ))
+
+    def _save_keys(self, batch, dry_run):
+        if batch and not dry_run:
+            Feedback.objects.bulk_update(batch, ['topic_key'])
+        return len(batch)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.keywords import update_comment_index
+
+
+class Command(BaseCommand):
+    help = 'Update the comment keyword index with feedback changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Drop the index and re-tokenize every feedback comment')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        scanned, changed = update_comment_index(
+            batch_size=options['batch_size'],
+            full=options['full'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Scanned {scanned} feedbacks, re-indexed {changed}'
+        ))
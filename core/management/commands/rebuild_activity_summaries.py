@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from core.activity import current_summary_year, refresh_activity
+from core.models import EvaluationYear, Session, UserActivitySummary
+
+
+class Command(BaseCommand):
+    help = 'Rebuild dashboard activity summaries (use --stale from cron to roll over time buckets)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale', action='store_true',
+                            help='Only recompute summaries whose time buckets have expired')
+        parser.add_argument('--year', help='Evaluation year to rebuild, e.g. 2025-26 (default: active year)')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        if options['stale']:
+            stale = UserActivitySummary.objects.filter(next_rollover__lte=timezone.now())
+            pairs = stale.values_list('evaluation_year_id', 'user_id').order_by('evaluation_year_id')
+            by_year = {}
+            for year_id, user_id in pairs.iterator(chunk_size=batch_size):
+                by_year.setdefault(year_id, []).append(user_id)
+            total = 0
+            for year_id, user_ids in by_year.items():
+                for start in range(0, len(user_ids), batch_size):
+                    refresh_activity(user_ids[start:start + batch_size], year_id)
+                total += len(user_ids)
+            self.stdout.write(self.style.SUCCESS(f'Rolled over {total} activity summaries'))
+            return
+
+        if options['year']:
+            try:
+                year_id = EvaluationYear.objects.get(year=options['year']).pk
+            except EvaluationYear.DoesNotExist:
+                raise CommandError(f"Evaluation year {options['year']} does not exist")
+        else:
+            year_id = current_summary_year()
+
+        # The summary without a year covers every session
+        sessions = Session.objects.filter(Q(evaluation_year_id=year_id) if year_id else Q())
+        user_ids = set(sessions.values_list('tutor_id', flat=True).distinct())
+        user_ids.update(sessions.values_list('learner_id', flat=True).distinct())
+        user_ids.update(
+            UserActivitySummary.objects.filter(evaluation_year_id=year_id).values_list('user_id', flat=True)
+        )
+
+        user_ids = sorted(user_ids)
+        for start in range(0, len(user_ids), batch_size):
+            refresh_activity(user_ids[start:start + batch_size], year_id)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(user_ids)} activity summaries'))
@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.reconciliation import DEFAULT_GRACE, RECONCILED_STATUSES, reconcile_sessions
+
+
+class Command(BaseCommand):
+    help = 'Close scheduled sessions that have ended since the last run (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', choices=RECONCILED_STATUSES, default='Completed',
+                            help='Status given to overdue sessions (default: Completed)')
+        parser.add_argument('--grace', type=int, default=int(DEFAULT_GRACE.total_seconds() // 60),
+                            help='Minutes after its end before a session counts as overdue')
+        parser.add_argument('--full', action='store_true',
+                            help='Check every scheduled session instead of those changed since the last run')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many sessions would be closed')
+
+    def handle(self, *args, **options):
+        if options['grace'] < 0:
+            raise CommandError('--grace must not be negative')
+        scanned, closed = reconcile_sessions(
+            status=options['status'],
+            grace=timedelta(minutes=options['grace']),
+            batch_size=options['batch_size'],
+            full=options['full'],
+            dry_run=options['dry_run'],
+        )
+        verb = 'would mark' if options['dry_run'] else 'marked'
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {scanned} scheduled sessions, {verb} {closed} as {options['status']}"
+        ))
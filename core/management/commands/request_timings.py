@@ -0,0 +1,42 @@
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+
+from core.timing import BUCKETS_MS, histograms, percentile
+
+
+def _format(counts, fraction):
+    value = percentile(counts, fraction)
+    return f'>{BUCKETS_MS[-1]}' if value is None else f'<={value}'
+
+
+class Command(BaseCommand):
+    help = ('Show per-view request latency histograms collected by the timing middleware '
+            '(needs the shared Redis cache the web workers write to)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Clear the collected histograms')
+
+    def handle(self, *args, **options):
+        if isinstance(caches['default'], LocMemCache):
+            raise CommandError('The cache is local to each process, so the web workers\' timings are not visible '
+                               'here; set REDIS_URL')
+        if options['reset']:
+            histograms.reset()
+            self.stdout.write(self.style.SUCCESS('Cleared request timings'))
+            return
+
+        rows = [(view, counts, total_ms) for view, (counts, total_ms) in histograms.snapshot().items() if sum(counts)]
+        if not rows:
+            self.stdout.write('No requests recorded yet')
+            return
+
+        rows.sort(key=lambda row: row[2], reverse=True)
+        width = max(len(view) for view, _, _ in rows)
+        self.stdout.write(f"{'view':<{width}}  {'requests':>8}  {'mean ms':>8}  {'p50':>7}  {'p95':>7}  {'p99':>7}")
+        for view, counts, total_ms in rows:
+            requests = sum(counts)
+            self.stdout.write(
+                f'{view:<{width}}  {requests:>8}  {total_ms / requests:>8.1f}  '
+                f'{_format(counts, 0.5):>7}  {_format(counts, 0.95):>7}  {_format(counts, 0.99):>7}'
+            )
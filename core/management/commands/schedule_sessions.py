@@ -0,0 +1,45 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Program, StudentCourse
+from core.overlaps import MAX_DURATION
+from core.scheduling import DEFAULT_DURATION, next_week_start, schedule_week
+
+
+class Command(BaseCommand):
+    help = 'Pair waiting learners with tutors for a week and create their sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--week', help='Any date in the week to schedule, e.g. 2025-11-03 (default: next week)')
+        parser.add_argument('--program', help='Only schedule enrollments of this program code')
+        parser.add_argument('--duration', type=int, default=DEFAULT_DURATION, help='Session length in minutes')
+        parser.add_argument('--dry-run', action='store_true', help='Report the schedule without creating sessions')
+
+    def handle(self, *args, **options):
+        if options['week']:
+            try:
+                day = date.fromisoformat(options['week'])
+            except ValueError:
+                raise CommandError(f"Invalid date: {options['week']}")
+            week_start = day - timedelta(days=day.weekday())
+        else:
+            week_start = next_week_start()
+
+        if not 1 <= options['duration'] <= MAX_DURATION:
+            raise CommandError(f'--duration must be between 1 and {MAX_DURATION} minutes')
+
+        enrollments = StudentCourse.objects.all()
+        if options['program']:
+            try:
+                enrollments = enrollments.for_program(Program.objects.get(code=options['program']))
+            except Program.DoesNotExist:
+                raise CommandError(f"Program {options['program']} does not exist")
+
+        schedule = schedule_week(enrollments, week_start, duration=options['duration'],
+                                 commit=not options['dry_run'])
+        verb = 'Would create' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {len(schedule.sessions)} sessions for the week of {week_start:%Y-%m-%d}; '
+            f'{len(schedule.unmatched)} enrollments left unmatched'
+        ))
@@ -0,0 +1,301 @@
+"""Rank approved tutors for a learner and course
+
+Each process keeps an index of approved tutor applications keyed by
+(program, course) together with every tutor's feedback score. The index is
+refreshed incrementally from ``updated_at``: only applications and feedback
+changed since the last refresh are reloaded. Deletes cannot be seen that way,
+so they publish a new version and every process rebuilds from scratch.
+Refreshes build new dicts and swap them in, so ranking reads the index
+without taking the lock.
+"""
+import heapq
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max
+from django.utils import timezone
+
+from .availability import build_mask, mask_days, mask_slots, overlap
+from .directory import is_near_peer
+from .workload import week_of, weekly_loads
+
+VERSION_KEY = 'matching:version'
+
+# How often a process looks for changed applications and feedback
+REFRESH_INTERVAL = 30.0
+
+# Rows committed slightly out of updated_at order are picked up on the next refresh
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+DEFAULT_LIMIT = 10
+
+# Score weights (each component is scaled to 0..1)
+WEIGHTS = {
+    'feedback': 0.40,
+    'availability': 0.25,
+    'capacity': 0.15,
+    'near_peer': 0.10,
+    'mode': 0.10,
+}
+
+# Feedback averages are smoothed towards this prior so one 5/5 review does not top the list
+PRIOR_RATING = 3.5
+PRIOR_WEIGHT = 3
+
+
+@dataclass(frozen=True)
+class TutorCandidate:
+    application_id: int
+    user_id: int
+    name: str
+    program_id: int
+    year_number: int
+    course_ids: frozenset
+    availability: int
+    mode: str
+    max_sessions_per_week: int
+
+
+@dataclass(frozen=True)
+class Match:
+    candidate: TutorCandidate
+    score: float
+    rating: float
+    reviews: int
+    remaining_capacity: int
+
+    def as_dict(self):
+        candidate = self.candidate
+        return {
+            'tutor_id': candidate.user_id,
+            'name': candidate.name,
+            'year_number': candidate.year_number,
+            'score': round(self.score, 3),
+            'rating': round(self.rating, 2) if self.reviews else None,
+            'reviews': self.reviews,
+            'remaining_capacity': self.remaining_capacity,
+            'preferred_days': mask_days(candidate.availability),
+            'preferred_times': mask_slots(candidate.availability),
+            'preferred_mode': candidate.mode,
+        }
+
+
+class MatchingIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self._candidates = {}      # application id -> TutorCandidate
+        self._by_course = {}       # (program id, course id) -> {application id: TutorCandidate}
+        self._ratings = {}         # tutor user id -> (average rating, review count)
+        self._applications_seen = None
+        self._feedback_seen = None
+        self._checked_at = 0.0
+
+    # -- refresh -------------------------------------------------------------
+
+    def refresh(self, force=False):
+        """Bring the index up to date (at most every REFRESH_INTERVAL seconds unless forced)"""
+        now = time.monotonic()
+        if not force and self.version is not None and now - self._checked_at < REFRESH_INTERVAL:
+            return
+        version = cache.get_or_set(VERSION_KEY, time.time_ns, None)
+        with self._lock:
+            # A new version rebuilds from empty; readers keep the old dicts until the swap below
+            reset = version != self.version
+            candidates, by_course, applications_seen = self._load_applications(reset)
+            ratings, feedback_seen = self._load_ratings(reset)
+            self._candidates, self._by_course, self._ratings = candidates, by_course, ratings
+            self._applications_seen, self._feedback_seen = applications_seen, feedback_seen
+            self.version = version
+            self._checked_at = now
+
+    def _load_applications(self, reset):
+        """New ``(candidates, by_course, seen)``: changes since the last load applied to copies, or everything"""
+        from .models import TutorApplication
+
+        seen = None if reset else self._applications_seen
+        applications = TutorApplication.objects.select_related('user', 'year')
+        if seen:
+            applications = applications.filter(updated_at__gte=seen - REFRESH_OVERLAP)
+        applications = list(applications.only(
+            'id', 'status', 'program_id', 'availability_mask', 'preferred_mode',
+            'max_sessions_per_week', 'updated_at',
+            'user__id', 'user__first_name', 'user__last_name', 'user__is_active', 'year__year_number',
+        ))
+        if not applications:
+            return ({}, {}, None) if reset else (self._candidates, self._by_course, seen)
+
+        course_ids = {}
+        through = TutorApplication.courses.through.objects.filter(
+            tutorapplication_id__in=[app.id for app in applications]
+        ).values_list('tutorapplication_id', 'course_id')
+        for application_id, course_id in through:
+            course_ids.setdefault(application_id, set()).add(course_id)
+
+        # Readers use the published dicts without the lock, so changes go to copies
+        candidates, by_course = ({}, {}) if reset else (dict(self._candidates), dict(self._by_course))
+        copied = set()
+
+        def bucket(key):
+            if key not in copied:
+                by_course[key] = dict(by_course.get(key, {}))
+                copied.add(key)
+            return by_course[key]
+
+        for app in applications:
+            previous = candidates.pop(app.id, None)
+            if previous is not None:
+                for course_id in previous.course_ids:
+                    bucket((previous.program_id, course_id)).pop(app.id, None)
+            if app.status == 'Approved' and app.user.is_active:
+                candidate = candidates[app.id] = TutorCandidate(
+                    application_id=app.id,
+                    user_id=app.user.id,
+                    name=app.user.get_full_name(),
+                    program_id=app.program_id,
+                    year_number=app.year.year_number,
+                    course_ids=frozenset(course_ids.get(app.id, ())),
+                    availability=app.availability_mask,
+                    mode=app.preferred_mode,
+                    max_sessions_per_week=app.max_sessions_per_week,
+                )
+                for course_id in candidate.course_ids:
+                    bucket((candidate.program_id, course_id))[app.id] = candidate
+        latest = max(app.updated_at for app in applications)
+        return candidates, by_course, max(latest, seen or latest)
+
+    def _load_ratings(self, reset):
+        """New ``(ratings, seen)``, like ``_load_applications``"""
+        from .models import Feedback
+
+        seen = None if reset else self._feedback_seen
+        feedback = Feedback.objects.all()
+        if seen:
+            changed = feedback.filter(updated_at__gte=seen - REFRESH_OVERLAP)
+            tutor_ids = set(changed.values_list('tutor_id', flat=True))
+            if not tutor_ids:
+                return self._ratings, seen
+            feedback = feedback.filter(tutor_id__in=tutor_ids)
+
+        rows = feedback.values('tutor_id').annotate(
+            average=Avg((F('explanation_rating') + F('usefulness_rating')) / 2.0),
+            reviews=Count('id'),
+            seen=Max('updated_at'),
+        ).order_by()
+        ratings = {} if reset else dict(self._ratings)
+        for row in rows:
+            ratings[row['tutor_id']] = (row['average'], row['reviews'])
+            if seen is None or row['seen'] > seen:
+                seen = row['seen']
+        return ratings, seen
+
+    # -- ranking -------------------------------------------------------------
+
+    def candidates(self, program_id, course_id):
+        return list(self._by_course.get((program_id, course_id), {}).values())
+
+    def match(self, course, learner_year=None, days=(), times=(), mode='', limit=DEFAULT_LIMIT,
+              exclude_user_ids=(), now=None):
+        """Best tutors for ``course``, highest score first.
+
+        ``learner_year`` applies the near-peer rule (see ``is_near_peer``);
+        ``days``/``times``/``mode`` are the learner's preferences.
+        """
+        self.refresh()
+        requested = build_mask(days, times)
+        mode = (mode or '').lower()
+
+        candidates = [
+            c for c in self.candidates(course.program_id, course.id)
+            if c.user_id not in exclude_user_ids and is_near_peer(c.year_number, learner_year)
+        ]
+        load = weekly_load({c.user_id for c in candidates}, now)
+
+        # A tutor may have several approved applications: keep the best one
+        best = {}
+        for candidate in candidates:
+            match = self.score(candidate, learner_year, requested, mode, load.get(candidate.user_id, 0))
+            if match is None:
+                continue
+            current = best.get(candidate.user_id)
+            if current is None or match.score > current.score:
+                best[candidate.user_id] = match
+        return heapq.nlargest(limit, best.values(), key=lambda m: (m.score, -m.candidate.user_id))
+
+    def score(self, candidate, learner_year, requested, mode, booked):
+        """Score one candidate (0..1), or None when the tutor has no capacity left"""
+        if candidate.max_sessions_per_week:
+            remaining = candidate.max_sessions_per_week - booked
+            if remaining <= 0:
+                return None
+            capacity = remaining / candidate.max_sessions_per_week
+        else:
+            remaining = None
+            capacity = 0.5
+
+        average, reviews = self._ratings.get(candidate.user_id, (None, 0))
+        smoothed = ((average or 0) * reviews + PRIOR_RATING * PRIOR_WEIGHT) / (reviews + PRIOR_WEIGHT)
+
+        if requested and not candidate.availability:
+            availability = 0.5
+        else:
+            availability = overlap(requested, candidate.availability)
+
+        tutor_mode = candidate.mode.lower()
+        if not mode or tutor_mode == mode or tutor_mode == 'hybrid':
+            mode_score = 1.0
+        elif not tutor_mode:
+            mode_score = 0.5
+        else:
+            mode_score = 0.0
+
+        if learner_year is None:
+            near_peer = 0.5
+        else:
+            # One year ahead is the ideal near-peer gap; peers in the same year come next
+            near_peer = max(0.4, 1.0 - 0.2 * abs(candidate.year_number - learner_year - 1))
+
+        score = (
+            WEIGHTS['feedback'] * smoothed / 5
+            + WEIGHTS['availability'] * availability
+            + WEIGHTS['capacity'] * capacity
+            + WEIGHTS['near_peer'] * near_peer
+            + WEIGHTS['mode'] * mode_score
+        )
+        return Match(candidate, score, average or 0.0, reviews, remaining)
+
+
+def weekly_load(tutor_ids, now=None):
+    """Sessions booked this week per tutor (cancelled sessions excluded)"""
+    if not tutor_ids:
+        return {}
+    return weekly_loads(tutor_ids, week_of(now or timezone.now()))
+
+
+matching_index = MatchingIndex()
+
+
+def find_tutors(course, learner=None, **preferences):
+    """Top tutor matches for ``course``; ``learner`` (a User) enables the near-peer rule"""
+    from .models import Student
+
+    learner_year = None
+    exclude = ()
+    if learner is not None:
+        learner_year = Student.objects.filter(user=learner).values_list(
+            'year__year_number', flat=True
+        ).first()
+        exclude = (learner.pk,)
+    return matching_index.match(course, learner_year=learner_year, exclude_user_ids=exclude, **preferences)
+
+
+def invalidate_matching():
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def schedule_matching_invalidation():
+    transaction.on_commit(invalidate_matching)
@@ -0,0 +1,71 @@
+"""Request timing: Server-Timing headers, latency histograms and a slow-request log"""
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .timing import histograms, record_query, track_request
+
+logger = logging.getLogger('core.requests')
+
+# Characters of each statement kept in the slow-request log
+LOGGED_SQL_LENGTH = 300
+
+
+class RequestTimingMiddleware:
+    """Time each request's queries and template rendering.
+
+    Adds ``db``, ``tpl`` and ``total`` entries to the ``Server-Timing``
+    header (in DEBUG or for staff only), counts the latency in the view's histogram and logs requests
+    slower than ``SLOW_REQUEST_MS`` with their costliest queries. Must come
+    first in ``MIDDLEWARE`` so the total covers the other middleware too.
+    Streaming responses are timed up to the start of the stream.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with track_request() as metrics, ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(record_query))
+            response = self.get_response(request)
+            elapsed = metrics.elapsed()
+
+        if self.shows_timings(request):
+            response['Server-Timing'] = ', '.join([
+                f'db;desc="{len(metrics.queries)} queries";dur={metrics.db_time * 1000:.1f}',
+                f'tpl;dur={metrics.template_time * 1000:.1f}',
+                f'total;dur={elapsed * 1000:.1f}',
+            ])
+
+        # Unresolved requests (static files, 404s) would only add noise
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            histograms.observe(match.view_name, elapsed)
+
+        slow_request_ms = getattr(settings, 'SLOW_REQUEST_MS', None)
+        if slow_request_ms is not None and elapsed * 1000 >= slow_request_ms:
+            self.log_slow_request(request, response, metrics, elapsed)
+        return response
+
+    @staticmethod
+    def shows_timings(request):
+        # Query counts and timings tell an attacker which requests are expensive
+        if settings.DEBUG:
+            return True
+        user = getattr(request, 'user', None)
+        return bool(user and user.is_staff)
+
+    def log_slow_request(self, request, response, metrics, elapsed):
+        lines = [
+            f'{count}x {total * 1000:.1f} ms  {sql[:LOGGED_SQL_LENGTH]}'
+            for sql, count, total in metrics.top_queries()
+        ]
+        logger.warning(
+            'Slow request %s %s -> %s: %.0f ms total, %d queries in %.0f ms, templates %.0f ms%s',
+            request.method, request.path, response.status_code, elapsed * 1000, len(metrics.queries),
+            metrics.db_time * 1000, metrics.template_time * 1000,
+            ''.join(f'\n  {line}' for line in lines),
+        )
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_alter_tutorapplication_gpa'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TopicAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=200, unique=True)),
+                ('topic_key', models.CharField(db_index=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Topic Aliases',
+                'ordering': ['topic_key', 'alias'],
+            },
+        ),
+        migrations.AddField(
+            model_name='feedback',
+            name='topic_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Normalized topic used for trending topic counts', max_length=200),
+        ),
+        migrations.CreateModel(
+            name='TopicCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('topic_key', models.CharField(max_length=200)),
+                ('label', models.CharField(help_text='Display form of the topic', max_length=200)),
+                ('count', models.IntegerField(default=0)),
+                ('program', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='topic_counts', to='core.program')),
+            ],
+            options={
+                'ordering': ['-month', '-count'],
+                'indexes': [models.Index(fields=['month', 'program', '-count'], name='core_topiccount_month_idx')],
+                'unique_together': {('program', 'month', 'topic_key')},
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_feedback_topic_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Watermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('value', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='feedback',
+            name='indexed_terms',
+            field=models.JSONField(blank=True, editable=False, help_text='Comment terms last counted by the keyword index', null=True),
+        ),
+        migrations.CreateModel(
+            name='CommentTermFrequency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('term', models.CharField(max_length=50)),
+                ('count', models.IntegerField(default=0)),
+                ('program', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comment_terms', to='core.program')),
+                ('tutor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comment_terms', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Comment Term Frequencies',
+                'ordering': ['-month', '-count'],
+                'indexes': [models.Index(fields=['program', 'month', 'term'], name='core_commentterm_program_idx'), models.Index(fields=['term', 'month'], name='core_commentterm_term_idx')],
+                'unique_together': {('tutor', 'program', 'month', 'term')},
+            },
+        ),
+    ]
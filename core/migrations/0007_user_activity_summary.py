@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_comment_term_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserActivitySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('learner_upcoming_count', models.IntegerField(default=0)),
+                ('learner_upcoming_this_week', models.IntegerField(default=0)),
+                ('pending_feedback_count', models.IntegerField(default=0)),
+                ('learner_completed_count', models.IntegerField(default=0)),
+                ('learner_minutes', models.IntegerField(default=0)),
+                ('learner_month_minutes', models.IntegerField(default=0)),
+                ('tutor_upcoming_count', models.IntegerField(default=0)),
+                ('tutor_completed_count', models.IntegerField(default=0)),
+                ('tutor_minutes', models.IntegerField(default=0)),
+                ('week_start', models.DateField()),
+                ('month_start', models.DateField()),
+                ('next_rollover', models.DateTimeField(db_index=True, help_text='When time-dependent counters must be recomputed')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('evaluation_year', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='activity_summaries', to='core.evaluationyear')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'User Activity Summaries',
+                'ordering': ['user'],
+                'unique_together': {('user', 'evaluation_year')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_user_activity_summary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='feedback',
+            index=models.Index(fields=['learner', 'session'], name='core_feedback_learner_sess_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['learner', 'session_date'], name='core_session_learner_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['tutor', 'session_date'], name='core_session_tutor_date_idx'),
+        ),
+    ]
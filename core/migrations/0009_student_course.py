@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_session_history_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentCourse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to='core.course')),
+                ('program', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to='core.program')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to='core.student')),
+                ('year', models.ForeignKey(help_text="Student's year of study when enrolling", on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to='core.year')),
+            ],
+            options={
+                'ordering': ['student', 'course'],
+                'indexes': [models.Index(fields=['course', 'year'], name='core_enrollment_course_idx'), models.Index(fields=['program', 'course'], name='core_enrollment_program_idx')],
+                'unique_together': {('student', 'course')},
+            },
+        ),
+    ]
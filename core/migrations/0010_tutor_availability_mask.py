@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:07
+
+from django.db import migrations, models
+
+# Frozen copy of core.availability.build_mask as of this migration, so later
+# changes to the parser cannot change what the migration writes
+DAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+SLOTS = ('morning', 'afternoon', 'evening')
+
+
+def build_mask(days, slots):
+    days = [part.strip().lower() for part in days.split(',') if part.strip()]
+    slots = [part.strip().lower() for part in slots.split(',') if part.strip()]
+    day_indexes = [DAYS.index(day) for day in days if day in DAYS]
+    slot_indexes = [SLOTS.index(slot) for slot in slots if slot in SLOTS]
+    if not day_indexes and not slot_indexes:
+        return 0
+    mask = 0
+    for day in day_indexes or range(len(DAYS)):
+        for slot in slot_indexes or range(len(SLOTS)):
+            mask |= 1 << (day * len(SLOTS) + slot)
+    return mask
+
+
+def parse_preferences(apps, schema_editor):
+    TutorApplication = apps.get_model('core', 'TutorApplication')
+    applications = TutorApplication.objects.exclude(preferred_days='', preferred_times='').only(
+        'id', 'preferred_days', 'preferred_times'
+    )
+    batch = []
+    for application in applications.iterator(chunk_size=1000):
+        application.availability_mask = build_mask(application.preferred_days, application.preferred_times)
+        batch.append(application)
+        if len(batch) >= 1000:
+            TutorApplication.objects.bulk_update(batch, ['availability_mask'])
+            batch = []
+    TutorApplication.objects.bulk_update(batch, ['availability_mask'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_student_course'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tutorapplication',
+            name='availability_mask',
+            field=models.IntegerField(db_index=True, default=0, editable=False, help_text='Day x time-slot bitmask derived from preferred days/times'),
+        ),
+        migrations.RunPython(parse_preferences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:14
+
+import django.db.models.deletion
+from django.conf import settings
+from collections import Counter
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def count_existing_sessions(apps, schema_editor):
+    Session = apps.get_model('core', 'Session')
+    TutorWeeklyLoad = apps.get_model('core', 'TutorWeeklyLoad')
+    loads = Counter()
+    sessions = Session.objects.exclude(status='Cancelled').values_list('tutor_id', 'session_date')
+    for tutor_id, session_date in sessions.iterator(chunk_size=2000):
+        day = timezone.localdate(session_date)
+        loads[tutor_id, day - timedelta(days=day.weekday())] += 1
+    TutorWeeklyLoad.objects.bulk_create(
+        [TutorWeeklyLoad(tutor_id=tutor_id, week_start=week_start, sessions=n)
+         for (tutor_id, week_start), n in loads.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_tutor_availability_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TutorWeeklyLoad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start', models.DateField(help_text='Monday of the ISO week')),
+                ('sessions', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('tutor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_loads', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-week_start', 'tutor'],
+                'indexes': [models.Index(fields=['week_start'], name='core_weeklyload_week_idx')],
+                'unique_together': {('tutor', 'week_start')},
+            },
+        ),
+        migrations.RunPython(count_existing_sessions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:18
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_tutor_weekly_load'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='session',
+            name='duration',
+            field=models.IntegerField(help_text='Duration in minutes', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(240)]),
+        ),
+    ]
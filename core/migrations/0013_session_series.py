@@ -0,0 +1,61 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:21
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_session_duration_bounds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='occurrence_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='SessionSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recurrence', models.CharField(choices=[('weekly', 'Weekly'), ('biweekly', 'Every two weeks')], default='weekly', max_length=20)),
+                ('start_date', models.DateField(help_text='Date of the first occurrence')),
+                ('end_date', models.DateField(help_text='End of term: no occurrences after this date')),
+                ('start_time', models.TimeField()),
+                ('duration', models.IntegerField(help_text='Duration in minutes', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(240)])),
+                ('exceptions', models.JSONField(blank=True, default=list, help_text='ISO dates of skipped occurrences')),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.course')),
+                ('evaluation_year', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='session_series', to='core.evaluationyear')),
+                ('learner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='learner_series', to=settings.AUTH_USER_MODEL)),
+                ('tutor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tutor_series', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Session series',
+                'ordering': ['start_date', 'start_time'],
+            },
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='series',
+            field=models.ForeignKey(blank=True, help_text='Series this occurrence was materialized from', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sessions', to='core.sessionseries'),
+        ),
+        migrations.AddConstraint(
+            model_name='session',
+            constraint=models.UniqueConstraint(condition=models.Q(('series__isnull', False)), fields=('series', 'occurrence_date'), name='core_session_series_occurrence_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='sessionseries',
+            index=models.Index(fields=['tutor', 'end_date'], name='core_series_tutor_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sessionseries',
+            index=models.Index(fields=['learner', 'end_date'], name='core_series_learner_end_idx'),
+        ),
+    ]
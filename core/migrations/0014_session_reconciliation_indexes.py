@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_session_series'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(condition=models.Q(('status', 'Scheduled')), fields=['session_date'], name='core_session_scheduled_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(condition=models.Q(('status', 'Scheduled')), fields=['updated_at'], name='core_session_sched_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_session_reconciliation_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='calendar_key',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+    ]
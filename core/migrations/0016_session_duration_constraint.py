@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:48
+
+from django.db import migrations, models
+
+# Frozen copy of core.overlaps.MAX_DURATION
+MAX_DURATION = 240
+
+
+def check_durations(apps, schema_editor):
+    """Stop before adding the constraints if a stored duration is outside 1..MAX_DURATION
+
+    Such rows are left for an administrator to correct rather than rewritten here.
+    """
+    out_of_range = models.Q(duration__lt=1) | models.Q(duration__gt=MAX_DURATION)
+    problems = []
+    for name in ('Session', 'SessionSeries'):
+        model = apps.get_model('core', name)
+        ids = list(model.objects.filter(out_of_range).order_by('pk').values_list('pk', flat=True))
+        if ids:
+            shown = ', '.join(map(str, ids[:50])) + (f' and {len(ids) - 50} more' if len(ids) > 50 else '')
+            problems.append(f'{model._meta.verbose_name_plural} {shown}')
+    if problems:
+        raise RuntimeError(
+            f'Durations must be between 1 and {MAX_DURATION} minutes before core_session_duration_range '
+            f'and core_series_duration_range can be added. Correct the duration of: {"; ".join(problems)}.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_user_calendar_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_durations, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='session',
+            constraint=models.CheckConstraint(condition=models.Q(('duration__gte', 1), ('duration__lte', 240)), name='core_session_duration_range'),
+        ),
+        migrations.AddConstraint(
+            model_name='sessionseries',
+            constraint=models.CheckConstraint(condition=models.Q(('duration__gte', 1), ('duration__lte', 240)), name='core_series_duration_range'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def store_existing_slots(apps, schema_editor):
+    TutorApplication = apps.get_model('core', 'TutorApplication')
+    TutorAvailabilitySlot = apps.get_model('core', 'TutorAvailabilitySlot')
+    masks = TutorApplication.objects.exclude(availability_mask=0).values_list('id', 'availability_mask')
+    batch = []
+    for application_id, mask in masks.iterator(chunk_size=1000):
+        batch += [TutorAvailabilitySlot(application_id=application_id, slot=slot)
+                  for slot in range(21) if mask >> slot & 1]
+        if len(batch) >= 1000:
+            TutorAvailabilitySlot.objects.bulk_create(batch)
+            batch = []
+    TutorAvailabilitySlot.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_session_duration_constraint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tutorapplication',
+            name='availability_mask',
+            field=models.IntegerField(default=0, editable=False, help_text='Day x time-slot bitmask derived from preferred days/times'),
+        ),
+        migrations.CreateModel(
+            name='TutorAvailabilitySlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField(help_text='Bit of the mask: day * 3 + time slot, Monday morning is 0')),
+                ('application', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_slots', to='core.tutorapplication')),
+            ],
+            options={
+                'ordering': ['application', 'slot'],
+                'unique_together': {('slot', 'application')},
+            },
+        ),
+        migrations.RunPython(store_existing_slots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:22
+
+from collections import Counter
+from datetime import timedelta
+
+from django.db import migrations
+from django.db.models import F
+
+
+def series_loads(apps):
+    """Counter of (tutor id, week start) -> series occurrences not recorded as sessions"""
+    Session = apps.get_model('core', 'Session')
+    SessionSeries = apps.get_model('core', 'SessionSeries')
+    materialized = set(Session.objects.filter(series__isnull=False).values_list('series_id', 'occurrence_date'))
+    loads = Counter()
+    for series in SessionSeries.objects.iterator(chunk_size=500):
+        step = timedelta(weeks=2 if series.recurrence == 'biweekly' else 1)
+        skipped = set(series.exceptions or ())
+        day = series.start_date
+        while day <= series.end_date:
+            if day.isoformat() not in skipped and (series.pk, day) not in materialized:
+                loads[series.tutor_id, day - timedelta(days=day.weekday())] += 1
+            day += step
+    return loads
+
+
+def bump_loads(apps, sign):
+    TutorWeeklyLoad = apps.get_model('core', 'TutorWeeklyLoad')
+    for (tutor_id, week_start), count in series_loads(apps).items():
+        TutorWeeklyLoad.objects.get_or_create(tutor_id=tutor_id, week_start=week_start)
+        TutorWeeklyLoad.objects.filter(tutor_id=tutor_id, week_start=week_start).update(
+            sessions=F('sessions') + sign * count
+        )
+
+
+def count_series(apps, schema_editor):
+    bump_loads(apps, 1)
+
+
+def uncount_series(apps, schema_editor):
+    bump_loads(apps, -1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_feedback_updated_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_series, uncount_series),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:23
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def expire_summaries(apps, schema_editor):
+    """The new totals start at zero: recompute every summary when it is next read"""
+    UserActivitySummary = apps.get_model('core', 'UserActivitySummary')
+    UserActivitySummary.objects.update(next_rollover=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_series_weekly_load'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useractivitysummary',
+            name='learner_total_minutes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='useractivitysummary',
+            name='tutor_total_minutes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(expire_summaries, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,27 @@
+from datetime import timedelta
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator, RegexValidator
 
+from .availability import build_mask, store_slots
+from .catalog import get_catalog
+from .evaluation_years import resolve_year_id
+from .overlaps import MAX_DURATION
+
+
+def _from_catalog(instance, name):
+    """Related ``program`` or ``year`` of ``instance``, read from the catalog snapshot unless already loaded
+
+    Lets ``__str__`` of rows listed in bulk (admin changelists, form choices)
+    name their program and year without a query per row.
+    """
+    if not instance._meta.get_field(name).is_cached(instance):
+        cached = getattr(get_catalog(), name)(getattr(instance, f'{name}_id'))
+        if cached is not None:
+            return cached
+    return getattr(instance, name)
+
 
 class User(AbstractUser):
     """Extended user model with role-based access"""
@@ -17,6 +37,8 @@ class User(AbstractUser):
     first_name = models.CharField(max_length=150)
     last_name = models.CharField(max_length=150)
     student_id = models.CharField(max_length=50, unique=True, null=True, blank=True)
+    # Part of the signed calendar feed token; replacing it revokes issued feed URLs
+    calendar_key = models.CharField(max_length=32, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -51,7 +73,7 @@ class Year(models.Model):
     name = models.CharField(max_length=50)
     
     def __str__(self):
-        return f"{self.program.code} - {self.name}"
+        return f"{_from_catalog(self, 'program').code} - {self.name}"
     
     class Meta:
         ordering = ['program', 'year_number']
@@ -115,7 +137,8 @@ class Student(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"{self.user.get_full_name()} - {self.program.code} Year {self.year.year_number}"
+        return (f"{self.user.get_full_name()} - {_from_catalog(self, 'program').code} "
+                f"Year {_from_catalog(self, 'year').year_number}")
 
     def save(self, *args, **kwargs):
         # Auto-set study_year to year if not provided
@@ -127,6 +150,60 @@ class Student(models.Model):
         ordering = ['-created_at']
 
 
+class StudentCourseQuerySet(models.QuerySet):
+    """Course demand queries used for tutor matching and capacity planning"""
+
+    def for_program(self, program):
+        return self.filter(program=program)
+
+    def for_course(self, course):
+        return self.filter(course=course)
+
+    def learner_ids(self):
+        """User ids of the enrolled learners"""
+        return self.values_list('student__user_id', flat=True)
+
+    def demand_by_course(self):
+        """Rows of ``course_id`` and ``learners``, most requested first"""
+        return self.values('course_id').annotate(
+            learners=models.Count('id')
+        ).order_by('-learners', 'course_id')
+
+    def demand_by_course_and_year(self):
+        """Rows of ``course_id``, ``year_id`` (the learners' year of study) and ``learners``"""
+        return self.values('course_id', 'year_id').annotate(
+            learners=models.Count('id')
+        ).order_by('course_id', 'year_id')
+
+    def demand_counts(self):
+        """Dict of course id -> number of enrolled learners"""
+        return dict(self.values_list('course_id').annotate(learners=models.Count('id')).order_by())
+
+
+class StudentCourse(models.Model):
+    """Course a student asked for help with when registering"""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='enrollments')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='enrollments')
+    # Copied from the student at registration so demand can be grouped without joins
+    program = models.ForeignKey(Program, on_delete=models.CASCADE, related_name='enrollments')
+    year = models.ForeignKey(Year, on_delete=models.CASCADE, related_name='enrollments',
+                             help_text="Student's year of study when enrolling")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = StudentCourseQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.student.user.get_full_name()} - {self.course.code}"
+
+    class Meta:
+        ordering = ['student', 'course']
+        unique_together = ['student', 'course']
+        indexes = [
+            models.Index(fields=['course', 'year'], name='core_enrollment_course_idx'),
+            models.Index(fields=['program', 'course'], name='core_enrollment_program_idx'),
+        ]
+
+
 class TutorApplication(models.Model):
     """Tutor registration/application data"""
     STATUS_CHOICES = [
@@ -199,6 +276,8 @@ class TutorApplication(models.Model):
                                      help_text="e.g., Monday, Wednesday")
     preferred_times = models.CharField(max_length=20, choices=PREFERRED_TIME_CHOICES, blank=True)
     preferred_mode = models.CharField(max_length=20, choices=PREFERRED_MODE_CHOICES, blank=True)
+    availability_mask = models.IntegerField(default=0, editable=False,
+                                            help_text="Day x time-slot bitmask derived from preferred days/times")
     max_sessions_per_week = models.IntegerField(null=True, blank=True,
                                                validators=[MinValueValidator(1)],
                                                help_text="Maximum sessions/hours per week")
@@ -225,10 +304,103 @@ class TutorApplication(models.Model):
         """Return number of selected courses"""
         return self.courses.count()
 
+    def save(self, *args, **kwargs):
+        # Keep the availability bitmask in sync with the free-text preferences
+        self.availability_mask = build_mask(self.preferred_days, self.preferred_times)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'preferred_days', 'preferred_times'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'availability_mask'}
+        super().save(*args, **kwargs)
+        if update_fields is None or 'availability_mask' in kwargs['update_fields']:
+            store_slots(self.pk, self.availability_mask)
+
     class Meta:
         ordering = ['-created_at']
 
 
+class TutorAvailabilitySlot(models.Model):
+    """One day x time slot of an application's ``availability_mask``, for indexed availability lookups
+
+    A bitwise AND on the mask cannot use an index; a slot lookup here is a
+    range scan on (slot, application).
+    """
+    application = models.ForeignKey(TutorApplication, on_delete=models.CASCADE, related_name='availability_slots')
+    slot = models.PositiveSmallIntegerField(help_text="Bit of the mask: day * 3 + time slot, Monday morning is 0")
+
+    def __str__(self):
+        return f"{self.application} - slot {self.slot}"
+
+    class Meta:
+        ordering = ['application', 'slot']
+        unique_together = ['slot', 'application']
+
+
+class SessionSeries(models.Model):
+    """Recurring tutor-learner slot, expanded into occurrences on demand
+
+    Occurrences are not stored: only those that are completed (and so can get
+    feedback) become ``Session`` rows, linked back through ``series`` and
+    ``occurrence_date``. Skipped dates are kept in ``exceptions``.
+    """
+    RECURRENCE_CHOICES = [
+        ('weekly', 'Weekly'),
+        ('biweekly', 'Every two weeks'),
+    ]
+
+    tutor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tutor_series')
+    learner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='learner_series')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    evaluation_year = models.ForeignKey(EvaluationYear, on_delete=models.SET_NULL, null=True, blank=True,
+                                        related_name='session_series')
+    recurrence = models.CharField(max_length=20, choices=RECURRENCE_CHOICES, default='weekly')
+    start_date = models.DateField(help_text="Date of the first occurrence")
+    end_date = models.DateField(help_text="End of term: no occurrences after this date")
+    start_time = models.TimeField()
+    duration = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(MAX_DURATION)],
+                                   help_text="Duration in minutes")
+    exceptions = models.JSONField(default=list, blank=True, help_text="ISO dates of skipped occurrences")
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.tutor.get_full_name()} -> {self.learner.get_full_name()} ({self.course.code}, {self.get_recurrence_display()})"
+
+    @property
+    def interval(self):
+        return timedelta(weeks=2 if self.recurrence == 'biweekly' else 1)
+
+    def occurrence_dates(self, start, end):
+        """Dates of the occurrences falling in ``[start, end)`` (dates), skipped ones excluded"""
+        first = max(start, self.start_date)
+        step = self.interval.days
+        # Jump straight to the first occurrence on or after ``first``
+        offset = (first - self.start_date).days
+        day = self.start_date + timedelta(days=-(-offset // step) * step)
+        last = min(end - timedelta(days=1), self.end_date)
+        skipped = set(self.exceptions or ())
+        while day <= last:
+            if day.isoformat() not in skipped:
+                yield day
+            day += timedelta(days=step)
+
+    def is_occurrence(self, day):
+        """Whether ``day`` is a scheduled (not skipped) date of the series"""
+        return any(True for _ in self.occurrence_dates(day, day + timedelta(days=1)))
+
+    class Meta:
+        ordering = ['start_date', 'start_time']
+        verbose_name_plural = "Session series"
+        indexes = [
+            models.Index(fields=['tutor', 'end_date'], name='core_series_tutor_end_idx'),
+            models.Index(fields=['learner', 'end_date'], name='core_series_learner_end_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(duration__gte=1, duration__lte=MAX_DURATION),
+                                   name='core_series_duration_range'),
+        ]
+
+
 class Session(models.Model):
     """Tutor-learner session records"""
     STATUS_CHOICES = [
@@ -244,9 +416,13 @@ class Session(models.Model):
                                        related_name='sessions',
                                        help_text="Academic year for this session")
     session_date = models.DateTimeField()
-    duration = models.IntegerField(help_text="Duration in minutes")
+    duration = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(MAX_DURATION)],
+                                   help_text="Duration in minutes")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Scheduled')
     notes = models.TextField(blank=True)
+    series = models.ForeignKey(SessionSeries, on_delete=models.SET_NULL, null=True, blank=True,
+                               related_name='sessions', help_text="Series this occurrence was materialized from")
+    occurrence_date = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -254,15 +430,29 @@ class Session(models.Model):
         return f"{self.tutor.get_full_name()} -> {self.learner.get_full_name()} ({self.course.code})"
 
     def save(self, *args, **kwargs):
-        # Auto-assign active evaluation year if not set
+        # Auto-assign the evaluation year covering the session date (the active one otherwise)
         if not self.evaluation_year_id:
-            active_year = EvaluationYear.objects.filter(is_active=True).first()
-            if active_year:
-                self.evaluation_year = active_year
+            self.evaluation_year_id = resolve_year_id(self.session_date)
         super().save(*args, **kwargs)
 
     class Meta:
         ordering = ['-session_date']
+        indexes = [
+            models.Index(fields=['learner', 'session_date'], name='core_session_learner_date_idx'),
+            models.Index(fields=['tutor', 'session_date'], name='core_session_tutor_date_idx'),
+            # Scheduled sessions that are overdue or edited since the last reconciliation run
+            models.Index(fields=['session_date'], condition=models.Q(status='Scheduled'),
+                         name='core_session_scheduled_idx'),
+            models.Index(fields=['updated_at'], condition=models.Q(status='Scheduled'),
+                         name='core_session_sched_updated_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['series', 'occurrence_date'], condition=models.Q(series__isnull=False),
+                                    name='core_session_series_occurrence_uniq'),
+            # Overlap and reconciliation probes look back only MAX_DURATION minutes
+            models.CheckConstraint(condition=models.Q(duration__gte=1, duration__lte=MAX_DURATION),
+                                   name='core_session_duration_range'),
+        ]
 
 
 class Feedback(models.Model):
@@ -284,6 +474,10 @@ class Feedback(models.Model):
                              limit_choices_to={'tutor_applications__status': 'Approved'},
                              verbose_name="Name of the Tutor")
     topic = models.CharField(max_length=200, verbose_name="Title/Topic of the session")
+    topic_key = models.CharField(max_length=200, blank=True, db_index=True, editable=False,
+                                 help_text="Normalized topic used for trending topic counts")
+    indexed_terms = models.JSONField(null=True, blank=True, editable=False,
+                                     help_text="Comment terms last counted by the keyword index")
     duration = models.CharField(max_length=20, choices=DURATION_CHOICES)
     session_date = models.DateTimeField(auto_now_add=True, help_text="Auto-documented date/time")
     session = models.ForeignKey(Session, on_delete=models.SET_NULL, null=True, blank=True,
@@ -343,6 +537,155 @@ class Feedback(models.Model):
         ordering = ['-created_at']
         verbose_name = "Learner Feedback"
         verbose_name_plural = "Learner Feedbacks"
+        indexes = [
+            models.Index(fields=['learner', 'session'], name='core_feedback_learner_sess_idx'),
+            # Polled by the matching index and the comment keyword indexer
+            models.Index(fields=['updated_at'], name='core_feedback_updated_idx'),
+        ]
+
+
+class TopicAlias(models.Model):
+    """Maps a near-duplicate topic key onto the canonical key of its cluster"""
+    alias = models.CharField(max_length=200, unique=True)
+    topic_key = models.CharField(max_length=200, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.alias} -> {self.topic_key}"
+
+    class Meta:
+        ordering = ['topic_key', 'alias']
+        verbose_name_plural = "Topic Aliases"
+
+
+class TopicCount(models.Model):
+    """Number of feedbacks per normalized topic, program and month"""
+    program = models.ForeignKey(Program, on_delete=models.CASCADE, related_name='topic_counts')
+    month = models.DateField(help_text="First day of the month")
+    topic_key = models.CharField(max_length=200)
+    label = models.CharField(max_length=200, help_text="Display form of the topic")
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.label} ({self.month:%Y-%m}): {self.count}"
+
+    class Meta:
+        ordering = ['-month', '-count']
+        unique_together = ['program', 'month', 'topic_key']
+        indexes = [
+            models.Index(fields=['month', 'program', '-count'], name='core_topiccount_month_idx'),
+        ]
+
+
+class CommentTermFrequency(models.Model):
+    """How often a term appears in feedback comments per tutor, program and month"""
+    tutor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comment_terms')
+    program = models.ForeignKey(Program, on_delete=models.CASCADE, related_name='comment_terms')
+    month = models.DateField(help_text="First day of the month")
+    term = models.CharField(max_length=50)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.term} ({self.month:%Y-%m}): {self.count}"
+
+    class Meta:
+        ordering = ['-month', '-count']
+        unique_together = ['tutor', 'program', 'month', 'term']
+        indexes = [
+            models.Index(fields=['program', 'month', 'term'], name='core_commentterm_program_idx'),
+            models.Index(fields=['term', 'month'], name='core_commentterm_term_idx'),
+        ]
+        verbose_name_plural = "Comment Term Frequencies"
+
+
+class UserActivitySummary(models.Model):
+    """Dashboard counters per user and evaluation year, kept current on Session/Feedback writes"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activity_summaries')
+    evaluation_year = models.ForeignKey(EvaluationYear, on_delete=models.CASCADE, null=True, blank=True,
+                                        related_name='activity_summaries')
+
+    # As learner
+    learner_upcoming_count = models.IntegerField(default=0)
+    learner_upcoming_this_week = models.IntegerField(default=0)
+    pending_feedback_count = models.IntegerField(default=0)
+    learner_completed_count = models.IntegerField(default=0)
+    learner_minutes = models.IntegerField(default=0)
+    learner_month_minutes = models.IntegerField(default=0)
+
+    # As tutor
+    tutor_upcoming_count = models.IntegerField(default=0)
+    tutor_completed_count = models.IntegerField(default=0)
+    tutor_minutes = models.IntegerField(default=0)
+
+    # Every session of the user, whatever its evaluation year
+    learner_total_minutes = models.IntegerField(default=0)
+    tutor_total_minutes = models.IntegerField(default=0)
+
+    # Time buckets the counters were computed for
+    week_start = models.DateField()
+    month_start = models.DateField()
+    next_rollover = models.DateTimeField(db_index=True,
+                                         help_text="When time-dependent counters must be recomputed")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.get_full_name()} - {self.evaluation_year or 'No year'}"
+
+    @property
+    def learner_hours(self):
+        return round(self.learner_minutes / 60, 1)
+
+    @property
+    def learner_month_hours(self):
+        return round(self.learner_month_minutes / 60, 1)
+
+    @property
+    def tutor_hours(self):
+        return round(self.tutor_minutes / 60, 1)
+
+    @property
+    def learner_total_hours(self):
+        return round(self.learner_total_minutes / 60, 1)
+
+    @property
+    def tutor_total_hours(self):
+        return round(self.tutor_total_minutes / 60, 1)
+
+    class Meta:
+        ordering = ['user']
+        unique_together = ['user', 'evaluation_year']
+        verbose_name_plural = "User Activity Summaries"
+
+
+class TutorWeeklyLoad(models.Model):
+    """Non-cancelled sessions per tutor and week, kept current on Session writes"""
+    tutor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='weekly_loads')
+    week_start = models.DateField(help_text="Monday of the ISO week")
+    sessions = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.tutor.get_full_name()} - week of {self.week_start}: {self.sessions}"
+
+    class Meta:
+        ordering = ['-week_start', 'tutor']
+        unique_together = ['tutor', 'week_start']
+        indexes = [
+            models.Index(fields=['week_start'], name='core_weeklyload_week_idx'),
+        ]
+
+
+class Watermark(models.Model):
+    """Progress marker for incremental batch jobs"""
+    name = models.CharField(max_length=100, unique=True)
+    value = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+    class Meta:
+        ordering = ['name']
 
 
 class Config(models.Model):
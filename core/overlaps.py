@@ -0,0 +1,91 @@
+"""Detect sessions whose time ranges overlap for the same tutor or learner
+
+A session occupies ``[session_date, session_date + duration)``. Durations are
+capped at ``MAX_DURATION`` by a database check constraint, so any session
+overlapping a booking must start less than ``MAX_DURATION`` before it. That
+bound turns the check into a short range scan on the (tutor, session_date)
+and (learner, session_date) indexes; both probes go out as one UNION query.
+Occurrences of recurring series that are not ``Session`` rows yet are
+expanded from the series of the same tutor or learner and checked alike.
+"""
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+from django.db.models import Q
+
+# Longest session that can be booked, in minutes
+MAX_DURATION = 240
+
+
+def session_end(start, duration):
+    return start + timedelta(minutes=duration or 0)
+
+
+def intervals_overlap(start, end, other_start, other_end):
+    return start < other_end and other_start < end
+
+
+def _occurrence_rows(start, end, tutor_id, learner_id, exclude_series_pk):
+    from .series import expand, series_between
+
+    people = Q()
+    if tutor_id:
+        people |= Q(tutor_id=tutor_id)
+    if learner_id:
+        people |= Q(learner_id=learner_id)
+    series = series_between(start, end).filter(people)
+    if exclude_series_pk is not None:
+        series = series.exclude(pk=exclude_series_pk)
+    return [
+        (None, occurrence.series.tutor_id, occurrence.series.learner_id, occurrence.session_date,
+         occurrence.series.duration)
+        for occurrence in expand(series, start, end)
+    ]
+
+
+def find_overlaps_many(starts, duration, tutor_id=None, learner_id=None, exclude_pk=None, exclude_series_pk=None):
+    """Conflicts of bookings of ``duration`` minutes at each of ``starts`` (e.g. every date of a new series)
+
+    Returns ``(start, row)`` pairs, where ``row`` is ``(pk, tutor_id,
+    learner_id, session_date, duration)`` of a non-cancelled session or, with
+    a ``pk`` of None, of a series occurrence. The whole range is read with one
+    session query and one series query.
+    """
+    from .models import Session
+
+    starts = sorted(starts)
+    if not starts or not (tutor_id or learner_id):
+        return []
+    window_start = starts[0] - timedelta(minutes=MAX_DURATION)
+    window_end = session_end(starts[-1], duration)
+
+    window = Session.objects.filter(
+        session_date__gt=window_start, session_date__lt=window_end,
+    ).exclude(status='Cancelled')
+    if exclude_pk is not None:
+        window = window.exclude(pk=exclude_pk)
+    fields = ('pk', 'tutor_id', 'learner_id', 'session_date', 'duration')
+    probes = [window.filter(**{field: user_id}).values_list(*fields).order_by()
+              for field, user_id in (('tutor_id', tutor_id), ('learner_id', learner_id)) if user_id]
+    sessions = probes[0].union(*probes[1:]) if len(probes) > 1 else probes[0]
+
+    rows = list(sessions) + _occurrence_rows(window_start, window_end, tutor_id, learner_id, exclude_series_pk)
+    rows.sort(key=lambda row: row[3])
+    dates = [row[3] for row in rows]
+
+    conflicts = []
+    for start in starts:
+        end = session_end(start, duration)
+        first = bisect_right(dates, start - timedelta(minutes=MAX_DURATION))
+        for row in rows[first:bisect_left(dates, end)]:
+            if intervals_overlap(start, end, row[3], session_end(row[3], row[4])):
+                conflicts.append((start, row))
+    return conflicts
+
+
+def find_overlaps(start, duration, tutor_id=None, learner_id=None, exclude_pk=None):
+    """Non-cancelled sessions and series occurrences of the tutor or the learner overlapping ``start`` + ``duration``
+
+    Returns ``(pk, tutor_id, learner_id, session_date, duration)`` rows; ``pk`` is None for occurrences.
+    """
+    return [row for _, row in find_overlaps_many([start], duration, tutor_id, learner_id, exclude_pk)]
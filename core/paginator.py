@@ -0,0 +1,38 @@
+"""Paginator that avoids COUNT(*) over whole large tables
+
+An unfiltered admin changelist of sessions or feedback counts the entire
+table on every page view. On PostgreSQL the planner's row estimate is kept
+current by autovacuum and is read from the catalog for free, which is close
+enough to size the page links. Filtered lists, small tables and other
+databases still get an exact count.
+"""
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# Tables estimated below this many rows are counted exactly
+EXACT_COUNT_LIMIT = 10000
+
+
+def estimated_row_count(model, using='default'):
+    """Planner's estimate of the rows in ``model``'s table, or None where the database keeps none"""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+        row = cursor.fetchone()
+    # -1 means the table was never analyzed
+    return row[0] if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is not None and not query.where and not query.combinator and not query.distinct:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= EXACT_COUNT_LIMIT:
+                return estimate
+        return super().count
@@ -0,0 +1,110 @@
+"""Move sessions that ended without being marked out of the Scheduled status
+
+Tutors often forget to mark sessions, which leaves them counted as upcoming
+and hides the learner's pending feedback. A cron job closes them here with
+batched UPDATEs. A watermark keeps each run to the sessions that ended, or
+were edited, since the previous run, found through partial indexes on
+scheduled sessions.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .activity import expire_activity
+from .fragments import schedule_fragment_invalidation
+from .ics import schedule_feed_invalidation
+from .overlaps import MAX_DURATION, session_end
+from .workload import bump_load, counted_week
+
+WATERMARK_NAME = 'session_reconciliation'
+
+# Re-read sessions edited shortly before the previous run finished
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+# Time after its end a session is still left for the tutor to mark
+DEFAULT_GRACE = timedelta(hours=1)
+
+RECONCILED_STATUSES = ('Completed', 'Cancelled')
+
+
+def overdue_candidates(cutoff, since=None, grace=DEFAULT_GRACE):
+    """``(pk, session_date, duration)`` of scheduled sessions starting before ``cutoff``
+
+    With ``since`` (the previous run), only sessions that may have ended after
+    the previous cutoff or were edited since that run are read.
+    """
+    from .models import Session
+
+    scheduled = Session.objects.filter(status='Scheduled', session_date__lt=cutoff)
+    fields = ('pk', 'session_date', 'duration')
+    if since is None:
+        return scheduled.values_list(*fields).order_by()
+    # MAX_DURATION is a database constraint, so no session ends later than this
+    ended = scheduled.filter(session_date__gte=since - grace - timedelta(minutes=MAX_DURATION))
+    edited = scheduled.filter(updated_at__gte=since - WATERMARK_OVERLAP)
+    return ended.values_list(*fields).order_by().union(edited.values_list(*fields).order_by())
+
+
+def close_sessions(session_ids, status, now):
+    """Set ``status`` on the given sessions that are still scheduled; returns how many changed"""
+    from .models import Session
+
+    with transaction.atomic():
+        rows = list(Session.objects.select_for_update().filter(pk__in=session_ids, status='Scheduled').values_list(
+            'pk', 'tutor_id', 'learner_id', 'evaluation_year_id', 'session_date'
+        ))
+        if not rows:
+            return 0
+        Session.objects.filter(pk__in=[row[0] for row in rows]).update(status=status, updated_at=now)
+
+        # UPDATE sends no signals: mark the summaries stale and drop the cached panels
+        users_by_year = defaultdict(set)
+        for _, tutor_id, learner_id, year_id, _ in rows:
+            users_by_year[year_id].update((tutor_id, learner_id))
+        for year_id, user_ids in users_by_year.items():
+            transaction.on_commit(lambda user_ids=user_ids, year_id=year_id: expire_activity(user_ids, year_id))
+        schedule_fragment_invalidation(set().union(*users_by_year.values()))
+        schedule_feed_invalidation(set().union(*users_by_year.values()))
+
+        # Cancelled sessions no longer count towards the tutor's week
+        if status == 'Cancelled':
+            released = Counter(counted_week(tutor_id, session_date, 'Scheduled')
+                               for _, tutor_id, _, _, session_date in rows)
+            for (tutor_id, week_start), count in released.items():
+                bump_load(tutor_id, week_start, -count)
+    return len(rows)
+
+
+def reconcile_sessions(status='Completed', grace=DEFAULT_GRACE, batch_size=1000, full=False, dry_run=False,
+                       now=None):
+    """Close scheduled sessions that ended more than ``grace`` ago and advance the watermark
+
+    Returns ``(scanned, closed)``; with ``dry_run`` nothing is written and
+    ``closed`` is the number of sessions that would be.
+    """
+    from .models import Watermark
+
+    if status not in RECONCILED_STATUSES:
+        raise ValueError(f'Unsupported status: {status}')
+
+    now = now or timezone.now()
+    cutoff = now - grace
+    watermark, _ = Watermark.objects.get_or_create(name=WATERMARK_NAME)
+    since = None if full else watermark.value
+
+    candidates = list(overdue_candidates(cutoff, since, grace))
+    overdue = [pk for pk, start, duration in candidates if session_end(start, duration) <= cutoff]
+    overdue.sort()
+
+    if dry_run:
+        return len(candidates), len(overdue)
+
+    closed = 0
+    for position in range(0, len(overdue), batch_size):
+        closed += close_sessions(overdue[position:position + batch_size], status, now)
+
+    watermark.value = now
+    watermark.save()
+    return len(candidates), closed
@@ -0,0 +1,375 @@
+"""Weekly batch scheduling of learners with tutors
+
+Every enrollment without a session that week is a demand for one session.
+Learners with the same course and year of study are interchangeable, so they
+are grouped and the pairing is solved as a min-cost flow:
+
+    source -> (course, learner year) -> tutor -> sink
+
+Group capacity is the number of waiting learners, tutor capacity is what is
+left of ``max_sessions_per_week`` and the cost of an edge is derived from the
+matching score. The flow places as many sessions as possible and, among those
+placements, the best-scoring one. Each placed session then gets the earliest
+slot of the week in which the tutor is available and it overlaps no existing
+session or series occurrence of either side. Slots start at least
+MAX_DURATION apart, so placed sessions cannot overlap each other.
+"""
+import heapq
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .activity import expire_activity, period_starts
+from .availability import ALL_SLOTS, DAYS, SLOTS, slot_indexes, slot_start
+from .directory import is_near_peer
+from .evaluation_years import verified_year_table
+from .fragments import schedule_fragment_invalidation
+from .ics import schedule_feed_invalidation
+from .matching import matching_index
+from .overlaps import MAX_DURATION, intervals_overlap, session_end
+
+DEFAULT_DURATION = 60
+
+# Capacity of tutors who did not state a weekly maximum
+DEFAULT_WEEKLY_CAPACITY = 3
+
+# Matching scores (0..1) become integer costs at this resolution
+COST_SCALE = 1000
+
+INFINITY = float('inf')
+
+
+class MinCostFlow:
+    """Min-cost max-flow with non-negative integer costs (primal-dual)
+
+    Each phase computes shortest distances with Dijkstra over reduced costs,
+    then saturates every shortest path at once with a blocking flow on the
+    zero reduced cost edges, so the number of phases is bounded by the number
+    of distinct path costs rather than by the total flow.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        # Edges are [to, capacity, cost, index of the reverse edge]
+        self.graph = [[] for _ in range(size)]
+
+    def add_edge(self, source, target, capacity, cost):
+        """Add an edge and return ``(source, position)`` to read its flow back"""
+        forward = [target, capacity, cost, len(self.graph[target])]
+        backward = [source, 0, -cost, len(self.graph[source])]
+        self.graph[source].append(forward)
+        self.graph[target].append(backward)
+        return source, len(self.graph[source]) - 1
+
+    def flow_on(self, edge, capacity):
+        source, position = edge
+        return capacity - self.graph[source][position][1]
+
+    def solve(self, source, sink):
+        """Return ``(flow, cost)`` of a min-cost maximum flow"""
+        potential = [0] * self.size
+        total_flow = total_cost = 0
+        while True:
+            distance = self._shortest_distances(source, potential)
+            if distance[sink] == INFINITY:
+                return total_flow, total_cost
+            for node in range(self.size):
+                if distance[node] < INFINITY:
+                    potential[node] += distance[node]
+            pushed = self._blocking_flow(source, sink, potential)
+            total_flow += pushed
+            total_cost += pushed * (potential[sink] - potential[source])
+
+    def _shortest_distances(self, source, potential):
+        distance = [INFINITY] * self.size
+        distance[source] = 0
+        heap = [(0, source)]
+        graph = self.graph
+        while heap:
+            dist, node = heapq.heappop(heap)
+            if dist > distance[node]:
+                continue
+            base = dist + potential[node]
+            for target, capacity, cost, _ in graph[node]:
+                if capacity > 0:
+                    candidate = base + cost - potential[target]
+                    if candidate < distance[target]:
+                        distance[target] = candidate
+                        heapq.heappush(heap, (candidate, target))
+        return distance
+
+    def _blocking_flow(self, source, sink, potential):
+        """Augment along zero reduced cost paths until none is left (Dinic on the admissible graph)"""
+        graph = self.graph
+        pushed = 0
+        while True:
+            # Levels keep the search acyclic: zero-cost cycles are common in the residual graph
+            level = [-1] * self.size
+            level[source] = 0
+            queue = deque([source])
+            while queue:
+                node = queue.popleft()
+                for target, capacity, cost, _ in graph[node]:
+                    if (capacity > 0 and level[target] < 0
+                            and cost + potential[node] - potential[target] == 0):
+                        level[target] = level[node] + 1
+                        queue.append(target)
+            if level[sink] < 0:
+                return pushed
+
+            cursor = [0] * self.size
+            path = []
+            node = source
+            while True:
+                if node == sink:
+                    amount = min(graph[u][i][1] for u, i in path)
+                    for u, i in path:
+                        edge = graph[u][i]
+                        edge[1] -= amount
+                        graph[edge[0]][edge[3]][1] += amount
+                    pushed += amount
+                    path = []
+                    node = source
+                    continue
+                edges = graph[node]
+                while cursor[node] < len(edges):
+                    target, capacity, cost, _ = edges[cursor[node]]
+                    if (capacity > 0 and level[target] == level[node] + 1
+                            and cost + potential[node] - potential[target] == 0):
+                        break
+                    cursor[node] += 1
+                if cursor[node] < len(edges):
+                    path.append((node, cursor[node]))
+                    node = edges[cursor[node]][0]
+                elif node == source:
+                    break
+                else:
+                    # Dead end: retreat and skip the edge that led here
+                    level[node] = -1
+                    node, _ = path.pop()
+                    cursor[node] += 1
+
+
+@dataclass
+class PlannedSession:
+    tutor_id: int
+    learner_id: int
+    course_id: int
+    session_date: object
+
+
+@dataclass
+class Schedule:
+    week_start: object
+    sessions: list = field(default_factory=list)
+    # (learner user id, course id) pairs left without a session
+    unmatched: list = field(default_factory=list)
+    created: int = 0
+
+
+@dataclass
+class _Tutor:
+    user_id: int
+    availability: int
+    capacity: int
+    # (program id, course id, learner year) -> edge cost
+    costs: dict = field(default_factory=dict)
+
+
+def next_week_start(now=None):
+    """Monday of the week after ``now``"""
+    _, next_week, _, _ = period_starts(now or timezone.now())
+    return timezone.localdate(next_week)
+
+
+def week_bounds(week_start):
+    start = timezone.make_aware(datetime.combine(week_start, time.min))
+    end = timezone.make_aware(datetime.combine(week_start + timedelta(days=7), time.min))
+    return start, end
+
+
+def week_sessions(week_start, overhang=False):
+    """Sessions (cancelled excluded) in the week beginning on ``week_start``
+
+    With ``overhang``, sessions started late enough the week before to run into it are included.
+    """
+    from .models import Session
+
+    start, end = week_bounds(week_start)
+    if overhang:
+        start -= timedelta(minutes=MAX_DURATION)
+    return Session.objects.filter(session_date__gte=start, session_date__lt=end).exclude(status='Cancelled')
+
+
+def week_bookings(week_start, overhang=False):
+    """``(tutor_id, learner_id, course_id, session_date, duration)`` of the week's sessions and series occurrences"""
+    from .series import expand, series_between
+
+    rows = list(week_sessions(week_start, overhang).values_list(
+        'tutor_id', 'learner_id', 'course_id', 'session_date', 'duration'
+    ))
+    start, end = week_bounds(week_start)
+    if overhang:
+        start -= timedelta(minutes=MAX_DURATION)
+    rows += [
+        (occurrence.series.tutor_id, occurrence.series.learner_id, occurrence.series.course_id,
+         occurrence.session_date, occurrence.series.duration)
+        for occurrence in expand(series_between(start, end), start, end)
+    ]
+    return rows
+
+
+def waiting_enrollments(enrollments, week_start):
+    """(learner user id, program id, course id, learner year) of enrollments without a session that week"""
+    booked = {(row[1], row[2]) for row in week_bookings(week_start)}
+    rows = enrollments.filter(student__user__is_active=True).values_list(
+        'student__user_id', 'program_id', 'course_id', 'year__year_number'
+    ).order_by('created_at', 'id')
+    return [row for row in rows if (row[0], row[2]) not in booked]
+
+
+def plan_week(enrollments, week_start=None, duration=DEFAULT_DURATION):
+    """Pair waiting ``enrollments`` (a StudentCourse queryset) with tutors for one week"""
+    week_start = week_start or next_week_start()
+    schedule = Schedule(week_start=week_start)
+
+    # Waiting learners per group as insertion-ordered dicts: placing one is a delete, not a list scan
+    groups = defaultdict(dict)
+    for learner_id, program_id, course_id, learner_year in waiting_enrollments(enrollments, week_start):
+        groups[(program_id, course_id, learner_year)][learner_id] = None
+    if not groups:
+        return schedule
+
+    # Slots in which a new session would overlap one of the user's existing sessions
+    slots = [slot_start(week_start, index) for index in range(len(DAYS) * len(SLOTS))]
+    busy = defaultdict(int)
+    booked = defaultdict(int)
+    week_begins, _ = week_bounds(week_start)
+    for tutor_id, learner_id, _, session_date, length in week_bookings(week_start, overhang=True):
+        end = session_end(session_date, length)
+        mask = 0
+        for index, start in enumerate(slots):
+            if intervals_overlap(start, session_end(start, duration), session_date, end):
+                mask |= 1 << index
+        busy[tutor_id] |= mask
+        busy[learner_id] |= mask
+        if session_date >= week_begins:
+            booked[tutor_id] += 1
+
+    tutors = {}
+    matching_index.refresh()
+    for key in groups:
+        program_id, course_id, learner_year = key
+        for candidate in matching_index.candidates(program_id, course_id):
+            if not is_near_peer(candidate.year_number, learner_year):
+                continue
+            tutor = tutors.get(candidate.user_id)
+            weekly = candidate.max_sessions_per_week or DEFAULT_WEEKLY_CAPACITY
+            if tutor is None:
+                tutor = tutors[candidate.user_id] = _Tutor(candidate.user_id, 0, 0)
+            tutor.availability |= candidate.availability or ALL_SLOTS
+            tutor.capacity = max(tutor.capacity, weekly - booked[candidate.user_id])
+            match = matching_index.score(candidate, learner_year, 0, '', booked[candidate.user_id])
+            if match is None:
+                continue
+            cost = round((1 - min(match.score, 1.0)) * COST_SCALE)
+            tutor.costs[key] = min(cost, tutor.costs.get(key, cost))
+
+    for tutor in tutors.values():
+        # A tutor holds at most one session per slot
+        free_slots = len(slot_indexes(tutor.availability & ~busy[tutor.user_id]))
+        tutor.capacity = min(tutor.capacity, free_slots)
+    tutors = [tutor for tutor in tutors.values() if tutor.capacity > 0 and tutor.costs]
+    keys = list(groups)
+    group_node = {key: 2 + i for i, key in enumerate(keys)}
+    tutor_node = {tutor.user_id: 2 + len(keys) + i for i, tutor in enumerate(tutors)}
+    network = MinCostFlow(2 + len(keys) + len(tutors))
+    for key in keys:
+        network.add_edge(0, group_node[key], len(groups[key]), 0)
+    pairings = []
+    for tutor in tutors:
+        network.add_edge(tutor_node[tutor.user_id], 1, tutor.capacity, 0)
+        for key, cost in tutor.costs.items():
+            capacity = min(len(groups[key]), tutor.capacity)
+            edge = network.add_edge(group_node[key], tutor_node[tutor.user_id], capacity, cost)
+            pairings.append((key, tutor, edge, capacity))
+    network.solve(0, 1)
+
+    # Best edges first, so the strongest pairings get the earliest slots
+    pairings.sort(key=lambda p: (p[1].costs[p[0]], p[1].user_id))
+    for key, tutor, edge, capacity in pairings:
+        waiting = groups[key]
+        for _ in range(network.flow_on(edge, capacity)):
+            available = tutor.availability & ~busy[tutor.user_id]
+            learner_id = next((
+                learner for learner in waiting
+                if learner != tutor.user_id and available & ~busy[learner]
+            ), None)
+            if learner_id is None:
+                break
+            free = available & ~busy[learner_id]
+            del waiting[learner_id]
+            index = slot_indexes(free)[0]
+            busy[tutor.user_id] |= 1 << index
+            busy[learner_id] |= 1 << index
+            schedule.sessions.append(PlannedSession(
+                tutor.user_id, learner_id, key[1], slot_start(week_start, index)
+            ))
+
+    for (program_id, course_id, _), waiting in groups.items():
+        schedule.unmatched.extend((learner_id, course_id) for learner_id in waiting)
+    return schedule
+
+
+def schedule_week(enrollments, week_start=None, duration=DEFAULT_DURATION, commit=True):
+    """Plan the week and write the sessions in one ``bulk_create`` (unless ``commit`` is False)"""
+    from .models import Session, TutorWeeklyLoad
+
+    schedule = plan_week(enrollments, week_start, duration)
+    if not commit or not schedule.sessions:
+        return schedule
+
+    # Sessions go to the evaluation year covering their date, as Session.save does
+    years = verified_year_table()
+    year_ids = [years.resolve(planned.session_date) for planned in schedule.sessions]
+    year_ids = [year.id if year else None for year in year_ids]
+    now = timezone.now()
+    with transaction.atomic():
+        Session.objects.bulk_create([
+            Session(
+                tutor_id=planned.tutor_id,
+                learner_id=planned.learner_id,
+                course_id=planned.course_id,
+                evaluation_year_id=year_id,
+                session_date=planned.session_date,
+                duration=duration,
+            )
+            for planned, year_id in zip(schedule.sessions, year_ids)
+        ], batch_size=500)
+        # bulk_create sends no signals. Recomputing thousands of summaries here
+        # would dwarf the insert, so they are marked stale and rebuilt on read
+        user_ids = {planned.tutor_id for planned in schedule.sessions}
+        user_ids.update(planned.learner_id for planned in schedule.sessions)
+        for year_id in set(year_ids):
+            transaction.on_commit(lambda year_id=year_id: expire_activity(user_ids, year_id))
+        schedule_fragment_invalidation(user_ids)
+        schedule_feed_invalidation(user_ids)
+
+        # Weekly load counters: recount the affected tutors for the week in one query
+        tutor_ids = {planned.tutor_id for planned in schedule.sessions}
+        counts = week_sessions(schedule.week_start).filter(tutor_id__in=tutor_ids).values_list(
+            'tutor_id'
+        ).annotate(n=Count('id')).order_by()
+        TutorWeeklyLoad.objects.bulk_create(
+            [TutorWeeklyLoad(tutor_id=tutor_id, week_start=schedule.week_start, sessions=n, updated_at=now)
+             for tutor_id, n in counts],
+            update_conflicts=True,
+            unique_fields=['tutor', 'week_start'],
+            update_fields=['sessions', 'updated_at'],
+        )
+    schedule.created = len(schedule.sessions)
+    return schedule
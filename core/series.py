@@ -0,0 +1,142 @@
+"""Lazy expansion of recurring session series
+
+A ``SessionSeries`` stores only its rule. Calendar and dashboard windows
+expand it into ``Occurrence`` objects on the fly, and an occurrence becomes a
+``Session`` row only when it is completed, so session-table scans and
+analytics grow with real activity instead of with the number of planned
+weeks.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+# How far ahead dashboards look for occurrences
+UPCOMING_DAYS = 28
+
+
+@dataclass(frozen=True)
+class Occurrence:
+    """One not-yet-materialized date of a series; reads like a scheduled ``Session`` in templates"""
+    series: object
+    occurrence_date: date
+    session_date: datetime
+
+    status = 'Scheduled'
+    is_recurring = True
+    pk = None
+
+    @property
+    def tutor(self):
+        return self.series.tutor
+
+    @property
+    def learner(self):
+        return self.series.learner
+
+    @property
+    def course(self):
+        return self.series.course
+
+    @property
+    def duration(self):
+        return self.series.duration
+
+
+def occurrence_start(series, day):
+    return timezone.make_aware(datetime.combine(day, series.start_time))
+
+
+def series_between(start, end):
+    """Series that can have occurrences starting in ``[start, end)``"""
+    from .models import SessionSeries
+
+    return SessionSeries.objects.filter(
+        start_date__lte=timezone.localdate(end), end_date__gte=timezone.localdate(start),
+    )
+
+
+def active_series(user, start, end):
+    """Series of ``user`` (as tutor or learner) that can have occurrences in ``[start, end)``"""
+    return series_between(start, end).filter(
+        Q(tutor=user) | Q(learner=user),
+    ).select_related('tutor', 'learner', 'course')
+
+
+def expand(series_list, start, end):
+    """Occurrences of ``series_list`` starting in ``[start, end)``, earliest first
+
+    Dates already materialized as ``Session`` rows are left out; those rows
+    are read with the regular session queries.
+    """
+    from .models import Session
+
+    series_list = list(series_list)
+    if not series_list:
+        return []
+    first_day = timezone.localdate(start) - timedelta(days=1)
+    last_day = timezone.localdate(end) + timedelta(days=1)
+    materialized = set(Session.objects.filter(
+        series__in=series_list, occurrence_date__gte=first_day, occurrence_date__lte=last_day,
+    ).values_list('series_id', 'occurrence_date'))
+
+    occurrences = []
+    for series in series_list:
+        for day in series.occurrence_dates(first_day, last_day):
+            session_date = occurrence_start(series, day)
+            if start <= session_date < end and (series.pk, day) not in materialized:
+                occurrences.append(Occurrence(series, day, session_date))
+    occurrences.sort(key=lambda occurrence: (occurrence.session_date, occurrence.series.pk))
+    return occurrences
+
+
+def upcoming_occurrences(user, now=None, days=UPCOMING_DAYS, role=None):
+    """Occurrences in the next ``days`` days where ``user`` is the tutor or learner (or only ``role``)"""
+    now = now or timezone.now()
+    end = now + timedelta(days=days)
+    series = active_series(user, now, end)
+    if role == 'tutor':
+        series = series.filter(tutor=user)
+    elif role == 'learner':
+        series = series.filter(learner=user)
+    return expand(series, now, end)
+
+
+def materialize(series, day, status='Completed'):
+    """The ``Session`` row for one occurrence, created on first use"""
+    from .models import Session
+
+    if not series.is_occurrence(day):
+        raise ValueError(f'{day} is not an occurrence of this series')
+    session, created = Session.objects.get_or_create(
+        series=series,
+        occurrence_date=day,
+        defaults={
+            'tutor_id': series.tutor_id,
+            'learner_id': series.learner_id,
+            'course_id': series.course_id,
+            'evaluation_year_id': series.evaluation_year_id,
+            'session_date': occurrence_start(series, day),
+            'duration': series.duration,
+            'status': status,
+            'notes': series.notes,
+        },
+    )
+    if not created and session.status != status:
+        session.status = status
+        session.save(update_fields=['status', 'updated_at'])
+    return session
+
+
+def skip_occurrence(series, day):
+    """Drop one date from the series without creating a row"""
+    from .models import SessionSeries
+
+    with transaction.atomic():
+        series = SessionSeries.objects.select_for_update().get(pk=series.pk)
+        if day.isoformat() not in series.exceptions:
+            series.exceptions = sorted(series.exceptions + [day.isoformat()])
+            series.save(update_fields=['exceptions', 'updated_at'])
+    return series
@@ -0,0 +1,325 @@
+"""Model signal handlers that keep derived tables in sync"""
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import F, Subquery
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .activity import schedule_activity_refresh
+from .catalog import schedule_catalog_invalidation
+from .conf import schedule_config_invalidation
+from .directory import schedule_directory_invalidation
+from .evaluation_years import schedule_year_invalidation
+from .fragments import schedule_fragment_invalidation
+from .ics import counterpart_ids, schedule_feed_invalidation
+from .keywords import add_state, apply_deltas
+from .matching import schedule_matching_invalidation
+from .models import (
+    Config, Course, EvaluationYear, Feedback, Program, Session, SessionSeries, TopicAlias, TopicCount,
+    TutorApplication, User, Year,
+)
+from .topics import normalize_topic, resolve_topic_key, topic_month
+from .workload import bump_load, counted_week, series_loads, week_of
+
+
+# User fields that no dashboard, picker or index reads
+UNLISTED_USER_FIELDS = {'last_login', 'calendar_key'}
+
+# Set while core.bulk deletes a set of rows and does their bookkeeping itself
+_bulk_change = ContextVar('bulk_change', default=False)
+
+
+@contextmanager
+def bulk_change():
+    """Mute the per-row delete handlers of the code run inside the block"""
+    token = _bulk_change.set(True)
+    try:
+        yield
+    finally:
+        _bulk_change.reset(token)
+
+
+def bump_topic_count(program_id, month, topic_key, label, delta):
+    """Add ``delta`` to the topic count bucket, creating it when needed
+
+    A new bucket takes the label the topic already has in other buckets, so a
+    topic keeps one display spelling across programs and months.
+    """
+    if not topic_key:
+        return
+    bucket = TopicCount.objects.filter(program_id=program_id, month=month, topic_key=topic_key)
+    if bucket.update(count=F('count') + delta) or delta < 0:
+        return
+    label = TopicCount.objects.filter(topic_key=topic_key).values_list('label', flat=True).first() or label
+    TopicCount.objects.get_or_create(
+        program_id=program_id, month=month, topic_key=topic_key,
+        defaults={'label': label[:200], 'count': 0}
+    )
+    bucket.update(count=F('count') + delta)
+
+
+@receiver(pre_save, sender=Feedback)
+def remember_previous_feedback(sender, instance, raw=False, **kwargs):
+    """Resolve the topic key and stash what a feedback counted towards before this save
+
+    An edit reads the stored row and the topic's alias in one query.
+    """
+    instance._previous_topic_bucket = None
+    instance._previous_session_id = None
+    if raw:
+        return
+    if not instance.pk:
+        instance.topic_key = resolve_topic_key(instance.topic)
+        return
+    key = normalize_topic(instance.topic)
+    previous = Feedback.objects.filter(pk=instance.pk).annotate(
+        canonical=Subquery(TopicAlias.objects.filter(alias=key).values('topic_key')[:1])
+    ).values_list(
+        'program_id', 'session_date', 'topic_key', 'indexed_terms', 'session_id', 'canonical'
+    ).first()
+    if previous is None:
+        instance.topic_key = resolve_topic_key(instance.topic)
+        return
+    instance.topic_key = previous[5] or key
+    instance._previous_topic_bucket = (previous[0], topic_month(previous[1]), previous[2])
+    # indexed_terms belongs to the keyword indexer; never overwrite it from a stale instance
+    instance.indexed_terms = previous[3]
+    instance._previous_session_id = previous[4]
+
+
+@receiver(post_save, sender=Feedback)
+def update_topic_counts(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_topic_bucket', None)
+    current = (instance.program_id, topic_month(instance.session_date), instance.topic_key)
+    if previous == current:
+        return
+    if previous:
+        bump_topic_count(*previous, label='', delta=-1)
+    bump_topic_count(*current, label=instance.topic.strip(), delta=1)
+
+
+@receiver(post_delete, sender=Feedback)
+def release_topic_count(sender, instance, **kwargs):
+    if _bulk_change.get():
+        return
+    bump_topic_count(instance.program_id, topic_month(instance.session_date),
+                     instance.topic_key, label='', delta=-1)
+
+
+@receiver(pre_delete, sender=Feedback)
+def release_comment_terms(sender, instance, **kwargs):
+    if _bulk_change.get():
+        return
+    indexed_terms = Feedback.objects.filter(pk=instance.pk).values_list('indexed_terms', flat=True).first()
+    deltas = Counter()
+    add_state(deltas, indexed_terms, -1)
+    apply_deltas(deltas)
+
+
+@receiver(pre_save, sender=Session)
+def remember_session_participants(sender, instance, raw=False, **kwargs):
+    instance._previous_participants = None
+    if raw or not instance.pk:
+        return
+    instance._previous_participants = Session.objects.filter(pk=instance.pk).values_list(
+        'tutor_id', 'learner_id', 'evaluation_year_id', 'session_date', 'status'
+    ).first()
+
+
+@receiver(post_save, sender=Session)
+@receiver(post_delete, sender=Session)
+def refresh_session_activity(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    user_ids = [instance.tutor_id, instance.learner_id]
+    year_ids = [instance.evaluation_year_id]
+    previous = getattr(instance, '_previous_participants', None)
+    if previous:
+        user_ids += previous[:2]
+        year_ids.append(previous[2])
+    schedule_activity_refresh(user_ids, year_ids)
+    schedule_fragment_invalidation(user_ids)
+    schedule_feed_invalidation(user_ids)
+
+
+@receiver(post_save, sender=Session)
+def update_weekly_load(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_participants', None)
+    before = counted_week(previous[0], previous[3], previous[4]) if previous else None
+    if created and instance.series_id:
+        # A completed occurrence was counted with its series
+        before = counted_week(instance.tutor_id, instance.session_date, 'Scheduled')
+    after = counted_week(instance.tutor_id, instance.session_date, instance.status)
+    # A booking that reserved its place with reserve_load() is already counted
+    if before == after or (created and after and getattr(instance, '_reserved_week', None) == after):
+        return
+    if before:
+        bump_load(*before, delta=-1)
+    if after:
+        bump_load(*after, delta=1)
+
+
+@receiver(post_delete, sender=Session)
+def release_weekly_load(sender, instance, **kwargs):
+    week = counted_week(instance.tutor_id, instance.session_date, instance.status)
+    if week:
+        bump_load(*week, delta=-1)
+    # Without its row the occurrence is pending in its series again
+    series = SessionSeries.objects.filter(pk=instance.series_id).first() if instance.series_id else None
+    if series and series.is_occurrence(instance.occurrence_date):
+        bump_load(series.tutor_id, week_of(instance.occurrence_date), 1)
+
+
+@receiver(pre_save, sender=SessionSeries)
+def remember_series_loads(sender, instance, raw=False, **kwargs):
+    instance._previous_loads = Counter()
+    if raw or not instance.pk:
+        return
+    previous = SessionSeries.objects.filter(pk=instance.pk).first()
+    if previous:
+        instance._previous_loads = series_loads(previous)
+
+
+@receiver(post_save, sender=SessionSeries)
+def update_series_loads(sender, instance, raw=False, **kwargs):
+    """Count the occurrences a series added and release the ones it dropped"""
+    if raw:
+        return
+    deltas = Counter(series_loads(instance))
+    deltas.subtract(getattr(instance, '_previous_loads', Counter()))
+    # Weeks a booking reserved with reserve_load() are already counted
+    deltas.subtract(getattr(instance, '_reserved_loads', Counter()))
+    instance._reserved_loads = Counter()
+    for (tutor_id, week_start), delta in deltas.items():
+        bump_load(tutor_id, week_start, delta)
+
+
+@receiver(pre_delete, sender=SessionSeries)
+def release_series_loads(sender, instance, **kwargs):
+    # Completed occurrences stay counted: their rows outlive the series
+    for (tutor_id, week_start), count in series_loads(instance).items():
+        bump_load(tutor_id, week_start, -count)
+
+
+@receiver(post_save, sender=Feedback)
+@receiver(post_delete, sender=Feedback)
+def refresh_feedback_activity(sender, instance, raw=False, **kwargs):
+    """Linking feedback to a session changes the learner's pending feedback count"""
+    session_ids = {instance.session_id, getattr(instance, '_previous_session_id', None)} - {None}
+    if raw or not session_ids or _bulk_change.get():
+        return
+    year_ids = Session.objects.filter(pk__in=session_ids).values_list('evaluation_year_id', flat=True)
+    schedule_activity_refresh([instance.learner_id], list(year_ids))
+    schedule_fragment_invalidation([instance.learner_id])
+
+
+@receiver(post_save, sender=SessionSeries)
+@receiver(post_delete, sender=SessionSeries)
+def refresh_series_fragments(sender, instance, raw=False, **kwargs):
+    """Upcoming-session panels and calendar feeds expand the participants' series"""
+    if raw:
+        return
+    schedule_fragment_invalidation([instance.tutor_id, instance.learner_id])
+    schedule_feed_invalidation([instance.tutor_id, instance.learner_id])
+
+
+@receiver(post_save, sender=User)
+def refresh_counterpart_feeds(sender, instance, raw=False, created=False, update_fields=None, **kwargs):
+    """Calendar events are titled with the other participant's name"""
+    if raw or created or (update_fields and not {'first_name', 'last_name'} & set(update_fields)):
+        return
+    schedule_feed_invalidation(counterpart_ids(instance.pk))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=TutorApplication)
+@receiver(post_delete, sender=TutorApplication)
+def refresh_admin_fragments(sender, instance, raw=False, update_fields=None, **kwargs):
+    """The admin dashboard lists users and tutor applications"""
+    # Logins and calendar link resets touch fields no dashboard shows
+    if raw or (update_fields and set(update_fields) <= UNLISTED_USER_FIELDS):
+        return
+    schedule_fragment_invalidation([])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=TutorApplication)
+@receiver(post_delete, sender=TutorApplication)
+def refresh_tutor_directory(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Tutor pickers read approved tutors and their names from an in-process snapshot"""
+    if raw or (update_fields and set(update_fields) <= UNLISTED_USER_FIELDS):
+        return
+    schedule_directory_invalidation()
+
+
+@receiver(post_save, sender=Program)
+@receiver(post_delete, sender=Program)
+@receiver(post_save, sender=Year)
+@receiver(post_delete, sender=Year)
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def refresh_catalog(sender, raw=False, **kwargs):
+    """Registration forms read the catalog from an in-process snapshot"""
+    if raw:
+        return
+    schedule_catalog_invalidation()
+
+
+@receiver(post_save, sender=EvaluationYear)
+@receiver(post_delete, sender=EvaluationYear)
+def refresh_evaluation_years(sender, raw=False, **kwargs):
+    """Session saves and forms resolve years from an in-process interval table"""
+    if raw:
+        return
+    schedule_year_invalidation()
+
+
+@receiver(post_save, sender=Config)
+@receiver(post_delete, sender=Config)
+def refresh_config(sender, raw=False, **kwargs):
+    """Settings are read from an in-process snapshot"""
+    if raw:
+        return
+    schedule_config_invalidation()
+
+
+@receiver(m2m_changed, sender=TutorApplication.courses.through)
+def touch_tutor_application(sender, instance, action, reverse, pk_set, **kwargs):
+    """The matching index reloads applications by updated_at, which course changes do not bump"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # Changed from the course side: instance is a Course
+        applications = TutorApplication.objects.filter(pk__in=pk_set or ())
+        if action == 'post_clear':
+            schedule_matching_invalidation()
+            return
+    else:
+        applications = TutorApplication.objects.filter(pk=instance.pk)
+    applications.update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=User)
+def touch_tutor_applications(sender, instance, raw=False, created=False, update_fields=None, **kwargs):
+    """The matching index keeps the tutor's name and active flag, which User saves do not bump on the application"""
+    if raw or created or (update_fields and set(update_fields) <= UNLISTED_USER_FIELDS):
+        return
+    TutorApplication.objects.filter(user=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=TutorApplication)
+@receiver(post_delete, sender=Feedback)
+def rebuild_matching_index(sender, **kwargs):
+    """Deleted rows leave no updated_at trace, so the matching index is rebuilt"""
+    if _bulk_change.get():
+        return
+    schedule_matching_invalidation()
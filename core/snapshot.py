@@ -0,0 +1,52 @@
+"""Process-local snapshots of rarely changing tables, invalidated through a shared version key"""
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+class VersionedSnapshot:
+    """Keep ``loader(version)``'s result in process memory until the version in the cache changes.
+
+    Writers call ``invalidate()`` (or ``schedule_invalidation()`` inside a
+    transaction) to publish a new version; every process sharing the cache
+    rebuilds its snapshot within ``check_interval`` seconds.
+    """
+
+    def __init__(self, version_key, loader, check_interval=1.0):
+        self.version_key = version_key
+        self.loader = loader
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._value = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def get(self):
+        now = time.monotonic()
+        if self._value is not None and now - self._checked_at < self.check_interval:
+            return self._value
+
+        # Versions are timestamps, so an evicted key never brings back an old version
+        version = cache.get_or_set(self.version_key, time.time_ns, None)
+        with self._lock:
+            if self._value is None or self._version != version:
+                self._value = self.loader(version)
+                self._version = version
+            self._checked_at = now
+            return self._value
+
+    @property
+    def version(self):
+        """Version of the current snapshot (loading it if needed)"""
+        self.get()
+        return self._version
+
+    def invalidate(self):
+        cache.set(self.version_key, time.time_ns(), None)
+        with self._lock:
+            self._value = None
+
+    def schedule_invalidation(self):
+        transaction.on_commit(self.invalidate)
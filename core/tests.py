@@ -1,3 +1,1575 @@
-from django.test import TestCase
+import random
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+from itertools import product
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.core import signing
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    User, Program, Year, Course, Student, StudentCourse, Session, SessionSeries, Feedback, EvaluationYear, Config,
+    UserActivitySummary, TutorApplication, TutorWeeklyLoad, TopicAlias, TopicCount, CommentTermFrequency, Watermark,
+)
+from .activity import get_activity_summary
+from .availability import available_in, available_in_all, build_mask, slot_bit, slot_start
+from .bulk import _batches, delete_feedback, set_application_status, set_session_status, set_training_completed
+from .catalog import _snapshot as catalog_snapshot, get_catalog, invalidate_catalog
+from .conf import get_setting, update_settings
+from .directory import (
+    _snapshot as directory_snapshot, confirm_tutor, get_directory, is_near_peer, search_learners, teaching_scope,
+)
+from .forms import (
+    AnalyticsFilterForm, LearnerFeedbackForm, SessionCreateForm, StudentCourseSelectionForm, TutorApplicationStep3Form,
+)
+from .fragments import student_stats_fragment
+from .keywords import apply_deltas, update_comment_index
+from .matching import find_tutors, invalidate_matching, matching_index
+from .overlaps import MAX_DURATION, find_overlaps
+from .reconciliation import reconcile_sessions
+from .scheduling import MinCostFlow, next_week_start, plan_week
+from .workload import reserve_load, tutor_load, tutor_loads, week_of
+from .evaluation_years import get_year_table, invalidate_year_table, resolve_year_id, verified_year_table
+from .ics import _line, feed_token, vtimezone
+from .timing import LatencyHistograms, percentile
+from .topics import day_start, trending_topics
+from .series import materialize, skip_occurrence
+from .views import SESSION_HISTORY_PAGE_SIZE, TUTOR_WIZARD_PRIVATE
+from .wizard import MAX_COOKIE_VALUE, WizardState
+
+
+class StudentDashboardTests(TestCase):
+    """student_dashboard is the busiest page, so its query count is capped"""
+
+    PANELS = ('stats', 'upcoming', 'recent', 'pending')
+
+    # Shell: session + user lookups. Panels: session + user lookups each, plus
+    # student profile, activity summary (stats and pending), upcoming list,
+    # recurring series and their recorded occurrences, recent list
+    MAX_QUERIES = 2 + 2 * len(PANELS) + 7
+
+    @classmethod
+    def setUpTestData(cls):
+        today = date.today()
+        EvaluationYear.objects.create(
+            year='current', start_date=today - timedelta(days=200), end_date=today + timedelta(days=200),
+            is_active=True
+        )
+        cls.program = Program.objects.create(name='Medicine', code='MD')
+        cls.year = Year.objects.create(program=cls.program, year_number=1, name='Year 1')
+        cls.course = Course.objects.create(program=cls.program, year=cls.year, code='MD101', name='Anatomy')
+        other_course = Course.objects.create(program=cls.program, year=cls.year, code='MD102', name='Physiology')
+        Course.objects.create(program=cls.program, year=cls.year, code='MD103', name='Histology')
+
+        cls.learner = User.objects.create_user(
+            username='learner', email='learner@agu.edu', password='secret123',
+            first_name='Lea', last_name='Learner', role='Student', student_id='S1'
+        )
+        cls.tutor = User.objects.create_user(
+            username='tutor', email='tutor@agu.edu', password='secret123',
+            first_name='Tom', last_name='Tutor', role='Tutor', student_id='S2'
+        )
+        student = Student.objects.create(user=cls.learner, program=cls.program, year=cls.year)
+        for course in (cls.course, other_course):
+            StudentCourse.objects.create(student=student, course=course, program=cls.program, year=cls.year)
+
+    def create_sessions(self, count, **kwargs):
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(count):
+                Session.objects.create(
+                    tutor=self.tutor, learner=self.learner, course=self.course,
+                    session_date=now + kwargs.get('offset', timedelta(days=1)) + timedelta(minutes=i),
+                    duration=60, status=kwargs.get('status', 'Scheduled')
+                )
+
+    def setUp(self):
+        cache.clear()
+        invalidate_year_table()
+
+    def get_dashboard(self):
+        """Load the page shell and every panel; return the merged panel context and query count"""
+        self.client.force_login(self.learner)
+        # A running server keeps the evaluation year table (and its cache version) warm between requests
+        invalidate_year_table()
+        get_year_table()
+        context = {}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('student_dashboard'))
+            self.assertEqual(response.status_code, 200)
+            for panel in self.PANELS:
+                response = self.client.get(reverse('dashboard_fragment', args=['student', panel]))
+                self.assertEqual(response.status_code, 200)
+                if response.context is not None:
+                    context.update(response.context.flatten())
+        return context, len(queries)
+
+    def create_series(self, **kwargs):
+        start = timezone.localtime() + timedelta(days=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            return SessionSeries.objects.create(
+                tutor=self.tutor, learner=self.learner, course=self.course,
+                start_date=start.date(), end_date=start.date() + timedelta(weeks=10),
+                start_time=start.time().replace(second=0, microsecond=0), duration=60, **kwargs
+            )
+
+    def test_query_count_is_bounded(self):
+        self.create_series()
+        self.create_sessions(3)
+        self.create_sessions(3, offset=-timedelta(days=3), status='Completed')
+        _, small = self.get_dashboard()
+
+        cache.clear()
+        self.create_sessions(30)
+        self.create_sessions(30, offset=-timedelta(days=40), status='Completed')
+        _, large = self.get_dashboard()
+
+        self.assertLessEqual(small, self.MAX_QUERIES)
+        self.assertEqual(small, large)
+
+    def test_counters(self):
+        self.create_sessions(2)
+        self.create_sessions(3, offset=-timedelta(days=2), status='Completed')
+        reviewed = Session.objects.filter(status='Completed').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            Feedback.objects.create(
+                learner=self.learner, program=self.program, year=self.year, tutor=self.tutor,
+                topic='Anatomy', duration='30_60', session=reviewed
+            )
+        # Feedback without a linked session must not hide pending sessions
+        Feedback.objects.create(
+            learner=self.learner, program=self.program, year=self.year, tutor=self.tutor,
+            topic='Anatomy', duration='30_60'
+        )
+
+        context, _ = self.get_dashboard()
+
+        self.assertEqual(context['upcoming_count'], 2)
+        self.assertEqual(context['pending_feedback_count'], 2)
+        self.assertEqual(context['total_hours'], 3.0)
+        self.assertEqual(context['registered_courses_count'], 2)
+        self.assertEqual(len(context['upcoming_sessions']), 2)
+
+    def test_panels_are_cached_until_sessions_change(self):
+        self.create_sessions(2)
+        self.get_dashboard()
+
+        # Warm cache: only the session and user lookups of each request remain
+        _, warm = self.get_dashboard()
+        self.assertEqual(warm, 2 + 2 * len(self.PANELS))
+
+        self.create_sessions(1)
+        context, _ = self.get_dashboard()
+        self.assertEqual(context['upcoming_count'], 3)
+
+    def test_summary_follows_session_writes(self):
+        self.create_sessions(2)
+        session = Session.objects.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            session.status = 'Completed'
+            session.save()
+
+        summary = UserActivitySummary.objects.get(user=self.tutor)
+        self.assertEqual(summary.tutor_upcoming_count, 1)
+        self.assertEqual(summary.tutor_completed_count, 1)
+        self.assertEqual(summary.tutor_minutes, 60)
+
+    def test_upcoming_includes_series_occurrences(self):
+        series = self.create_series()
+        self.create_sessions(1, offset=timedelta(days=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            materialize(series, series.start_date)
+
+        context, _ = self.get_dashboard()
+
+        upcoming = context['upcoming_sessions']
+        self.assertEqual([s.session_date for s in upcoming], sorted(s.session_date for s in upcoming))
+        # The completed first occurrence is a Session row now and no longer listed;
+        # later ones are expanded up to four weeks ahead
+        dates = [s.occurrence_date for s in upcoming[1:]]
+        self.assertEqual(dates, [series.start_date + timedelta(weeks=week) for week in range(1, 4)])
+
+
+class EvaluationYearResolutionTests(TestCase):
+    """Sessions get the evaluation year covering their date from the in-process table"""
+
+    def setUp(self):
+        invalidate_year_table()
+        today = date.today()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.previous = EvaluationYear.objects.create(
+                year='previous', start_date=today - timedelta(days=400), end_date=today - timedelta(days=36)
+            )
+            self.current = EvaluationYear.objects.create(
+                year='current', start_date=today - timedelta(days=35), end_date=today + timedelta(days=330),
+                is_active=True
+            )
+
+    def test_resolves_by_date(self):
+        now = timezone.now()
+        self.assertEqual(resolve_year_id(now - timedelta(days=100)), self.previous.pk)
+        self.assertEqual(resolve_year_id(now), self.current.pk)
+        # Dates outside every year fall back to the active one
+        self.assertEqual(resolve_year_id(now - timedelta(days=1000)), self.current.pk)
+
+    def create_session(self, **kwargs):
+        program = Program.objects.create(name='Medicine', code='MD')
+        year = Year.objects.create(program=program, year_number=1, name='Year 1')
+        course = Course.objects.create(program=program, year=year, code='MD101', name='Anatomy')
+        tutor = User.objects.create_user(username='tutor', email='tutor@agu.edu', password='secret123', role='Tutor')
+        learner = User.objects.create_user(username='learner', email='l@agu.edu', password='secret123')
+        return Session.objects.create(
+            tutor=tutor, learner=learner, course=course, duration=60,
+            session_date=timezone.now() - timedelta(days=100), status='Completed'
+        )
+
+    def test_session_save_uses_the_table(self):
+        get_year_table()
+        with CaptureQueriesContext(connection) as queries:
+            session = self.create_session()
+        self.assertEqual(session.evaluation_year_id, self.previous.pk)
+        self.assertFalse([query for query in queries.captured_queries if 'core_evaluationyear' in query['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.previous.end_date = date.today() - timedelta(days=200)
+            self.previous.save()
+        self.assertEqual(resolve_year_id(timezone.now() - timedelta(days=100)), self.current.pk)
+
+    def test_bulk_writers_can_verify_the_table(self):
+        get_year_table()
+        # An edit whose invalidation never reached this process
+        EvaluationYear.objects.filter(pk=self.previous.pk).update(
+            end_date=date.today() - timedelta(days=200), updated_at=timezone.now()
+        )
+        day = timezone.now() - timedelta(days=100)
+        self.assertEqual(get_year_table().resolve(day).id, self.previous.pk)
+        self.assertEqual(verified_year_table().resolve(day).id, self.current.pk)
+
+    def test_analytics_filter_reads_the_table(self):
+        get_year_table()
+        with self.assertNumQueries(0):
+            form = AnalyticsFilterForm()
+            choices = list(form.fields['evaluation_year'].choices)
+        self.assertEqual(choices, [('', 'All Years'), (self.current.pk, 'current'), (self.previous.pk, 'previous')])
+        self.assertEqual(form.fields['evaluation_year'].initial, self.current.pk)
+
+        form = AnalyticsFilterForm({'evaluation_year': str(self.previous.pk)})
+        with self.assertNumQueries(0):
+            self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['evaluation_year'].end_date, self.previous.end_date)
+
+
+class RequestTimingTests(TestCase):
+    """The timing middleware reports each request's queries and templates"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='learner', email='l@agu.edu', password='secret123')
+        cls.staff = User.objects.create_user(
+            username='staff', email='s@agu.edu', password='secret123', role='Admin', is_staff=True
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing_counts_queries(self):
+        self.client.force_login(self.staff)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('login'))
+
+        timing = dict(entry.split(';', 1) for entry in response['Server-Timing'].split(', '))
+        self.assertEqual(set(timing), {'db', 'tpl', 'total'})
+        self.assertTrue(timing['db'].startswith(f'desc="{len(queries)} queries";'))
+
+    def test_server_timing_is_hidden_from_other_users(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('login')))
+        self.client.force_login(self.user)
+        self.assertNotIn('Server-Timing', self.client.get(reverse('login')))
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged_with_queries(self):
+        self.client.force_login(self.user)
+        with self.assertLogs('core.requests', 'WARNING') as logs:
+            self.client.get(reverse('login'))
+        self.assertIn('Slow request GET', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    def test_histograms_merge_across_processes(self):
+        workers = [LatencyHistograms(), LatencyHistograms()]
+        for worker in workers:
+            worker.observe('dashboard', 0.005)
+            worker.observe('login', 0.3)
+            worker.flush()
+        workers[0].observe('dashboard', 2)
+        workers[0].flush()
+
+        snapshot = workers[1].snapshot()
+        self.assertEqual(sorted(snapshot), ['dashboard', 'login'])
+        counts, total_ms = snapshot['dashboard']
+        self.assertEqual(sum(counts), 3)
+        self.assertEqual(total_ms, 2010)
+        self.assertEqual(percentile(counts, 0.5), 10)
+        self.assertEqual(percentile(counts, 0.99), 2500)
+
+
+class CalendarFeedTests(TestCase):
+    """ICS feeds revalidate against a per-user stamp and can be revoked"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Years committed by earlier test classes were rolled back without a signal
+        invalidate_year_table()
+        program = Program.objects.create(name='Medicine', code='MD')
+        year = Year.objects.create(program=program, year_number=1, name='Year 1')
+        cls.course = Course.objects.create(program=program, year=year, code='MD101', name='Anatomy')
+        cls.tutor = User.objects.create_user(
+            username='tutor', email='tutor@agu.edu', password='secret123', first_name='Tom', role='Tutor'
+        )
+        cls.learner = User.objects.create_user(
+            username='learner', email='l@agu.edu', password='secret123', first_name='Lea', role='Student'
+        )
+        cls.session = Session.objects.create(
+            tutor=cls.tutor, learner=cls.learner, course=cls.course, duration=60,
+            session_date=timezone.now() + timedelta(days=1)
+        )
+
+    def get_feed(self, token, **headers):
+        return self.client.get(reverse('calendar_feed', args=[token]), headers=headers)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feed_revalidates_against_the_cached_stamp(self):
+        token = feed_token(self.learner)
+        response = self.get_feed(token)
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn(f'UID:session-{self.session.pk}@', body)
+        self.assertIn('SUMMARY:PAL MD101 Anatomy (Tutor: Tom)', body)
+
+        etag = response['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get_feed(token, if_none_match=etag).status_code, 304)
+        self.assertFalse([query for query in queries if 'core_session' in query['sql']])
+
+        self.session.status = 'Cancelled'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.session.save()
+        response = self.get_feed(token, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('STATUS:CANCELLED', b''.join(response.streaming_content).decode())
+
+        # The other participant's name is in the event titles
+        etag = response['ETag']
+        self.tutor.first_name = 'Thomas'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tutor.save()
+        response = self.get_feed(token, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('(Tutor: Thomas)', b''.join(response.streaming_content).decode())
+
+    def test_series_times_refer_to_a_vtimezone(self):
+        start = timezone.localdate() + timedelta(days=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            SessionSeries.objects.create(
+                tutor=self.tutor, learner=self.learner, course=self.course, start_date=start,
+                end_date=start + timedelta(weeks=4), start_time=time(9, 0), duration=60,
+            )
+        body = b''.join(self.get_feed(feed_token(self.learner)).streaming_content).decode()
+        tzid = settings.TIME_ZONE
+        self.assertIn(f'BEGIN:VTIMEZONE\r\nTZID:{tzid}\r\n', body)
+        self.assertLess(body.index('END:VTIMEZONE'), body.index(f'DTSTART;TZID={tzid}:'))
+
+    def test_vtimezone_lists_daylight_saving_changes(self):
+        component = vtimezone('Europe/Berlin', 2026, 2026)
+        self.assertIn('BEGIN:DAYLIGHT\r\nDTSTART:20260329T020000\r\nTZOFFSETFROM:+0100\r\nTZOFFSETTO:+0200', component)
+        self.assertIn('BEGIN:STANDARD\r\nDTSTART:20261025T030000\r\nTZOFFSETFROM:+0200\r\nTZOFFSETTO:+0100', component)
+
+    def test_reset_revokes_the_old_link(self):
+        old_token = feed_token(self.tutor)
+        self.client.force_login(self.tutor)
+        self.client.post(reverse('reset_calendar_feed'))
+        self.tutor.refresh_from_db()
+
+        self.assertEqual(self.get_feed(old_token).status_code, 404)
+        self.assertEqual(self.get_feed(feed_token(self.tutor)).status_code, 200)
+        self.assertEqual(self.get_feed('forged').status_code, 404)
+
+    def test_long_lines_are_folded(self):
+        value = 'Anatomie – Übungen ' * 10
+        folded = _line('SUMMARY', value)
+        physical = folded.encode().split(b'\r\n')[:-1]
+        self.assertTrue(all(len(line) <= 75 for line in physical))
+        self.assertTrue(all(line.startswith(b' ') for line in physical[1:]))
+        self.assertEqual(folded.replace('\r\n ', ''), f'SUMMARY:{value}\r\n')
+
+
+class PalTestCase(TestCase):
+    """A program with two years, one course, an approved tutor and an enrolled learner"""
+
+    @classmethod
+    def setUpTestData(cls):
+        today = date.today()
+        cls.evaluation_year = EvaluationYear.objects.create(
+            year='current', start_date=today - timedelta(days=200), end_date=today + timedelta(days=200),
+            is_active=True
+        )
+        cls.program = Program.objects.create(name='Medicine', code='MD')
+        cls.year = Year.objects.create(program=cls.program, year_number=1, name='Year 1')
+        cls.senior_year = Year.objects.create(program=cls.program, year_number=2, name='Year 2')
+        cls.course = Course.objects.create(program=cls.program, year=cls.year, code='MD101', name='Anatomy')
+        cls.tutor = User.objects.create_user(
+            username='tutor', email='tutor@agu.edu', password='secret123',
+            first_name='Tom', last_name='Tutor', role='Tutor', student_id='S2'
+        )
+        cls.learner = User.objects.create_user(
+            username='learner', email='learner@agu.edu', password='secret123',
+            first_name='Lea', last_name='Learner', role='Student', student_id='S1'
+        )
+        cls.application = TutorApplication.objects.create(
+            user=cls.tutor, program=cls.program, year=cls.senior_year, status='Approved', consent=True,
+            preferred_days='Monday', preferred_times='Morning', max_sessions_per_week=3
+        )
+        cls.application.courses.add(cls.course)
+        cls.student = Student.objects.create(user=cls.learner, program=cls.program, year=cls.year)
+        StudentCourse.objects.create(student=cls.student, course=cls.course, program=cls.program, year=cls.year)
+
+    def setUp(self):
+        cache.clear()
+        invalidate_year_table()
+        invalidate_catalog()
+
+    def create_session(self, start=None, **kwargs):
+        fields = {
+            'tutor': self.tutor, 'learner': self.learner, 'course': self.course, 'duration': 60,
+            'session_date': start or timezone.now() + timedelta(days=1),
+        }
+        fields.update(kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Session.objects.create(**fields)
+
+    def session_form(self, start, **kwargs):
+        data = {
+            'learner': self.learner.pk, 'course': self.course.pk, 'evaluation_year': self.evaluation_year.pk,
+            'session_date': timezone.localtime(start).strftime('%Y-%m-%dT%H:%M'), 'duration': 60,
+        }
+        data.update(kwargs)
+        return SessionCreateForm(data, tutor=self.tutor)
+
+
+# Admin pages render without collected static files
+PLAIN_STORAGES = {'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                  'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}}
+
+
+class BulkChangeTests(PalTestCase):
+    """Set-based changes leave the derived tables as the per-row signal path does"""
+
+    def create_feedback(self, session, comments):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Feedback.objects.create(
+                learner=self.learner, program=self.program, year=self.year, tutor=self.tutor,
+                topic='Cardiac cycle', duration='30_60', session=session, comments=comments
+            )
+
+    def test_feedback_delete_matches_per_row_path(self):
+        sessions = [self.create_session(timezone.now() - timedelta(days=day), status='Completed')
+                    for day in range(1, 4)]
+        feedback = [self.create_feedback(session, 'more diagrams please') for session in sessions]
+        update_comment_index()
+        self.assertEqual(TopicCount.objects.get().count, 3)
+        self.assertTrue(CommentTermFrequency.objects.filter(count__gt=0).exists())
+        summary = get_activity_summary(self.learner)
+        self.assertEqual(summary.pending_feedback_count, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            feedback[0].delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(delete_feedback(Feedback.objects.all()), 2)
+
+        self.assertFalse(Feedback.objects.exists())
+        self.assertEqual(TopicCount.objects.get().count, 0)
+        self.assertFalse(CommentTermFrequency.objects.filter(count__gt=0).exists())
+        self.assertEqual(get_activity_summary(self.learner).pending_feedback_count, 3)
+
+    def test_cancelling_sessions_releases_weekly_load(self):
+        start = timezone.now() + timedelta(days=7)
+        for minute in range(3):
+            self.create_session(start + timedelta(hours=minute * 2))
+        self.assertEqual(tutor_load(self.tutor.pk, week_of(start)), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(set_session_status(Session.objects.all(), 'Cancelled'), 3)
+
+        self.assertEqual(tutor_load(self.tutor.pk, week_of(start)), 0)
+        self.assertEqual(set(Session.objects.values_list('status', flat=True)), {'Cancelled'})
+        self.assertEqual(get_activity_summary(self.tutor).tutor_upcoming_count, 0)
+
+    def test_selections_are_changed_in_pk_ranges(self):
+        sessions = [self.create_session(timezone.now() + timedelta(days=day)) for day in range(1, 6)]
+        # An admin-style selection: annotated and ordered by something else
+        selection = Session.objects.annotate(feedback_count=Count('feedbacks')).order_by('-session_date')
+        batches = list(_batches(selection, size=2))
+        self.assertEqual([sorted(Session.objects.filter(pk__in=batch).values_list('pk', flat=True))
+                          for batch in batches],
+                         [[s.pk for s in sessions[:2]], [s.pk for s in sessions[2:4]], [sessions[4].pk]])
+
+        applications = TutorApplication.objects.annotate(course_count=Count('courses')).order_by('-created_at')
+        self.assertEqual(set_training_completed(applications, True), 1)
+        self.assertEqual(set_application_status(applications, 'Rejected'), 1)
+        self.assertEqual(list(TutorApplication.objects.values_list('status', 'training_completed')),
+                         [('Rejected', True)])
+
+    def test_admin_action_selects_across_pages(self):
+        for day in range(1, 4):
+            self.create_session(timezone.now() + timedelta(days=day))
+        admin_user = User.objects.create_superuser(
+            username='admin', email='admin@agu.edu', password='secret123', first_name='Ada', last_name='Admin',
+            role='Admin'
+        )
+        self.client.force_login(admin_user)
+        with override_settings(STORAGES=PLAIN_STORAGES), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:core_session_changelist'), {
+                'action': 'mark_completed', 'select_across': '1', 'index': '0',
+                ACTION_CHECKBOX_NAME: [Session.objects.first().pk],
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Session.objects.filter(status='Completed').count(), 3)
+
+    def test_command_approval_reaches_the_tutor_picker(self):
+        applicant = User.objects.create_user(
+            username='new', email='new@agu.edu', password='secret123', first_name='Nia', role='Tutor'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            application = TutorApplication.objects.create(
+                user=applicant, program=self.program, year=self.senior_year, consent=True
+            )
+        self.assertFalse(get_directory().is_eligible(applicant.pk, self.program.pk, 1))
+
+        # The command's invalidation may not reach a web process; the form confirms in the database
+        call_command('bulk_update', 'approve-applications', '--ids', str(application.pk), stdout=StringIO())
+        self.assertTrue(confirm_tutor(applicant.pk, self.program.pk, 1))
+        self.assertTrue(get_directory().is_eligible(applicant.pk, self.program.pk, 1))
+        self.assertFalse(confirm_tutor(self.learner.pk, self.program.pk, 1))
+
+
+class TopicIndexTests(PalTestCase):
+    """Topic keys, their counts and the trending topics agree with the feedback rows"""
+
+    def add_feedback(self, topic, **kwargs):
+        fields = {'learner': self.learner, 'program': self.program, 'year': self.year, 'tutor': self.tutor,
+                  'topic': topic, 'duration': '30_60'}
+        fields.update(kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Feedback.objects.create(**fields)
+
+    def counts(self):
+        return dict(TopicCount.objects.filter(count__gt=0).values_list('topic_key', 'count'))
+
+    def test_counts_follow_create_edit_and_delete(self):
+        feedback = self.add_feedback('  Cardiology ')
+        self.add_feedback('cardiology')
+        self.assertEqual(self.counts(), {'cardiology': 2})
+
+        feedback.topic = 'Renal physiology'
+        with self.captureOnCommitCallbacks(execute=True):
+            feedback.save()
+        self.assertEqual(self.counts(), {'cardiology': 1, 'renal physiology': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            feedback.delete()
+        self.assertEqual(self.counts(), {'cardiology': 1})
+
+    def test_clustering_merges_aliases_under_one_label(self):
+        self.add_feedback('Cardiology')
+        self.add_feedback('Cardiology')
+        self.add_feedback('cardiolgy')
+        call_command('cluster_topics', stdout=StringIO())
+
+        self.assertEqual(dict(TopicAlias.objects.values_list('alias', 'topic_key')), {'cardiolgy': 'cardiology'})
+        self.assertEqual(set(Feedback.objects.values_list('topic_key', flat=True)), {'cardiology'})
+        self.assertEqual(list(TopicCount.objects.values_list('label', 'count')), [('Cardiology', 3)])
+
+        # Later feedback follows the alias; a new bucket reuses the topic's label
+        other = Program.objects.create(name='Nursing', code='NU')
+        self.add_feedback('cardiolgy', program=other)
+        self.assertEqual(set(TopicCount.objects.values_list('label', flat=True)), {'Cardiology'})
+
+    def test_edit_resolves_the_alias_with_the_stored_row(self):
+        TopicAlias.objects.create(alias='cardiolgy', topic_key='cardiology')
+        feedback = self.add_feedback('Anatomy')
+        feedback.topic = 'Cardiolgy'
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                feedback.save()
+        self.assertEqual(feedback.topic_key, 'cardiology')
+        reads = [query['sql'] for query in queries.captured_queries if 'core_topicalias' in query['sql']]
+        self.assertEqual(len(reads), 1)
+        self.assertIn('core_feedback', reads[0])
+
+    def test_trending_topics_match_the_feedback_range(self):
+        today = timezone.localdate()
+        first = today.replace(day=1) - timedelta(days=40)
+        first = first.replace(day=1)
+        for topic, day in [('Cardiology', 1), ('Cardiology', 20), ('Anatomy', 20), ('Anatomy', 25)]:
+            feedback = self.add_feedback(topic)
+            Feedback.objects.filter(pk=feedback.pk).update(
+                session_date=day_start(first.replace(day=day)) + timedelta(hours=12)
+            )
+        call_command('cluster_topics', stdout=StringIO())
+        feedbacks = Feedback.objects.all()
+
+        # Whole month: read from the index
+        last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        with self.assertNumQueries(2):
+            topics = trending_topics(feedbacks, self.program, first, last)
+        self.assertEqual([(row['topic'], row['count']) for row in topics], [('Anatomy', 2), ('Cardiology', 2)])
+
+        # Part of a month: counted from the feedback itself, last day included
+        middle = first.replace(day=20)
+        in_range = feedbacks.filter(session_date__gte=day_start(middle),
+                                    session_date__lt=day_start(first.replace(day=26)))
+        topics = trending_topics(in_range, self.program, middle, first.replace(day=25))
+        self.assertEqual([(row['topic'], row['count']) for row in topics], [('Anatomy', 2), ('Cardiology', 1)])
+        self.assertEqual(sum(row['count'] for row in topics), in_range.count())
+
+
+class OverlapTests(PalTestCase):
+    """Overlap probes look back MAX_DURATION minutes on the tutor and learner indexes"""
+
+    def setUp(self):
+        super().setUp()
+        self.start = timezone.now().replace(second=0, microsecond=0) + timedelta(days=3)
+
+    def overlapping(self, start, duration, **participants):
+        return [row[0] for row in find_overlaps(start, duration, **participants)]
+
+    def test_back_to_back_sessions_do_not_overlap(self):
+        session = self.create_session(self.start)
+        self.assertEqual(self.overlapping(self.start + timedelta(minutes=60), 60, tutor_id=self.tutor.pk), [])
+        self.assertEqual(self.overlapping(self.start - timedelta(minutes=60), 60, tutor_id=self.tutor.pk), [])
+        self.assertEqual(self.overlapping(self.start + timedelta(minutes=59), 60, tutor_id=self.tutor.pk),
+                         [session.pk])
+
+    def test_longest_session_is_within_the_probe(self):
+        session = self.create_session(self.start, duration=MAX_DURATION)
+        end = self.start + timedelta(minutes=MAX_DURATION)
+        self.assertEqual(self.overlapping(end - timedelta(minutes=1), 30, learner_id=self.learner.pk), [session.pk])
+        self.assertEqual(self.overlapping(end, 30, learner_id=self.learner.pk), [])
+
+    def test_conflicts_on_either_side(self):
+        other_tutor = User.objects.create_user(username='t2', email='t2@agu.edu', password='x', role='Tutor')
+        other_learner = User.objects.create_user(username='l2', email='l2@agu.edu', password='x', role='Student')
+        session = self.create_session(self.start)
+        self.create_session(self.start + timedelta(minutes=10), status='Cancelled')
+
+        # Same learner with another tutor, and same tutor with another learner
+        self.assertEqual(self.overlapping(self.start, 30, tutor_id=other_tutor.pk, learner_id=self.learner.pk),
+                         [session.pk])
+        self.assertEqual(self.overlapping(self.start, 30, tutor_id=self.tutor.pk, learner_id=other_learner.pk),
+                         [session.pk])
+        self.assertEqual(self.overlapping(self.start, 30, tutor_id=other_tutor.pk, learner_id=other_learner.pk), [])
+        self.assertEqual(self.overlapping(self.start, 30, tutor_id=self.tutor.pk, exclude_pk=session.pk), [])
+
+    def test_database_rejects_longer_sessions(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Session.objects.bulk_create([Session(
+                tutor=self.tutor, learner=self.learner, course=self.course, duration=MAX_DURATION + 1,
+                session_date=self.start,
+            )])
+
+
+class SeriesConflictTests(PalTestCase):
+    """Every occurrence of a series counts for overlaps and weekly loads, materialized or not"""
+
+    def setUp(self):
+        super().setUp()
+        today = timezone.localdate()
+        self.monday = timezone.make_aware(datetime.combine(
+            today + timedelta(days=14 - today.weekday()), time(9, 0)
+        ))
+
+    def create_series(self, start, **kwargs):
+        fields = {
+            'tutor': self.tutor, 'learner': self.learner, 'course': self.course, 'duration': 60,
+            'start_date': start.date(), 'end_date': start.date() + timedelta(weeks=5), 'start_time': start.time(),
+        }
+        fields.update(kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            return SessionSeries.objects.create(**fields)
+
+    def test_loads_and_overlaps_include_occurrences(self):
+        self.create_series(self.monday)
+        third_week = self.monday + timedelta(weeks=2)
+        self.assertEqual(tutor_load(self.tutor.pk, week_of(third_week)), 1)
+        self.assertEqual([row[0] for row in find_overlaps(third_week, 30, learner_id=self.learner.pk)], [None])
+
+        materialize(SessionSeries.objects.get(), third_week.date())
+        self.assertEqual(tutor_load(self.tutor.pk, week_of(third_week)), 1)
+
+    def test_one_off_on_a_later_occurrence_is_rejected(self):
+        self.create_series(self.monday)
+        form = self.session_form(self.monday + timedelta(weeks=3, minutes=30))
+        self.assertFalse(form.is_valid())
+        self.assertIn('another session', form.errors['session_date'][0])
+
+    def test_series_over_a_later_session_is_rejected(self):
+        self.create_session(self.monday + timedelta(weeks=2))
+        form = self.session_form(self.monday, repeat='weekly')
+        self.assertFalse(form.is_valid())
+        self.assertIn(f"On {self.monday + timedelta(weeks=2):%d %b %Y}", form.errors['session_date'][0])
+
+    def test_series_meeting_another_series_is_rejected(self):
+        other_tutor = User.objects.create_user(username='t2', email='t2@agu.edu', password='x', role='Tutor')
+        # Every other week from the second week: the first meeting is the new series' second occurrence
+        self.create_series(self.monday + timedelta(weeks=1), tutor=other_tutor, recurrence='biweekly')
+        self.assertFalse(self.session_form(self.monday, repeat='weekly').is_valid())
+        self.assertTrue(self.session_form(self.monday, repeat='biweekly').is_valid())
+
+
+class WeeklyCapTests(PalTestCase):
+    """Bookings take their place in the weekly load counter with one conditional update"""
+
+    def setUp(self):
+        super().setUp()
+        today = timezone.localdate()
+        self.monday = timezone.make_aware(datetime.combine(
+            today + timedelta(days=14 - today.weekday()), time(9, 0)
+        ))
+        self.week = week_of(self.monday)
+
+    def test_reservations_stop_at_the_cap(self):
+        self.assertEqual([reserve_load(self.tutor.pk, self.week, 2) for _ in range(3)], [True, True, False])
+        self.assertEqual(TutorWeeklyLoad.objects.get(tutor=self.tutor, week_start=self.week).sessions, 2)
+
+    def test_reserved_booking_is_counted_once(self):
+        form = self.session_form(self.monday)
+        self.assertTrue(form.is_valid())
+        with self.captureOnCommitCallbacks(execute=True):
+            session = form.book()
+        self.assertEqual(session.tutor, self.tutor)
+        self.assertEqual(tutor_load(self.tutor.pk, self.week), 1)
+
+    def test_full_week_is_rejected(self):
+        for day in range(3):
+            self.create_session(self.monday + timedelta(days=day))
+        self.client.force_login(self.tutor)
+        response = self.client.post(reverse('create_session'), self.session_form(self.monday + timedelta(days=3)).data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('maximum is 3 per week', str(response.context['form'].errors))
+        self.assertEqual(Session.objects.count(), 3)
+        self.assertEqual(tutor_load(self.tutor.pk, self.week), 3)
+
+    def test_booking_fails_when_the_week_filled_after_validation(self):
+        form = self.session_form(self.monday)
+        self.assertTrue(form.is_valid())
+        # Another booking takes the last places between validation and save
+        for _ in range(3):
+            reserve_load(self.tutor.pk, self.week, 3)
+        self.assertIsNone(form.book())
+        self.assertIn('already full', form.errors['session_date'][0])
+        self.assertFalse(Session.objects.exists())
+
+    def series_form(self, weeks=3):
+        until = (self.monday + timedelta(weeks=weeks - 1)).date()
+        return self.session_form(self.monday, repeat='weekly', repeat_until=until.isoformat())
+
+    def loads(self):
+        return dict(TutorWeeklyLoad.objects.filter(sessions__gt=0).values_list('week_start', 'sessions'))
+
+    def test_series_is_counted_when_booked(self):
+        form = self.series_form()
+        self.assertTrue(form.is_valid())
+        with self.captureOnCommitCallbacks(execute=True):
+            series = form.book()
+        weeks = [self.week + timedelta(weeks=n) for n in range(3)]
+        self.assertEqual(self.loads(), dict.fromkeys(weeks, 1))
+        with self.assertNumQueries(1):
+            self.assertEqual(tutor_loads(self.tutor.pk, weeks), dict.fromkeys(weeks, 1))
+
+        # A completed occurrence keeps its place, a skipped one gives it back
+        materialize(series, weeks[0])
+        skip_occurrence(series, weeks[1])
+        self.assertEqual(self.loads(), {weeks[0]: 1, weeks[2]: 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            series.delete()
+        self.assertEqual(self.loads(), {weeks[0]: 1})
+
+    def test_series_reserves_every_week(self):
+        form = self.series_form()
+        self.assertTrue(form.is_valid())
+        # The last week fills up between validation and save
+        for _ in range(3):
+            reserve_load(self.tutor.pk, self.week + timedelta(weeks=2), 3)
+        self.assertIsNone(form.book())
+        self.assertIn('already full', form.errors['session_date'][0])
+        self.assertFalse(SessionSeries.objects.exists())
+        self.assertEqual(self.loads(), {self.week + timedelta(weeks=2): 3})
+
+
+class AvailabilityTests(PalTestCase):
+    """Availability filters read the per-slot rows kept in step with the mask"""
+
+    def available(self, *slots, every=False):
+        mask = build_mask()
+        for day, slot in slots:
+            mask |= slot_bit(day, slot)
+        lookup = available_in_all if every else available_in
+        return list(lookup(TutorApplication.objects.all(), mask).values_list('pk', flat=True))
+
+    def test_slot_rows_follow_the_preferences(self):
+        self.assertEqual(list(self.application.availability_slots.values_list('slot', flat=True)), [0])
+        self.assertEqual(self.available(('Monday', 'Morning')), [self.application.pk])
+        self.assertEqual(self.available(('Monday', 'Evening')), [])
+
+        self.application.preferred_days = 'Monday, Friday'
+        self.application.preferred_times = ''
+        self.application.save(update_fields=['preferred_days', 'preferred_times'])
+        self.assertEqual(self.application.availability_slots.count(), 6)
+        self.assertEqual(self.available(('Monday', 'Evening'), ('Tuesday', 'Morning')), [self.application.pk])
+        self.assertEqual(self.available(('Monday', 'Evening'), ('Friday', 'Morning'), every=True),
+                         [self.application.pk])
+        self.assertEqual(self.available(('Monday', 'Evening'), ('Tuesday', 'Morning'), every=True), [])
+
+    def test_filter_uses_the_slot_index(self):
+        query = str(available_in(TutorApplication.objects.all(), slot_bit('Monday', 'Morning')).query)
+        self.assertIn('core_tutoravailabilityslot', query)
+        self.assertNotIn('availability_mask', query.split('WHERE', 1)[1])
+
+
+class LearnerScopeTests(PalTestCase):
+    """Tutors find and book near-peer learners of their courses, with or without stored enrollments"""
+
+    def add_learner(self, username, year, program=None):
+        user = User.objects.create_user(username=username, email=f'{username}@agu.edu', password='x',
+                                        first_name=username.title(), role='Student')
+        Student.objects.create(user=user, program=program or self.program, year=year)
+        return user
+
+    def found(self, query=''):
+        return [row['id'] for row in search_learners(teaching_scope(self.tutor), query)]
+
+    def test_students_without_enrollments_fall_back_to_program_and_year(self):
+        legacy = self.add_learner('legacy', self.year)
+        self.add_learner('third', Year.objects.create(program=self.program, year_number=3, name='Year 3'))
+        other_program = Program.objects.create(name='Nursing', code='NU')
+        self.add_learner('nurse', Year.objects.create(program=other_program, year_number=1, name='Year 1'),
+                         program=other_program)
+
+        self.assertEqual(sorted(self.found()), sorted([self.learner.pk, legacy.pk]))
+        self.assertEqual(self.found('leg'), [legacy.pk])
+
+    def test_booking_checks_the_learner_scope(self):
+        today = timezone.localdate()
+        start = timezone.make_aware(datetime.combine(today + timedelta(days=14 - today.weekday()), time(9, 0)))
+        third = self.add_learner('third', Year.objects.create(program=self.program, year_number=3, name='Year 3'))
+        form = self.session_form(start, learner=third.pk)
+        self.assertFalse(form.is_valid())
+        self.assertIn('learner', form.errors)
+        self.assertTrue(self.session_form(start, learner=self.add_learner('legacy', self.year).pk).is_valid())
+
+    def test_same_year_learners_are_in_scope(self):
+        # The tutor's application is for the senior year; a learner there is a near peer
+        senior = self.add_learner('senior', self.senior_year)
+        enrolled = self.add_learner('enrolled', self.senior_year)
+        StudentCourse.objects.create(student=enrolled.student_profile, course=self.course, program=self.program,
+                                     year=self.senior_year)
+        self.assertEqual(self.found('sen'), [senior.pk])
+        self.assertEqual(self.found('enr'), [enrolled.pk])
+        today = timezone.localdate()
+        start = timezone.make_aware(datetime.combine(today + timedelta(days=14 - today.weekday()), time(9, 0)))
+        self.assertTrue(self.session_form(start, learner=senior.pk).is_valid())
+
+
+class MatchingTests(PalTestCase):
+    """The matching index follows tutor account changes and is read without its lock"""
+
+    def matched(self):
+        matching_index.refresh(force=True)
+        return [match.candidate.user_id for match in find_tutors(self.course)]
+
+    def test_deactivated_tutor_is_no_longer_matched(self):
+        # Older than the refresh overlap and than the latest application, so it is reloaded only once bumped
+        TutorApplication.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        other = User.objects.create_user(username='t2', email='t2@agu.edu', password='x', role='Tutor')
+        TutorApplication.objects.create(user=other, program=self.program, year=self.senior_year, consent=True)
+        self.assertEqual(self.matched(), [self.tutor.pk])
+        self.tutor.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tutor.save()
+        self.assertEqual(self.matched(), [])
+
+    def test_refresh_swaps_in_new_buckets(self):
+        self.matched()
+        bucket = matching_index._by_course[self.program.pk, self.course.pk]
+        self.application.status = 'Rejected'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.application.save()
+        self.assertEqual(self.matched(), [])
+        # A reader still holding the earlier bucket sees it unchanged
+        self.assertEqual(list(bucket), [self.application.pk])
+
+    def test_new_version_is_built_before_it_is_published(self):
+        self.matched()
+        candidates, bucket = matching_index._candidates, matching_index._by_course[self.program.pk, self.course.pk]
+        invalidate_matching()
+        self.assertEqual(self.matched(), [self.tutor.pk])
+        self.assertIsNot(matching_index._candidates, candidates)
+        # The published dicts were replaced whole, never emptied in place
+        self.assertEqual(list(candidates), [self.application.pk])
+        self.assertEqual(list(bucket), [self.application.pk])
+
+    def test_same_year_tutor_is_a_near_peer(self):
+        TutorApplication.objects.filter(pk=self.application.pk).update(year=self.year)
+        invalidate_matching()
+        matching_index.refresh(force=True)
+        matches = find_tutors(self.course, learner=self.learner)
+        self.assertEqual([match.candidate.user_id for match in matches], [self.tutor.pk])
+        self.assertTrue(confirm_tutor(self.tutor.pk, self.program.pk, self.year.year_number))
+        self.assertFalse(is_near_peer(self.year.year_number, self.senior_year.year_number))
+
+    def test_invalid_learner_id_is_rejected(self):
+        admin = User.objects.create_user(username='admin', email='admin@agu.edu', password='x', role='Admin')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('tutor_matches'), {'course_id': self.course.pk, 'learner_id': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+
+class FeedbackKeywordTests(PalTestCase):
+    """The keyword endpoint validates its filters instead of failing on them"""
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            Feedback.objects.create(
+                learner=self.learner, program=self.program, year=self.year, tutor=self.tutor,
+                topic='Cardiac cycle', duration='30_60', comments='more diagrams please, diagrams help'
+            )
+        update_comment_index()
+        self.client.force_login(
+            User.objects.create_user(username='manager', email='manager@agu.edu', password='x', role='Manager')
+        )
+
+    def keywords(self, **params):
+        return self.client.get(reverse('feedback_keywords'), params)
+
+    def test_filters_and_limit(self):
+        terms = self.keywords(program=self.program.pk, tutor=self.tutor.pk).json()['terms']
+        self.assertEqual(terms[0], {'term': 'diagrams', 'count': 2})
+        self.assertEqual(len(self.keywords(limit=-5).json()['terms']), 1)
+        self.assertEqual(self.keywords(program=self.program.pk + 1).json()['terms'], [])
+
+    def test_deltas_are_upserted(self):
+        month = date.today().replace(day=1)
+        bucket = (self.tutor.pk, self.program.pk, month)
+        # Another indexer created the row first
+        CommentTermFrequency.objects.create(tutor=self.tutor, program=self.program, month=month, term='slides',
+                                            count=3)
+        apply_deltas(Counter({bucket + ('slides',): 1, bucket + ('pace',): 2, bucket + ('diagrams',): -2}))
+        counts = dict(CommentTermFrequency.objects.filter(month=month).values_list('term', 'count'))
+        self.assertEqual(counts, {'slides': 4, 'pace': 2, 'please': 1, 'help': 1})
+
+    def test_invalid_parameters_are_rejected(self):
+        self.assertEqual(self.keywords(program='abc').status_code, 400)
+        self.assertEqual(self.keywords(tutor='1; drop').status_code, 400)
+        self.assertEqual(self.keywords(start='2026-13').status_code, 400)
+        self.assertEqual(self.keywords(term='diagrams', limit=0).json()['by_tutor'][0]['count'], 2)
+
+
+class SchedulingTests(PalTestCase):
+    """The weekly planner's flow solver and learner placement"""
+
+    def test_solver_matches_brute_force(self):
+        rng = random.Random(7)
+        for _ in range(200):
+            learners, tutors = rng.randint(1, 5), rng.randint(1, 3)
+            capacity = [rng.randint(1, 2) for _ in range(tutors)]
+            costs = {(i, j): rng.randint(0, 9) for i in range(learners) for j in range(tutors) if rng.random() < 0.7}
+
+            network = MinCostFlow(2 + learners + tutors)
+            for i in range(learners):
+                network.add_edge(0, 2 + i, 1, 0)
+            for j in range(tutors):
+                network.add_edge(2 + learners + j, 1, capacity[j], 0)
+            for (i, j), cost in costs.items():
+                network.add_edge(2 + i, 2 + learners + j, 1, cost)
+
+            best = (0, 0)
+            for choice in product(*[[None] + [j for j in range(tutors) if (i, j) in costs] for i in range(learners)]):
+                if all(choice.count(j) <= capacity[j] for j in range(tutors)):
+                    placed = [costs[i, j] for i, j in enumerate(choice) if j is not None]
+                    best = min(best, (-len(placed), sum(placed)))
+            self.assertEqual(network.solve(0, 1), (-best[0], best[1]))
+
+    def test_plan_places_waiting_learners_in_free_slots(self):
+        for n in range(3):
+            user = User.objects.create_user(username=f'l{n}', email=f'l{n}@agu.edu', password='x', role='Student')
+            student = Student.objects.create(user=user, program=self.program, year=self.year)
+            StudentCourse.objects.create(student=student, course=self.course, program=self.program, year=self.year)
+        week = next_week_start()
+        # The index is process-wide; drop what earlier tests loaded
+        matching_index.refresh(force=True)
+
+        # The tutor is only free on Monday morning
+        schedule = plan_week(StudentCourse.objects.all(), week)
+        self.assertEqual([(s.tutor_id, s.learner_id) for s in schedule.sessions], [(self.tutor.pk, self.learner.pk)])
+        self.assertEqual(schedule.sessions[0].session_date, slot_start(week, 0))
+        self.assertEqual(len(schedule.unmatched), 3)
+
+        # A recurring session already holds that slot
+        with self.captureOnCommitCallbacks(execute=True):
+            SessionSeries.objects.create(
+                tutor=self.tutor, learner=self.learner, course=self.course, start_date=week, end_date=week,
+                start_time=time(9, 0), duration=60,
+            )
+        self.assertEqual(plan_week(StudentCourse.objects.all(), week).sessions, [])
+
+
+class SettingsTests(PalTestCase):
+    """Settings are checked against their type and range before anything is stored"""
+
+    def test_out_of_range_values_are_rejected_before_writing(self):
+        for value in ('0', '-1', '21', '2.5'):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                update_settings({'minGpaForTutor': '3.5', 'maxCourseSelections': value})
+        with self.assertRaisesMessage(ValueError, 'must be at most 4.0'):
+            update_settings({'minGpaForTutor': '4.5'})
+        with self.assertRaises(ValueError):
+            update_settings({'minGpaForTutor': 'nan'})
+        self.assertFalse(Config.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(update_settings({'maxCourseSelections': '5'}), ['maxCourseSelections'])
+        self.assertEqual(get_setting('maxCourseSelections'), 5)
+
+    def test_stored_out_of_range_value_reads_as_default(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Config.objects.create(key='maxCourseSelections', value='0')
+        self.assertEqual(get_setting('maxCourseSelections'), 3)
+
+    def test_settings_page_reports_the_range(self):
+        self.client.force_login(
+            User.objects.create_user(username='admin', email='admin@agu.edu', password='x', role='Admin')
+        )
+        response = self.client.post(reverse('settings'), {'maxCourseSelections': '0'}, follow=True)
+        self.assertContains(response, 'must be at least 1')
+
+
+class ActivitySummaryTests(PalTestCase):
+    """Dashboard summaries count the active year, with lifetime totals"""
+
+    def setUp(self):
+        super().setUp()
+        today = date.today()
+        self.previous = EvaluationYear.objects.create(
+            year='previous', start_date=today - timedelta(days=600), end_date=today - timedelta(days=201)
+        )
+        invalidate_year_table()
+        self.old = self.create_session(timezone.now() - timedelta(days=300), status='Completed', duration=120)
+        self.create_session(timezone.now() - timedelta(days=3), status='Completed')
+
+    def test_total_hours_cover_every_year(self):
+        summary = get_activity_summary(self.learner)
+        self.assertEqual(summary.evaluation_year_id, self.evaluation_year.pk)
+        self.assertEqual((summary.learner_completed_count, summary.learner_minutes), (1, 60))
+        self.assertEqual(summary.learner_total_hours, 3.0)
+        self.assertEqual(student_stats_fragment(self.learner)['total_hours'], 3.0)
+
+        # A change in another year still reaches the summary the dashboard reads
+        self.old.duration = 180
+        with self.captureOnCommitCallbacks(execute=True):
+            self.old.save()
+        self.assertEqual(get_activity_summary(self.tutor).tutor_total_minutes, 240)
+
+    def test_without_an_active_year_every_session_counts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.evaluation_year.is_active = False
+            self.evaluation_year.save()
+        summary = get_activity_summary(self.learner)
+        self.assertIsNone(summary.evaluation_year_id)
+        self.assertEqual((summary.learner_completed_count, summary.learner_minutes), (2, 180))
+
+
+class CatalogEndpointTests(PalTestCase):
+    """Catalog lookups revalidate against the catalog version and stay out of shared caches"""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.learner)
+
+    def test_lookups_revalidate_against_the_catalog_version(self):
+        lookups = [('get_courses_for_program', {'program_id': self.program.pk}),
+                   ('get_years_by_program', {'program': self.program.pk})]
+        for number, (name, params) in enumerate(lookups, start=2):
+            url = reverse(name)
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('private', response['Cache-Control'])
+            self.assertNotIn('public', response['Cache-Control'])
+            etag = response['ETag']
+            self.assertEqual(self.client.get(url, params, headers={'if-none-match': etag}).status_code, 304)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Course.objects.create(program=self.program, year=self.year, code=f'MD10{number}', name='Histology')
+            response = self.client.get(url, params, headers={'if-none-match': etag})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+
+class ReconciliationTests(PalTestCase):
+    """Overdue scheduled sessions are closed incrementally from a watermark"""
+
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+
+    def reconcile(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return reconcile_sessions(**kwargs)
+
+    def test_incremental_runs_read_only_the_new_window(self):
+        overdue = self.create_session(self.now - timedelta(hours=3))
+        upcoming = self.create_session(self.now + timedelta(hours=1))
+        self.assertEqual(self.reconcile(now=self.now), (1, 1))
+        overdue.refresh_from_db()
+        self.assertEqual(overdue.status, 'Completed')
+
+        # Untouched for days and ended long before the last run: outside the incremental window
+        forgotten = self.create_session(self.now - timedelta(days=5))
+        Session.objects.filter(pk=forgotten.pk).update(updated_at=self.now - timedelta(days=5))
+        # Edited since the last run, however old its date
+        edited = self.create_session(self.now - timedelta(days=4))
+
+        later = self.now + timedelta(hours=3)
+        self.assertEqual(self.reconcile(now=later)[1], 2)
+        statuses = dict(Session.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[upcoming.pk], 'Completed')
+        self.assertEqual(statuses[edited.pk], 'Completed')
+        self.assertEqual(statuses[forgotten.pk], 'Scheduled')
+
+        self.assertEqual(self.reconcile(now=later, full=True)[1], 1)
+        self.assertEqual(Watermark.objects.get(name='session_reconciliation').value, later)
+
+    def test_grace_period_and_dry_run(self):
+        # Ended 90 and 20 minutes ago; only the first is past the default hour of grace
+        self.create_session(self.now - timedelta(minutes=150))
+        self.create_session(self.now - timedelta(minutes=80))
+
+        self.assertEqual(self.reconcile(now=self.now, dry_run=True), (2, 1))
+        self.assertFalse(Session.objects.exclude(status='Scheduled').exists())
+        self.assertFalse(Watermark.objects.filter(name='session_reconciliation', value__isnull=False).exists())
+
+        self.assertEqual(self.reconcile(now=self.now, grace=timedelta(minutes=10))[1], 2)
+
+    def test_cancelling_releases_the_weekly_load(self):
+        session = self.create_session(self.now - timedelta(hours=3))
+        week = week_of(session.session_date)
+        self.assertEqual(tutor_load(self.tutor.pk, week), 1)
+
+        self.assertEqual(self.reconcile(status='Cancelled', now=self.now)[1], 1)
+        self.assertEqual(tutor_load(self.tutor.pk, week), 0)
+        self.assertEqual(get_activity_summary(self.learner).learner_upcoming_count, 0)
+
+
+class WizardTests(PalTestCase):
+    """Registration wizard state survives only as signed, server-checked cookies"""
+
+    COOKIE = 'wizard_student_registration'
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.learner)
+
+    def post_step1(self):
+        response = self.client.post(reverse('student_registration_start'), {
+            'email': self.learner.email, 'first_name': 'Lea', 'last_name': 'Learner', 'student_id': 'S1',
+        })
+        self.assertEqual(response.json(), {'next_step': 'step2'})
+        return response
+
+    def wizard(self, cookie, name='student_registration', private=()):
+        request = RequestFactory().get('/register/')
+        request.user = self.learner
+        if cookie is not None:
+            request.COOKIES[f'wizard_{name}'] = cookie
+        return WizardState(request, name, private)
+
+    def test_completed_registration_clears_the_cookie(self):
+        self.post_step1()
+        self.client.post(reverse('student_registration_step2'), {'program': self.program.pk, 'year': self.year.pk})
+        response = self.client.post(reverse('student_registration_step3'), {'courses': [self.course.pk]})
+
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(response.cookies[self.COOKIE].value, '')
+        self.assertEqual(list(StudentCourse.objects.filter(student=self.student).values_list('course_id', flat=True)), [self.course.pk])
+
+    def test_steps_cannot_be_skipped(self):
+        self.assertRedirects(self.client.get(reverse('student_registration_step2')),
+                             reverse('student_registration_start'), fetch_redirect_response=False)
+        self.post_step1()
+        # Step 1 alone does not unlock step 3
+        self.assertRedirects(self.client.get(reverse('student_registration_step3')),
+                             reverse('student_registration_start'), fetch_redirect_response=False)
+
+    def test_tampered_cookie_starts_over(self):
+        value = self.post_step1().cookies[self.COOKIE].value
+        payload, signature = value.rsplit(':', 1)
+        self.client.cookies[self.COOKIE] = f'{payload}:{signature[::-1]}'
+
+        response = self.client.get(reverse('student_registration_step2'))
+        self.assertRedirects(response, reverse('student_registration_start'), fetch_redirect_response=False)
+        self.assertEqual(response.cookies[self.COOKIE].value, '')
+
+        # A cookie signed for another visitor is rejected the same way
+        other = self.wizard(None)
+        other.salt = 'core.wizard.student_registration.anonymous'
+        other['student_reg_step1'] = {'user_id': self.tutor.pk}
+        response = HttpResponse()
+        other.save(response)
+        self.assertNotIn('student_reg_step1', self.wizard(response.cookies[self.COOKIE].value))
+
+    def test_oversized_state_moves_to_the_cache(self):
+        state = self.wizard(None)
+        state['notes'] = random.Random(0).randbytes(MAX_COOKIE_VALUE).hex()
+        response = HttpResponse()
+        state.save(response)
+
+        cookie = response.cookies[self.COOKIE].value
+        self.assertLessEqual(len(cookie), MAX_COOKIE_VALUE)
+        self.assertEqual(self.wizard(cookie)['notes'], state['notes'])
+
+        # Losing the cached copy starts the wizard over rather than failing
+        cache.clear()
+        self.assertNotIn('notes', self.wizard(cookie))
+
+    def test_private_keys_stay_on_the_server(self):
+        state = self.wizard(None, 'tutor_registration', TUTOR_WIZARD_PRIVATE)
+        state['tutor_reg_step1'] = {'name': 'Tom Tutor'}
+        state['tutor_reg_step2'] = {'gpa': 3.9, 'motivation': 'I enjoy teaching'}
+        response = HttpResponse()
+        state.save(response)
+
+        cookie = response.cookies['wizard_tutor_registration'].value
+        payload = signing.loads(cookie, salt=state.salt)
+        self.assertEqual(set(payload), {'cache'})
+        restored = self.wizard(cookie, 'tutor_registration', TUTOR_WIZARD_PRIVATE)
+        self.assertEqual(restored['tutor_reg_step2']['gpa'], 3.9)
+
+
+@override_settings(STORAGES=PLAIN_STORAGES)
+class AdminChangelistTests(PalTestCase):
+    """Changelist query counts do not grow with the rows on the page"""
+
+    CHANGELISTS = ('session', 'feedback', 'student', 'tutorapplication', 'year')
+
+    def setUp(self):
+        super().setUp()
+        admin_user = User.objects.create_superuser(
+            username='admin', email='admin@agu.edu', password='secret123', first_name='Ada', last_name='Admin',
+            role='Admin'
+        )
+        self.client.force_login(admin_user)
+        self.added = 0
+
+    def add_rows(self, count):
+        """``count`` more rows for every changelist, each pointing at its own users and year"""
+        first = self.added
+        self.added += count
+        numbers = range(first, self.added)
+        users = User.objects.bulk_create([
+            User(username=f'bulk{i}', email=f'bulk{i}@agu.edu', first_name='Bulk', last_name=str(i),
+                 role='Student', student_id=f'B{i}')
+            for i in numbers
+        ])
+        years = Year.objects.bulk_create([
+            Year(program=self.program, year_number=10 + i, name=f'Year {10 + i}') for i in numbers
+        ])
+        Student.objects.bulk_create([
+            Student(user=user, program=self.program, year=year) for user, year in zip(users, years)
+        ])
+        applications = TutorApplication.objects.bulk_create([
+            TutorApplication(user=user, program=self.program, year=year, gpa=3.5, consent=True)
+            for user, year in zip(users, years)
+        ])
+        TutorApplication.courses.through.objects.bulk_create([
+            TutorApplication.courses.through(tutorapplication=application, course=self.course)
+            for application in applications
+        ])
+        start = timezone.now() + timedelta(days=1)
+        Session.objects.bulk_create([
+            Session(tutor=self.tutor, learner=user, course=self.course, evaluation_year=self.evaluation_year,
+                    session_date=start + timedelta(hours=i), duration=60)
+            for i, user in zip(numbers, users)
+        ])
+        Feedback.objects.bulk_create([
+            Feedback(learner=user, program=self.program, year=year, tutor=self.tutor, topic='Anatomy',
+                     duration='30_60', session_date=start.date())
+            for user, year in zip(users, years)
+        ])
+
+    def get_changelist(self, model):
+        response = self.client.get(reverse(f'admin:core_{model}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_query_count_does_not_depend_on_rows(self):
+        self.add_rows(2)
+        small = {}
+        for model in self.CHANGELISTS:
+            self.get_changelist(model)
+            with CaptureQueriesContext(connection) as queries:
+                self.get_changelist(model)
+            small[model] = len(queries)
+
+        self.add_rows(98)
+        for model in self.CHANGELISTS:
+            with self.subTest(model=model), self.assertNumQueries(small[model]):
+                response = self.get_changelist(model)
+                self.assertGreaterEqual(len(response.context['cl'].result_list), 100)
+
+
+class SessionHistoryTests(PalTestCase):
+    """The enhanced dashboard history pages with deferred columns and no per-row queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        invalidate_year_table()
+        start = timezone.now() - timedelta(days=30)
+        cls.sessions = Session.objects.bulk_create([
+            Session(tutor=cls.tutor, learner=cls.learner, course=cls.course, evaluation_year=cls.evaluation_year,
+                    session_date=start + timedelta(days=i), duration=60, status='Completed')
+            for i in range(25)
+        ])
+        Feedback.objects.create(
+            learner=cls.learner, program=cls.program, year=cls.year, tutor=cls.tutor,
+            topic='Anatomy', duration='30_60', session=cls.sessions[-1]
+        )
+
+    def get_page(self, user, page=None):
+        self.client.force_login(user)
+        data = {} if page is None else {'page': page}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('session_history'), data)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_pages_follow_each_other(self):
+        first, _ = self.get_page(self.learner)
+        rows = first.context['sessions']
+        self.assertEqual([s.pk for s in rows], [s.pk for s in reversed(self.sessions)][:SESSION_HISTORY_PAGE_SIZE])
+        self.assertEqual(first.context['next_page'], 2)
+
+        second, _ = self.get_page(self.learner, 2)
+        self.assertEqual([s.pk for s in second.context['sessions']], [s.pk for s in reversed(self.sessions[:5])])
+        self.assertIsNone(second.context['next_page'])
+
+        # A bad page number falls back to the first page
+        self.assertEqual(self.get_page(self.learner, 'x')[0].context['sessions'], rows)
+
+    def test_deferred_columns_are_not_loaded_per_row(self):
+        for user in (self.learner, self.tutor):
+            with self.subTest(role=user.role):
+                full, full_queries = self.get_page(user)
+                partial, partial_queries = self.get_page(user, 2)
+                self.assertEqual(len(full.context['sessions']), SESSION_HISTORY_PAGE_SIZE)
+                self.assertEqual(full_queries, partial_queries)
+
+        response, _ = self.get_page(self.learner)
+        self.assertContains(response, 'Feedback Submitted', count=1)
+        self.assertContains(response, 'Submit Feedback', count=SESSION_HISTORY_PAGE_SIZE - 1)
+        self.assertContains(self.get_page(self.tutor)[0], self.learner.get_full_name(),
+                            count=SESSION_HISTORY_PAGE_SIZE)
+
+
+class CatalogFormTests(PalTestCase):
+    """Course selection choices come from the catalog snapshot and follow catalog edits"""
+
+    def choices(self, form_class, year_number, **kwargs):
+        form = form_class(program_id=self.program.pk, year_number=year_number, **kwargs)
+        return [label for _, label in form.fields['courses'].choices]
+
+    def test_choices_follow_catalog_edits(self):
+        get_catalog()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.choices(StudentCourseSelectionForm, 1), ['MD101 - Anatomy'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            histology = Course.objects.create(program=self.program, year=self.year, code='MD102', name='Histology')
+            Course.objects.create(program=self.program, year=self.senior_year, code='MD201', name='Pathology')
+            self.course.name = 'Gross Anatomy'
+            self.course.save()
+        # Courses are visible from Year 1 up to the selected year
+        self.assertEqual(self.choices(StudentCourseSelectionForm, 1), ['MD101 - Gross Anatomy', 'MD102 - Histology'])
+        self.assertEqual(self.choices(TutorApplicationStep3Form, 2),
+                         ['MD101 - Gross Anatomy', 'MD102 - Histology', 'MD201 - Pathology'])
+
+        form = StudentCourseSelectionForm({'courses': [histology.pk]}, program_id=self.program.pk, year_number=1)
+        self.assertTrue(form.is_valid())
+        self.assertEqual([course.name for course in form.cleaned_data['courses']], ['Histology'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            histology.delete()
+        form = StudentCourseSelectionForm({'courses': [histology.pk]}, program_id=self.program.pk, year_number=1)
+        self.assertFalse(form.is_valid())
+        self.assertIn('courses', form.errors)
+
+    def test_edits_by_other_processes_are_seen_within_the_check_interval(self):
+        get_catalog()
+        # Another worker changed the catalog and published a new version
+        Course.objects.filter(pk=self.course.pk).update(name='Gross Anatomy')
+        cache.set(catalog_snapshot.version_key, catalog_snapshot.version + 1, None)
+        self.assertEqual(self.choices(StudentCourseSelectionForm, 1), ['MD101 - Anatomy'])
+
+        catalog_snapshot._checked_at -= catalog_snapshot.check_interval
+        self.assertEqual(self.choices(StudentCourseSelectionForm, 1), ['MD101 - Gross Anatomy'])
+
+
+class CourseDemandTests(PalTestCase):
+    """Enrollments answer demand questions per course and year of study"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.histology = Course.objects.create(program=cls.program, year=cls.year, code='MD102', name='Histology')
+        cls.pathology = Course.objects.create(program=cls.program, year=cls.senior_year, code='MD201',
+                                              name='Pathology')
+        other_program = Program.objects.create(name='Nursing', code='NU')
+        other_year = Year.objects.create(program=other_program, year_number=1, name='Year 1')
+        cls.nursing = Course.objects.create(program=other_program, year=other_year, code='NU101', name='Care')
+
+        def enroll(name, year, courses, program=cls.program):
+            user = User.objects.create_user(username=name, email=f'{name}@agu.edu', password='x',
+                                            role='Student', student_id=name)
+            student = Student.objects.create(user=user, program=program, year=year)
+            for course in courses:
+                StudentCourse.objects.create(student=student, course=course, program=program, year=year)
+            return user
+
+        # The learner from PalTestCase is enrolled in Anatomy in Year 1
+        cls.first_year = enroll('first', cls.year, [cls.course, cls.histology])
+        cls.second_year = enroll('second', cls.senior_year, [cls.course, cls.pathology])
+        cls.nurse = enroll('nurse', other_year, [cls.nursing], program=other_program)
+
+    def test_demand_by_course(self):
+        demand = StudentCourse.objects.for_program(self.program)
+        self.assertEqual(list(demand.demand_by_course()), [
+            {'course_id': self.course.pk, 'learners': 3},
+            {'course_id': self.histology.pk, 'learners': 1},
+            {'course_id': self.pathology.pk, 'learners': 1},
+        ])
+        self.assertEqual(demand.demand_counts(), {self.course.pk: 3, self.histology.pk: 1, self.pathology.pk: 1})
+        self.assertEqual(StudentCourse.objects.demand_counts()[self.nursing.pk], 1)
+
+    def test_demand_by_course_and_year(self):
+        rows = StudentCourse.objects.for_course(self.course).demand_by_course_and_year()
+        self.assertEqual(list(rows), [
+            {'course_id': self.course.pk, 'year_id': self.year.pk, 'learners': 2},
+            {'course_id': self.course.pk, 'year_id': self.senior_year.pk, 'learners': 1},
+        ])
+        self.assertEqual(sorted(StudentCourse.objects.for_course(self.course).learner_ids()),
+                         sorted([self.learner.pk, self.first_year.pk, self.second_year.pk]))
+
+    def test_registration_replaces_the_selection(self):
+        self.client.force_login(self.first_year)
+        self.client.post(reverse('student_registration_start'), {
+            'email': self.first_year.email, 'first_name': 'First', 'last_name': 'Year', 'student_id': 'first',
+        })
+        # Moving up a year keeps Anatomy, drops Histology and adds Pathology
+        self.client.post(reverse('student_registration_step2'),
+                         {'program': self.program.pk, 'year': self.senior_year.pk})
+        response = self.client.post(reverse('student_registration_step3'),
+                                    {'courses': [self.course.pk, self.pathology.pk]})
+        self.assertTrue(response.json()['success'])
+
+        enrollments = StudentCourse.objects.filter(student__user=self.first_year)
+        self.assertEqual(sorted(enrollments.values_list('course_id', 'year_id')),
+                         sorted([(self.course.pk, self.senior_year.pk), (self.pathology.pk, self.senior_year.pk)]))
+        self.assertEqual(StudentCourse.objects.for_program(self.program).demand_counts(),
+                         {self.course.pk: 3, self.pathology.pk: 2})
+
+
+class TutorDirectoryTests(PalTestCase):
+    """Learners pick and search only the approved near-peer tutors of their program"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        other_program = Program.objects.create(name='Nursing', code='NU')
+        other_year = Year.objects.create(program=other_program, year_number=2, name='Year 2')
+
+        def tutor(name, program, year, status='Approved', **kwargs):
+            first_name, last_name = name.split()
+            user = User.objects.create_user(username=first_name, email=f'{first_name}@agu.edu', password='x',
+                                            first_name=first_name, last_name=last_name, role='Tutor', **kwargs)
+            TutorApplication.objects.create(user=user, program=program, year=year, status=status, consent=True)
+            return user
+
+        cls.classmate = tutor('Tina Turner', cls.program, cls.year)
+        cls.pending = tutor('Toby Pending', cls.program, cls.senior_year, status='Pending')
+        cls.nurse = tutor('Tomas Nurse', other_program, other_year)
+        cls.inactive = tutor('Tod Gone', cls.program, cls.senior_year, is_active=False)
+        cls.senior = User.objects.create_user(username='senior', email='senior@agu.edu', password='x',
+                                              role='Student', student_id='S3')
+        Student.objects.create(user=cls.senior, program=cls.program, year=cls.senior_year)
+
+    def setUp(self):
+        super().setUp()
+        directory_snapshot.invalidate()
+
+    def names(self, tutors):
+        return [tutor.name for tutor in tutors]
+
+    def test_eligible_tutors(self):
+        directory = get_directory()
+        self.assertEqual(self.names(directory.eligible(self.program.pk, 1)), ['Tina Turner', 'Tom Tutor'])
+        # A Year 1 tutor cannot teach Year 2 learners
+        self.assertEqual(self.names(directory.eligible(self.program.pk, 2)), ['Tom Tutor'])
+        self.assertEqual(self.names(directory.eligible()), ['Tina Turner', 'Tom Tutor', 'Tomas Nurse'])
+        self.assertFalse(directory.is_eligible(self.nurse.pk, self.program.pk, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            application = TutorApplication.objects.get(user=self.pending)
+            application.status = 'Approved'
+            application.save()
+        self.assertEqual(self.names(get_directory().eligible(self.program.pk, 2)), ['Toby Pending', 'Tom Tutor'])
+
+    def test_search_is_scoped_to_the_learner(self):
+        self.client.force_login(self.learner)
+        url = reverse('tutor_search')
+        cases = [({'q': 'to'}, ['Tom Tutor']), ({'q': 'T'}, ['Tina Turner', 'Tom Tutor']),
+                 ({'q': 'tom tu'}, ['Tom Tutor']), ({'q': 'TUR'}, ['Tina Turner']), ({'q': 'gone'}, []),
+                 ({'q': 'nurse'}, []), ({'q': '', 'limit': 1}, ['Tina Turner'])]
+        for params, expected in cases:
+            with self.subTest(**params):
+                found = self.client.get(url, params).json()['tutors']
+                self.assertEqual(sorted(tutor['name'] for tutor in found), expected)
+
+        self.client.force_login(self.senior)
+        self.assertEqual(self.client.get(url, {'q': 't'}).json()['tutors'],
+                         [{'id': self.tutor.pk, 'name': 'Tom Tutor'}])
+
+    def test_feedback_form_accepts_only_eligible_tutors(self):
+        def form(learner, tutor):
+            return LearnerFeedbackForm({
+                'program': self.program.pk, 'year': self.year.pk, 'tutor': tutor.pk, 'topic': 'Anatomy',
+                'duration': '30_60', 'explanation_rating': 5, 'usefulness_rating': 5,
+                'attend_again': True, 'well_organized': True,
+            }, learner=learner)
+
+        self.assertTrue(form(self.learner, self.classmate).is_valid())
+        for learner, tutor in [(self.senior, self.classmate), (self.learner, self.nurse),
+                               (self.learner, self.pending), (self.learner, self.inactive)]:
+            with self.subTest(learner=learner.username, tutor=tutor.username):
+                self.assertEqual(form(learner, tutor).errors['tutor'], ['Select a tutor from the list.'])
+        self.assertEqual(form(self.senior, self.tutor).selected_tutor.name, 'Tom Tutor')
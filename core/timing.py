@@ -0,0 +1,227 @@
+"""Per-request timings and per-view latency histograms
+
+The middleware in ``core.middleware`` opens a ``RequestMetrics`` for each
+request. Database time is recorded by a connection execute wrapper and
+template time by the ``TimedDjangoTemplates`` backend, both of which find the
+open request through a context variable and do nothing outside one.
+
+Latency histograms use fixed buckets. Each process counts into memory and
+adds its counts to shared cache counters every ``FLUSH_INTERVAL`` seconds, so
+a request costs no cache round trip and every worker's requests end up in
+the same histogram. That needs the shared (Redis) cache production
+requires; with the local memory cache each process only sees its own.
+Views are registered in numbered slots claimed with an atomic increment,
+so workers seeing a view for the first time never overwrite each other.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.cache import cache
+from django.template.backends.django import DjangoTemplates, Template
+
+# Upper bounds of the latency buckets in milliseconds; the last bucket is unbounded
+BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Seconds between flushes of a process's counts to the shared cache
+FLUSH_INTERVAL = 10
+
+_SLOTS_KEY = 'timing:slots'
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Queries and template time of one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []
+        self.template_time = 0.0
+        self._template_depth = 0
+
+    @property
+    def db_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @contextmanager
+    def template(self):
+        # Templates rendered from inside another template (e.g. a tag calling
+        # render_to_string) are already part of the outer render
+        self._template_depth += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._template_depth -= 1
+            if not self._template_depth:
+                self.template_time += time.perf_counter() - started
+
+    def top_queries(self, limit=5):
+        """``(sql, count, total seconds)`` of the costliest statements, repeated ones grouped"""
+        grouped = defaultdict(lambda: [0, 0.0])
+        for sql, duration in self.queries:
+            entry = grouped[sql]
+            entry[0] += 1
+            entry[1] += duration
+        ranked = sorted(grouped.items(), key=lambda item: item[1][1], reverse=True)
+        return [(sql, count, total) for sql, (count, total) in ranked[:limit]]
+
+
+def current_metrics():
+    return _current.get()
+
+
+@contextmanager
+def track_request():
+    """Open a ``RequestMetrics`` for the code run inside the block"""
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    """Connection execute wrapper timing every statement of the open request"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries.append((sql, time.perf_counter() - started))
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        with metrics.template():
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, adding render time to the open request"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+def _bucket_key(view, position):
+    return f'timing:{view}:{position}'
+
+
+def _total_key(view):
+    return f'timing:{view}:total_ms'
+
+
+def _slot_key(slot):
+    return f'timing:slot:{slot}'
+
+
+def _add(key, delta):
+    if not cache.add(key, delta, None):
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            # Evicted between the two calls
+            cache.add(key, delta, None)
+
+
+def _register(view):
+    # Only the first process to add the marker claims a slot for the view
+    if cache.add(f'timing:registered:{view}', True, None):
+        cache.add(_SLOTS_KEY, 0, None)
+        cache.set(_slot_key(cache.incr(_SLOTS_KEY)), view, None)
+
+
+def registered_views():
+    slots = cache.get(_SLOTS_KEY) or 0
+    return sorted(set(cache.get_many([_slot_key(slot) for slot in range(1, slots + 1)]).values()))
+
+
+class LatencyHistograms:
+    """Request latencies per view, counted in process and flushed to the cache"""
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = defaultdict(lambda: [0] * (len(BUCKETS_MS) + 1))
+        self._pending_ms = defaultdict(int)
+        self._registered = set()
+        self._flushed_at = time.monotonic()
+
+    def observe(self, view, seconds):
+        milliseconds = seconds * 1000
+        with self._lock:
+            self._pending[view][bisect_left(BUCKETS_MS, milliseconds)] += 1
+            self._pending_ms[view] += round(milliseconds)
+            due = time.monotonic() - self._flushed_at >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, pending_ms = self._pending, self._pending_ms
+            self._pending = defaultdict(lambda: [0] * (len(BUCKETS_MS) + 1))
+            self._pending_ms = defaultdict(int)
+            self._flushed_at = time.monotonic()
+
+        for view, counts in pending.items():
+            if view not in self._registered:
+                _register(view)
+                self._registered.add(view)
+            for position, count in enumerate(counts):
+                if count:
+                    _add(_bucket_key(view, position), count)
+            _add(_total_key(view), pending_ms[view])
+
+    def snapshot(self):
+        """``{view: (bucket counts, total milliseconds)}`` across every process"""
+        views = registered_views()
+        keys = [_bucket_key(view, position) for view in views for position in range(len(BUCKETS_MS) + 1)]
+        keys += [_total_key(view) for view in views]
+        values = cache.get_many(keys)
+        return {
+            view: (
+                [values.get(_bucket_key(view, position), 0) for position in range(len(BUCKETS_MS) + 1)],
+                values.get(_total_key(view), 0),
+            )
+            for view in views
+        }
+
+    def reset(self):
+        """Zero the counters; views stay registered"""
+        views = registered_views()
+        keys = [_bucket_key(view, position) for view in views for position in range(len(BUCKETS_MS) + 1)]
+        cache.delete_many(keys + [_total_key(view) for view in views])
+
+
+def percentile(counts, fraction):
+    """Upper bound in milliseconds of the bucket holding the ``fraction`` quantile (None for the open bucket)"""
+    total = sum(counts)
+    if not total:
+        return None
+    seen = 0
+    for position, count in enumerate(counts):
+        seen += count
+        if seen >= fraction * total:
+            return BUCKETS_MS[position] if position < len(BUCKETS_MS) else None
+    return None
+
+
+histograms = LatencyHistograms()
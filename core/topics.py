@@ -0,0 +1,148 @@
+"""Feedback topic normalization and near-duplicate clustering"""
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+# Anything that is not a letter or digit separates words in a topic key
+NON_WORD_RE = re.compile(r'[^0-9a-z]+')
+
+# Default similarity needed before two topic keys are merged into one cluster
+DEFAULT_SIMILARITY = 0.5
+
+
+def normalize_topic(topic):
+    """Return the canonical key for a free-text topic ("  Cardiology " -> "cardiology")"""
+    if not topic:
+        return ''
+    text = unicodedata.normalize('NFKD', topic)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return NON_WORD_RE.sub(' ', text).strip()[:200]
+
+
+def resolve_topic_key(topic):
+    """Normalize a topic and follow any alias recorded by the clustering job"""
+    from .models import TopicAlias
+
+    key = normalize_topic(topic)
+    if not key:
+        return key
+    canonical = TopicAlias.objects.filter(alias=key).values_list('topic_key', flat=True).first()
+    return canonical or key
+
+
+def topic_month(value):
+    """Month bucket (first day of the month) for a feedback timestamp"""
+    if value is None:
+        value = timezone.now()
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.date().replace(day=1)
+
+
+def day_start(day):
+    """Aware start of ``day`` in the current time zone, the lower bound of date filters on timestamps"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def whole_months(first_day, last_day):
+    """Whether the inclusive range first_day..last_day (either may be open) is made of whole months"""
+    return ((first_day is None or first_day.day == 1)
+            and (last_day is None or (last_day + timedelta(days=1)).day == 1))
+
+
+def canonical_labels(spellings):
+    """topic key -> display label, the most used spelling (``spellings`` yields (key, topic, count))"""
+    counts = defaultdict(Counter)
+    for key, topic, count in spellings:
+        counts[key][topic.strip()[:200]] += count
+    return {key: min(counter, key=lambda label: (-counter[label], label)) for key, counter in counts.items()}
+
+
+def trending_topics(feedbacks, program=None, first_day=None, last_day=None, limit=10):
+    """Most frequent topics among ``feedbacks``, as dicts of topic_key, topic and count
+
+    ``feedbacks`` must already be filtered to ``program`` and the inclusive
+    day range. Ranges of whole months are read from the topic count index;
+    anything else is counted from the feedbacks themselves, so the topics
+    always add up to the feedback figures next to them.
+    """
+    from .models import TopicCount
+
+    if whole_months(first_day, last_day):
+        rows = TopicCount.objects.filter(count__gt=0)
+        if program is not None:
+            rows = rows.filter(program=program)
+        if first_day is not None:
+            rows = rows.filter(month__gte=first_day)
+        if last_day is not None:
+            rows = rows.filter(month__lte=last_day)
+        rows = rows.values('topic_key').annotate(count=Sum('count'))
+    else:
+        rows = feedbacks.exclude(topic_key='').values('topic_key').annotate(count=Count('id'))
+    rows = list(rows.order_by('-count', 'topic_key')[:limit])
+
+    # Every bucket of a topic carries its canonical label
+    labels = dict(TopicCount.objects.filter(topic_key__in=[row['topic_key'] for row in rows])
+                  .values_list('topic_key', 'label'))
+    for row in rows:
+        row['topic'] = labels.get(row['topic_key'], row['topic_key'])
+    return rows
+
+
+def trigrams(key):
+    """Trigram set of a topic key, padded per word the same way pg_trgm does"""
+    grams = set()
+    for word in key.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    """Trigram similarity between two topic keys (0.0 - 1.0)"""
+    grams_a, grams_b = trigrams(a), trigrams(b)
+    if not grams_a or not grams_b:
+        return 0.0
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+
+def cluster_topic_keys(key_counts, threshold=DEFAULT_SIMILARITY):
+    """Group near-duplicate topic keys.
+
+    ``key_counts`` maps topic key -> number of feedbacks. Keys are visited from
+    most to least frequent so the most common spelling becomes the canonical key
+    of its cluster. Candidate canonicals are found through a trigram inverted
+    index, so each key is only compared against canonicals sharing a trigram.
+
+    Returns a dict of alias key -> canonical key (canonical keys are omitted).
+    """
+    aliases = {}
+    canonical_grams = {}
+    index = defaultdict(set)
+
+    for key in sorted(key_counts, key=lambda k: (-key_counts[k], k)):
+        grams = trigrams(key)
+        candidates = set()
+        for gram in grams:
+            candidates.update(index[gram])
+
+        best_key, best_score = None, 0.0
+        for candidate in candidates:
+            other = canonical_grams[candidate]
+            score = len(grams & other) / len(grams | other)
+            if score > best_score or (score == best_score and best_key and candidate < best_key):
+                best_key, best_score = candidate, score
+
+        if best_key is not None and best_score >= threshold:
+            aliases[key] = best_key
+            continue
+
+        canonical_grams[key] = grams
+        for gram in grams:
+            index[gram].add(key)
+
+    return aliases
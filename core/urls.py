@@ -15,6 +15,10 @@ urlpatterns = [
     path('manager/analytics/', views.manager_analytics, name='manager_analytics'),
     path('student/', views.student_dashboard, name='student_dashboard'),
     path('student/enhanced/', views.enhanced_student_dashboard, name='enhanced_student_dashboard'),
+    path('student/enhanced/sessions/', views.session_history, name='session_history'),
+    path('calendar/<str:token>/sessions.ics', views.calendar_feed, name='calendar_feed'),
+    path('calendar/reset/', views.reset_calendar_feed, name='reset_calendar_feed'),
+    path('dashboard/fragments/<str:dashboard>/<str:panel>/', views.dashboard_fragment, name='dashboard_fragment'),
     path('settings/', views.settings_view, name='settings'),
     
     # Student Registration (Multi-step)
@@ -29,6 +33,11 @@ urlpatterns = [
 
     # Session Management
     path('session/create/', views.create_session, name='create_session'),
+    path('session/series/upcoming/', views.series_occurrences, name='series_occurrences'),
+    path('session/series/<int:series_id>/<str:occurrence_date>/complete/', views.complete_occurrence,
+         name='complete_occurrence'),
+    path('session/series/<int:series_id>/<str:occurrence_date>/skip/', views.skip_occurrence_view,
+         name='skip_occurrence'),
     path('session/<int:session_id>/feedback/', views.submit_feedback, name='submit_feedback'),
 
     # Learner Feedback (PAL Action Plan v2)
@@ -41,6 +50,7 @@ urlpatterns = [
     # Analytics Export (PAL Action Plan v2)
     path('analytics/export-pdf/', views.analytics_export_pdf, name='analytics_export_pdf'),
     path('analytics/export-excel/', views.analytics_export_excel, name='analytics_export_excel'),
+    path('analytics/keywords/', views.feedback_keywords, name='feedback_keywords'),
 
     # Evaluation Year Management (PAL Action Plan v2)
     path('evaluation-years/', views.manage_evaluation_years, name='manage_evaluation_years'),
@@ -50,5 +60,10 @@ urlpatterns = [
 
     # AJAX/HTMX Endpoints
     path('api/years/', views.get_years_for_program, name='get_years_for_program'),
+    path('api/courses/', views.get_courses_for_program, name='get_courses_for_program'),
+    path('api/matches/', views.tutor_matches, name='tutor_matches'),
+    path('api/tutors/search/', views.tutor_search, name='tutor_search'),
+    path('api/learners/search/', views.learner_search, name='learner_search'),
+    path('api/tutor-load/', views.tutor_weekly_load, name='tutor_weekly_load'),
     path('get-years/', views.get_years_by_program, name='get_years_by_program'),
 ]
@@ -2,13 +2,33 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
-from django.db.models import Count, Avg, Q, Sum, F
+from django.http import JsonResponse, HttpResponse, Http404, StreamingHttpResponse
+from django.db.models import Count, Avg, Q, Sum, F, Max, Exists, OuterRef
 from django.core.paginator import Paginator
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.html import format_html
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
 from django.db import transaction
-from .models import User, Program, Year, Course, Student, TutorApplication, Session, Feedback, Config, EvaluationYear
+from .models import (
+    User, Program, Year, Course, Student, StudentCourse, TutorApplication, Session, Feedback, EvaluationYear,
+    CommentTermFrequency, SessionSeries,
+)
 from . import forms
+from .activity import get_activity_summary
+from .catalog import get_catalog
+from .conf import get_setting, get_settings, update_settings
+from .wizard import uses_wizard
+from .directory import (
+    DEFAULT_LIMIT as TUTOR_SEARCH_LIMIT, get_directory, learner_scope, search_learners, teaching_scope,
+)
+from .matching import DEFAULT_LIMIT, find_tutors
+from .series import materialize, skip_occurrence, upcoming_occurrences
+from .ics import feed_etag, feed_token, feed_user_id, rotate_feed_key, stream_feed
+from .workload import lock_tutor, week_of, weekly_loads
+from .fragments import DASHBOARD_FRAGMENTS, GLOBAL_SCOPE, render_fragment, schedule_fragment_invalidation
+from .topics import day_start, trending_topics
 from io import BytesIO
 from datetime import datetime, timedelta, date
 import json
@@ -67,26 +87,8 @@ def admin_dashboard(request):
         messages.error(request, 'Access denied')
         return redirect('dashboard')
     
-    # Get statistics
-    stats = {
-        'total_users': User.objects.count(),
-        'total_students': User.objects.filter(role='Student').count(),
-        'total_tutors': User.objects.filter(role='Tutor').count(),
-        'total_sessions': Session.objects.count(),
-        'pending_applications': TutorApplication.objects.filter(status='Pending').count(),
-    }
-    
-    # Recent activity
-    recent_users = User.objects.all()[:10]
-    recent_applications = TutorApplication.objects.all()[:10]
-    
-    context = {
-        'stats': stats,
-        'recent_users': recent_users,
-        'recent_applications': recent_applications,
-    }
-    
-    return render(request, 'core/admin_dashboard.html', context)
+    # Statistics and recent activity are loaded from dashboard_fragment
+    return render(request, 'core/admin_dashboard.html')
 
 
 @login_required
@@ -171,7 +173,33 @@ def create_user(request):
     return render(request, 'core/create_user.html', context)
 
 
+# Catalog lookups change a few times a year: browsers may reuse them for a minute and
+# then revalidate against an ETag built from the catalog version. The endpoints need a
+# login, so responses are private: shared proxies must not store them
+CATALOG_MAX_AGE = 60
+
+
+def catalog_etag(request, *args, **kwargs):
+    return f'catalog-{get_catalog().version}'
+
+
+def tutor_year_limit(request):
+    """Year number of the user's student profile (None without one), looked up once per request"""
+    if not hasattr(request, '_tutor_year_limit'):
+        request._tutor_year_limit = Student.objects.filter(user=request.user).values_list(
+            'year__year_number', flat=True
+        ).first()
+    return request._tutor_year_limit
+
+
+def tutor_years_etag(request, *args, **kwargs):
+    # The response also depends on the user's own year
+    return f'catalog-{get_catalog().version}-below-{tutor_year_limit(request)}'
+
+
 @login_required
+@cache_control(private=True, max_age=CATALOG_MAX_AGE)
+@condition(etag_func=catalog_etag)
 def get_years_by_program(request):
     """HTMX endpoint to get years based on program selection"""
     # HTMX sends the value as a query parameter with the same name as the element
@@ -180,14 +208,10 @@ def get_years_by_program(request):
     if not program_id or program_id == '':
         return HttpResponse('<option value="">Select Program First</option>')
 
-    try:
-        years = Year.objects.filter(program_id=program_id).order_by('year_number')
-        html = '<option value="">Select Year</option>'
-        for year in years:
-            html += f'<option value="{year.id}">{year.name}</option>'
-        return HttpResponse(html)
-    except Exception as e:
-        return HttpResponse('<option value="">Error loading years</option>')
+    html = '<option value="">Select Year</option>'
+    for year in get_catalog().years_for_program(program_id):
+        html += format_html('<option value="{}">{}</option>', year.id, year.name)
+    return HttpResponse(html)
 
 
 @login_required
@@ -765,6 +789,8 @@ def analytics_export_pdf(request):
 
         sessions = Session.objects.select_related('tutor', 'learner', 'course', 'evaluation_year')
         feedbacks = Feedback.objects.select_related('tutor', 'learner', 'program', 'year')
+        # Inclusive day range of the feedback figures (and of the trending topics)
+        program = first_day = last_day = None
 
         # Apply filters
         if filter_form.is_valid():
@@ -774,20 +800,25 @@ def analytics_export_pdf(request):
             end_date = filter_form.cleaned_data.get('end_date')
 
             if evaluation_year:
-                sessions = sessions.filter(evaluation_year=evaluation_year)
-                feedbacks = feedbacks.filter(session_date__range=[evaluation_year.start_date, evaluation_year.end_date])
+                sessions = sessions.filter(evaluation_year_id=evaluation_year.id)
+                first_day, last_day = evaluation_year.start_date, evaluation_year.end_date
 
             if program:
                 sessions = sessions.filter(course__program=program)
                 feedbacks = feedbacks.filter(program=program)
 
             if start_date:
-                sessions = sessions.filter(session_date__gte=start_date)
-                feedbacks = feedbacks.filter(session_date__gte=start_date)
+                sessions = sessions.filter(session_date__gte=day_start(start_date))
+                first_day = max(first_day or start_date, start_date)
 
             if end_date:
-                sessions = sessions.filter(session_date__lte=end_date)
-                feedbacks = feedbacks.filter(session_date__lte=end_date)
+                sessions = sessions.filter(session_date__lt=day_start(end_date + timedelta(days=1)))
+                last_day = min(last_day or end_date, end_date)
+
+        if first_day:
+            feedbacks = feedbacks.filter(session_date__gte=day_start(first_day))
+        if last_day:
+            feedbacks = feedbacks.filter(session_date__lt=day_start(last_day + timedelta(days=1)))
 
         # Calculate metrics
         total_sessions = sessions.count()
@@ -804,9 +835,7 @@ def analytics_export_pdf(request):
             feedback_count=Count('id')
         ).filter(feedback_count__gte=3).order_by('-avg_rating')[:5]
 
-        trendy_topics = feedbacks.values('topic').annotate(
-            count=Count('id')
-        ).order_by('-count')[:10]
+        trendy_topics = trending_topics(feedbacks, program, first_day, last_day)
 
         busy_courses = sessions.values('course__name', 'course__code').annotate(
             session_count=Count('id')
@@ -847,6 +876,61 @@ def analytics_export_pdf(request):
         return redirect('analytics')
 
 
+@login_required
+def feedback_keywords(request):
+    """Keyword cloud and drill-down data from the comment term index (Admin/Manager only)"""
+    if request.user.role not in ['Admin', 'Manager']:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+
+    terms = CommentTermFrequency.objects.filter(count__gt=0)
+
+    for param, field in (('program', 'program_id'), ('tutor', 'tutor_id')):
+        value = request.GET.get(param, '')
+        if value:
+            try:
+                terms = terms.filter(**{field: int(value)})
+            except ValueError:
+                return JsonResponse({'error': f'Invalid {param} id'}, status=400)
+
+    # Months are passed as YYYY-MM
+    for param, lookup in (('start', 'month__gte'), ('end', 'month__lte')):
+        value = request.GET.get(param, '')
+        if value:
+            try:
+                terms = terms.filter(**{lookup: datetime.strptime(value, '%Y-%m').date()})
+            except ValueError:
+                return JsonResponse({'error': f'Invalid {param} month, expected YYYY-MM'}, status=400)
+
+    try:
+        limit = min(max(int(request.GET.get('limit', 50)), 1), 200)
+    except ValueError:
+        limit = 50
+
+    term = request.GET.get('term', '').strip().lower()
+    if term:
+        # Drill-down: how one term is spread over months and tutors
+        terms = terms.filter(term=term)
+        by_month = terms.values('month').annotate(count=Sum('count')).order_by('month')
+        by_tutor = terms.values('tutor_id', 'tutor__first_name', 'tutor__last_name').annotate(
+            count=Sum('count')
+        ).order_by('-count')[:limit]
+        return JsonResponse({
+            'term': term,
+            'by_month': [{'month': row['month'].strftime('%Y-%m'), 'count': row['count']} for row in by_month],
+            'by_tutor': [
+                {
+                    'tutor_id': row['tutor_id'],
+                    'tutor': f"{row['tutor__first_name']} {row['tutor__last_name']}".strip(),
+                    'count': row['count'],
+                }
+                for row in by_tutor
+            ],
+        })
+
+    top_terms = terms.values('term').annotate(count=Sum('count')).order_by('-count', 'term')[:limit]
+    return JsonResponse({'terms': list(top_terms)})
+
+
 @login_required
 def manager_analytics(request):
     """Manager analytics view (read-only)"""
@@ -859,89 +943,12 @@ def manager_analytics(request):
 
 @login_required
 def student_dashboard(request):
-    """Student/Tutor dashboard with detailed tracking"""
-    from datetime import timedelta
-    from django.db.models import Sum, Count, Q
-
-    user = request.user
-    now = timezone.now()
-    week_start = now - timedelta(days=now.weekday())
-    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    """Student/Tutor dashboard with detailed tracking
 
-    # Get student profile if exists
-    try:
-        student = Student.objects.get(user=user)
-    except Student.DoesNotExist:
-        student = None
-
-    # 1. Upcoming Sessions (as learner)
-    upcoming_sessions = Session.objects.filter(
-        learner=user,
-        session_date__gte=now,
-        status='Scheduled'
-    ).order_by('session_date')
-
-    upcoming_count = upcoming_sessions.count()
-    upcoming_this_week = upcoming_sessions.filter(
-        session_date__gte=week_start,
-        session_date__lt=week_start + timedelta(days=7)
-    ).count()
-
-    # 2. Registered Courses (from student profile)
-    registered_courses_count = 0
-    if student:
-        # Count courses from the student's year
-        registered_courses_count = Course.objects.filter(
-            year=student.year
-        ).count()
-
-    # 3. Pending Feedback (sessions completed but no feedback submitted)
-    completed_sessions = Session.objects.filter(
-        learner=user,
-        status='Completed'
-    )
-
-    # Get sessions that have feedback
-    sessions_with_feedback = Feedback.objects.filter(
-        learner=user
-    ).values_list('session_id', flat=True)
-
-    # Pending feedback = completed sessions without feedback
-    pending_feedback_count = completed_sessions.exclude(
-        id__in=sessions_with_feedback
-    ).count()
-
-    # 4. Hours Completed (total and this month)
-    total_hours = completed_sessions.aggregate(
-        total=Sum('duration')
-    )['total'] or 0
-    total_hours = total_hours / 60  # Convert minutes to hours
-
-    hours_this_month = completed_sessions.filter(
-        session_date__gte=month_start
-    ).aggregate(
-        total=Sum('duration')
-    )['total'] or 0
-    hours_this_month = hours_this_month / 60  # Convert minutes to hours
-
-    # Recent Sessions (last 5)
-    recent_sessions = Session.objects.filter(
-        Q(learner=user) | Q(tutor=user)
-    ).order_by('-session_date')[:5]
-
-    context = {
-        'upcoming_count': upcoming_count,
-        'upcoming_this_week': upcoming_this_week,
-        'registered_courses_count': registered_courses_count,
-        'pending_feedback_count': pending_feedback_count,
-        'total_hours': round(total_hours, 1),
-        'hours_this_month': round(hours_this_month, 1),
-        'upcoming_sessions': upcoming_sessions[:5],  # Show first 5
-        'recent_sessions': recent_sessions,
-        'student': student,
-    }
-
-    return render(request, 'core/student_dashboard.html', context)
+    Only the page shell is rendered here; every panel is loaded from
+    dashboard_fragment.
+    """
+    return render(request, 'core/student_dashboard.html')
 
 
 @login_required
@@ -952,16 +959,15 @@ def settings_view(request):
         return redirect('dashboard')
     
     if request.method == 'POST':
-        for key in request.POST:
-            if key != 'csrfmiddlewaretoken':
-                config, created = Config.objects.get_or_create(key=key)
-                config.value = request.POST[key]
-                config.save()
-        
-        messages.success(request, 'Settings updated successfully')
+        try:
+            update_settings(request.POST)
+        except ValueError as e:
+            messages.error(request, str(e))
+        else:
+            messages.success(request, 'Settings updated successfully')
         return redirect('settings')
-    
-    configs = {c.key: c.value for c in Config.objects.all()}
+
+    configs = get_settings()
 
     return render(request, 'core/settings.html', {'configs': configs})
 
@@ -1050,14 +1056,15 @@ def delete_evaluation_year(request, year_id):
 # Multi-step Registration Views
 
 @login_required
+@uses_wizard('student_registration')
 def student_registration_start(request):
     """Student registration - Step 1: Personal Information"""
     if request.method == 'POST':
         # Pass the user instance to the form
         form = forms.StudentRegistrationForm(request.POST, instance=request.user, user=request.user)
         if form.is_valid():
-            # Store data in session (use existing user data if not changed)
-            request.session['student_reg_step1'] = {
+            # Store data in the wizard state (use existing user data if not changed)
+            request.wizard['student_reg_step1'] = {
                 'user_id': request.user.id,  # Store user ID to update existing user
                 'email': form.cleaned_data['email'],
                 'first_name': form.cleaned_data['first_name'],
@@ -1074,9 +1081,10 @@ def student_registration_start(request):
 
 
 @login_required
+@uses_wizard('student_registration')
 def student_registration_step2(request):
     """Student registration - Step 2: Program Selection (Pre-filled from user's Student profile)"""
-    if 'student_reg_step1' not in request.session:
+    if 'student_reg_step1' not in request.wizard:
         return redirect('student_registration_start')
 
     # Check if user has a Student profile with program and year
@@ -1095,7 +1103,7 @@ def student_registration_step2(request):
     if request.method == 'POST':
         form = forms.StudentProgramForm(request.POST)
         if form.is_valid():
-            request.session['student_reg_step2'] = {
+            request.wizard['student_reg_step2'] = {
                 'program_id': form.cleaned_data['program'].id,
                 'year_id': form.cleaned_data['year'].id,
             }
@@ -1118,26 +1126,25 @@ def student_registration_step2(request):
 
 
 @login_required
+@uses_wizard('student_registration')
 def student_registration_step3(request):
     """Student registration - Step 3: Course Selection (Cumulative course visibility)"""
-    if 'student_reg_step2' not in request.session:
+    if 'student_reg_step2' not in request.wizard:
         return redirect('student_registration_start')
 
-    year_id = request.session['student_reg_step2']['year_id']
-    program_id = request.session['student_reg_step2']['program_id']
+    year_id = request.wizard['student_reg_step2']['year_id']
+    program_id = request.wizard['student_reg_step2']['program_id']
 
-    # Get year_number for cumulative course visibility
-    year = Year.objects.get(id=year_id)
+    # Program, year and cumulative courses come from the in-process catalog snapshot
+    catalog = get_catalog()
+    program = catalog.program(program_id)
+    year = catalog.year(year_id)
+    if program is None or year is None:
+        return redirect('student_registration_step2')
     year_number = year.year_number
+    courses_count = len(catalog.cumulative_courses(program_id, year_number))
 
-    # Debug: Check if courses exist for this program
-    courses_count = Course.objects.filter(
-        program_id=program_id,
-        year__year_number__lte=year_number
-    ).count()
-    print(f"DEBUG: Year ID: {year_id}, Year Number: {year_number}, Program ID: {program_id}, Cumulative courses: {courses_count}")
-
-    max_selections = int(Config.objects.get(key='maxCourseSelections').value)
+    max_selections = get_setting('maxCourseSelections')
 
     if request.method == 'POST':
         form = forms.StudentCourseSelectionForm(
@@ -1148,14 +1155,14 @@ def student_registration_step3(request):
         )
         if form.is_valid():
             course_ids = [c.id for c in form.cleaned_data['courses']]
-            request.session['student_reg_step3'] = {
+            request.wizard['student_reg_step3'] = {
                 'course_ids': course_ids
             }
             
             # Complete registration
             try:
-                step1 = request.session.get('student_reg_step1')
-                step2 = request.session.get('student_reg_step2')
+                step1 = request.wizard.get('student_reg_step1')
+                step2 = request.wizard.get('student_reg_step2')
 
                 if not step1 or not step2:
                     return JsonResponse({'error': 'Registration data missing. Please start over.'}, status=400)
@@ -1182,27 +1189,35 @@ def student_registration_step3(request):
                         student_id=step1['student_id']
                     )
 
-                # Create or update student profile
-                student, created = Student.objects.update_or_create(
-                    user=user,
-                    defaults={
-                        'program_id': step2['program_id'],
-                        'year_id': step2['year_id'],
-                    }
-                )
+                with transaction.atomic():
+                    # Create or update student profile
+                    student, created = Student.objects.update_or_create(
+                        user=user,
+                        defaults={
+                            'program_id': step2['program_id'],
+                            'year_id': step2['year_id'],
+                        }
+                    )
 
-                # Note: Selected courses are stored in session but not persisted to database
-                # They can be used for matching with tutors or other purposes
+                    # Persist the selected courses (used for tutor matching and demand planning)
+                    StudentCourse.objects.filter(student=student).exclude(course_id__in=course_ids).delete()
+                    StudentCourse.objects.bulk_create(
+                        [
+                            StudentCourse(student=student, course_id=course_id,
+                                          program_id=step2['program_id'], year_id=step2['year_id'])
+                            for course_id in course_ids
+                        ],
+                        update_conflicts=True,
+                        unique_fields=['student', 'course'],
+                        update_fields=['program', 'year'],
+                    )
+                    # bulk_create sends no signals; the dashboard shows the course count
+                    schedule_fragment_invalidation([user.id])
 
                 action = "updated" if not created else "created"
 
-                # Clear session data
-                if 'student_reg_step1' in request.session:
-                    del request.session['student_reg_step1']
-                if 'student_reg_step2' in request.session:
-                    del request.session['student_reg_step2']
-                if 'student_reg_step3' in request.session:
-                    del request.session['student_reg_step3']
+                # Clear wizard state
+                request.wizard.clear()
 
                 messages.success(request, f'Student profile {action} successfully! Welcome to the PAL Program.')
                 return JsonResponse({
@@ -1225,18 +1240,6 @@ def student_registration_step3(request):
         max_selections=max_selections
     )
 
-    # Get program and year info for display
-    try:
-        program = Program.objects.get(id=program_id)
-        # year already fetched above
-
-        # Debug: Print form queryset
-        print(f"DEBUG: Form queryset count: {form.fields['courses'].queryset.count()}")
-        print(f"DEBUG: Form queryset: {list(form.fields['courses'].queryset.values_list('code', 'name', 'year__year_number'))}")
-    except Exception as e:
-        print(f"DEBUG ERROR: {e}")
-        program = None
-
     return render(request, 'core/student_registration_step3.html', {
         'form': form,
         'max_selections': max_selections,
@@ -1248,6 +1251,11 @@ def student_registration_step3(request):
     })
 
 
+# Step 2 holds the GPA and motivation statement, which stay server-side
+TUTOR_WIZARD_PRIVATE = ('tutor_reg_step2',)
+
+
+@uses_wizard('tutor_registration', private=TUTOR_WIZARD_PRIVATE)
 def tutor_registration_start(request):
     """Tutor registration - Step 1: Personal and Interest Information (PAL Action Plan v2)"""
     # Pre-fill form with logged-in user data
@@ -1270,8 +1278,8 @@ def tutor_registration_start(request):
                     'message': 'We thank you for your feedback.'
                 })
 
-            # Store step 1 data in session
-            request.session['tutor_reg_step1'] = {
+            # Store step 1 data in the wizard state
+            request.wizard['tutor_reg_step1'] = {
                 'name': form.cleaned_data['name'],
                 'student_id': form.cleaned_data['student_id'],
                 'email': form.cleaned_data['email'],
@@ -1293,9 +1301,10 @@ def tutor_registration_start(request):
     })
 
 
+@uses_wizard('tutor_registration', private=TUTOR_WIZARD_PRIVATE)
 def tutor_registration_step2(request):
     """Tutor registration - Step 2: Academic Details (PAL Action Plan v2)"""
-    if 'tutor_reg_step1' not in request.session:
+    if 'tutor_reg_step1' not in request.wizard:
         return redirect('tutor_registration_start')
 
     # Pre-fill form with student profile data if available
@@ -1322,12 +1331,7 @@ def tutor_registration_step2(request):
             # Validate GPA against minimum requirement (only if provided)
             gpa = form.cleaned_data.get('gpa')
             if gpa is not None:
-                try:
-                    min_gpa_config = Config.objects.get(key='minGpaForTutor')
-                    min_gpa = float(min_gpa_config.value)
-                except (Config.DoesNotExist, ValueError):
-                    min_gpa = 3.0  # Default minimum GPA
-
+                min_gpa = get_setting('minGpaForTutor')
                 if gpa < min_gpa:
                     return JsonResponse({
                         'error': f'Minimum GPA of {min_gpa} required to become a tutor'
@@ -1344,8 +1348,8 @@ def tutor_registration_step2(request):
             preferred_days = request.POST.getlist('preferred_days')
             preferred_times = request.POST.getlist('preferred_times')
 
-            # Store step 2 data in session
-            request.session['tutor_reg_step2'] = {
+            # Store step 2 data in the wizard state
+            request.wizard['tutor_reg_step2'] = {
                 'program_id': form.cleaned_data['program'].id,
                 'year_id': form.cleaned_data['year'].id,
                 'year_number': form.cleaned_data['year'].year_number,
@@ -1372,12 +1376,13 @@ def tutor_registration_step2(request):
     })
 
 
+@uses_wizard('tutor_registration', private=TUTOR_WIZARD_PRIVATE)
 def tutor_registration_step3(request):
     """Tutor registration - Step 3: Course Selection (PAL Action Plan v2)"""
-    if 'tutor_reg_step2' not in request.session:
+    if 'tutor_reg_step2' not in request.wizard:
         return redirect('tutor_registration_start')
 
-    step2 = request.session['tutor_reg_step2']
+    step2 = request.wizard['tutor_reg_step2']
     program_id = step2['program_id']
     year_number = step2['year_number']
 
@@ -1404,7 +1409,7 @@ def tutor_registration_step3(request):
             # Save application
             try:
                 with transaction.atomic():
-                    step1 = request.session['tutor_reg_step1']
+                    step1 = request.wizard['tutor_reg_step1']
                     print(f"DEBUG Step3: Step1 data: {step1}")
 
                     # Check if user exists or create new one
@@ -1450,9 +1455,8 @@ def tutor_registration_step3(request):
                     # Add courses (exactly 3)
                     tutor_app.courses.set([c.id for c in courses])
 
-                    # Clear session data
-                    del request.session['tutor_reg_step1']
-                    del request.session['tutor_reg_step2']
+                    # Clear wizard state
+                    request.wizard.clear()
 
                     return JsonResponse({
                         'success': True,
@@ -1474,14 +1478,15 @@ def tutor_registration_step3(request):
     )
 
     # Get program and year for display
-    program = Program.objects.get(id=program_id)
-    year = Year.objects.get(id=step2['year_id'])
+    catalog = get_catalog()
+    program = catalog.program(program_id)
+    year = catalog.year(step2['year_id'])
 
     return render(request, 'core/tutor_registration_step3.html', {
         'form': form,
         'program': program,
         'year': year,
-        'step1': request.session['tutor_reg_step1'],
+        'step1': request.wizard['tutor_reg_step1'],
         'step2': step2
     })
 
@@ -1733,56 +1738,117 @@ def export_feedback_excel(request):
     return response
 
 
+# Session history rows served per HTMX request on the enhanced dashboard
+SESSION_HISTORY_PAGE_SIZE = 20
+
+# Days of recurring occurrences listed on the tutor dashboard
+SERIES_PANEL_DAYS = 14
+
+
 @login_required
 def enhanced_student_dashboard(request):
-    """Enhanced student dashboard with sessions and feedback"""
+    """Enhanced student dashboard with sessions and feedback
+
+    Counters are loaded from dashboard_fragment and the session history
+    table page by page from session_history.
+    """
+    feed_path = reverse('calendar_feed', args=[feed_token(request.user)])
+    return render(request, 'core/enhanced_student_dashboard.html', {
+        'calendar_feed_url': request.build_absolute_uri(feed_path),
+    })
+
+
+def calendar_feed_etag(request, token):
+    user_id = feed_user_id(token)
+    return feed_etag(user_id) if user_id else None
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=calendar_feed_etag)
+def calendar_feed(request, token):
+    """ICS feed of the user's sessions for calendar clients, authenticated by the signed token in the URL
+
+    Polls with a current ETag get a 304 before this view runs.
+    """
+    user_id = feed_user_id(token)
+    if user_id is None:
+        raise Http404('Unknown calendar feed')
+    response = StreamingHttpResponse(stream_feed(user_id, request.get_host()),
+                                     content_type='text/calendar; charset=utf-8')
+    response['Content-Disposition'] = 'inline; filename="pal-sessions.ics"'
+    return response
+
+
+@login_required
+@require_POST
+def reset_calendar_feed(request):
+    """Issue a new calendar link, revoking the old one"""
+    rotate_feed_key(request.user)
+    messages.success(request, 'Your calendar link has been reset. Subscribe again with the new link.')
+    return redirect('enhanced_student_dashboard')
+
+
+@login_required
+def session_history(request):
+    """HTMX endpoint: one page of the user's session history for the enhanced dashboard"""
     user = request.user
-    
-    if user.role == 'Student':
-        # Get student profile
-        try:
-            student = user.student_profile
-        except:
-            student = None
-        
-        # Get sessions as learner
-        sessions = Session.objects.filter(learner=user).select_related('tutor', 'course')
-        
-        # Get pending feedback
-        pending_feedback = sessions.filter(status='Completed').exclude(
-            id__in=Feedback.objects.values_list('session_id', flat=True)
+
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    offset = (page - 1) * SESSION_HISTORY_PAGE_SIZE
+
+    if user.role == 'Tutor':
+        sessions = Session.objects.filter(tutor=user).select_related('learner', 'course').only(
+            'session_date', 'duration', 'status',
+            'learner__first_name', 'learner__last_name', 'course__code',
         )
-        
-        context = {
-            'student': student,
-            'sessions': sessions,
-            'pending_feedback': pending_feedback,
-            'upcoming_sessions': sessions.filter(status='Scheduled').order_by('session_date')[:5],
-            'completed_sessions': sessions.filter(status='Completed').count(),
-        }
-        
-    elif user.role == 'Tutor':
-        # Get tutor applications
-        tutor_apps = TutorApplication.objects.filter(user=user).prefetch_related('courses')
-        approved_apps = tutor_apps.filter(status='Approved')
-        
-        # Get sessions as tutor
-        sessions = Session.objects.filter(tutor=user).select_related('learner', 'course')
-        
-        context = {
-            'tutor_apps': tutor_apps,
-            'approved_apps': approved_apps,
-            'sessions': sessions,
-            'upcoming_sessions': sessions.filter(status='Scheduled').order_by('session_date')[:5],
-            'total_hours': sessions.filter(status='Completed').aggregate(
-                total=Sum('duration')
-            )['total'] or 0,
-            'total_sessions': sessions.filter(status='Completed').count(),
-        }
     else:
-        context = {}
-    
-    return render(request, 'core/enhanced_student_dashboard.html', context)
+        # Pending feedback is a NOT EXISTS over this learner's own feedback only
+        sessions = Session.objects.filter(learner=user).select_related('tutor', 'course').only(
+            'session_date', 'status',
+            'tutor__first_name', 'tutor__last_name', 'course__code',
+        ).annotate(
+            has_feedback=Exists(Feedback.objects.filter(learner=user, session=OuterRef('pk')))
+        )
+
+    # Fetch one extra row to know whether another page exists, instead of a COUNT
+    rows = list(sessions.order_by('-session_date', '-id')[offset:offset + SESSION_HISTORY_PAGE_SIZE + 1])
+
+    return render(request, 'core/partials/session_history_rows.html', {
+        'sessions': rows[:SESSION_HISTORY_PAGE_SIZE],
+        'next_page': page + 1 if len(rows) > SESSION_HISTORY_PAGE_SIZE else None,
+        'is_tutor': user.role == 'Tutor',
+        'is_first_page': page == 1,
+    })
+
+
+@login_required
+def dashboard_fragment(request, dashboard, panel):
+    """HTMX endpoint: one cached dashboard panel
+
+    Panels are cached per user (admin panels once for all admins) and
+    invalidated by the Session/Feedback signals.
+    """
+    try:
+        template_name, build_context = DASHBOARD_FRAGMENTS[(dashboard, panel)]
+    except KeyError:
+        raise Http404('Unknown dashboard panel')
+
+    if dashboard == 'admin':
+        if request.user.role != 'Admin':
+            return HttpResponse(status=403)
+        scope = GLOBAL_SCOPE
+    else:
+        scope = str(request.user.pk)
+
+    html = render_fragment(
+        request, f'{dashboard}:{panel}', template_name, lambda: build_context(request.user), scope
+    )
+    response = HttpResponse(html)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 @login_required
@@ -1794,10 +1860,14 @@ def create_session(request):
     
     if request.method == 'POST':
         form = forms.SessionCreateForm(request.POST, tutor=request.user)
-        if form.is_valid():
-            session = form.save(commit=False)
-            session.tutor = request.user
-            session.save()
+        with transaction.atomic():
+            # Validate under the tutor's lock so concurrent bookings see each other
+            lock_tutor(request.user.pk)
+            booking = form.book() if form.is_valid() else None
+        if isinstance(booking, SessionSeries):
+            messages.success(request, f'Recurring sessions created until {booking.end_date:%d %b %Y}!')
+            return redirect('enhanced_student_dashboard')
+        if booking is not None:
             messages.success(request, 'Session created successfully!')
             return redirect('enhanced_student_dashboard')
     else:
@@ -1806,6 +1876,50 @@ def create_session(request):
     return render(request, 'core/create_session.html', {'form': form})
 
 
+@login_required
+def series_occurrences(request):
+    """HTMX endpoint: the tutor's recurring occurrences of the next two weeks, with complete/skip actions"""
+    if request.user.role != 'Tutor':
+        return HttpResponse(status=403)
+    return render(request, 'core/partials/series_occurrences.html', {
+        'occurrences': upcoming_occurrences(request.user, days=SERIES_PANEL_DAYS, role='tutor'),
+    })
+
+
+def _series_occurrence(request, series_id, occurrence_date):
+    series = get_object_or_404(SessionSeries, id=series_id, tutor=request.user)
+    try:
+        day = date.fromisoformat(occurrence_date)
+    except ValueError:
+        raise Http404('Invalid date')
+    if not series.is_occurrence(day):
+        raise Http404('Not an occurrence of this series')
+    return series, day
+
+
+@login_required
+@require_POST
+def complete_occurrence(request, series_id, occurrence_date):
+    """Record one occurrence of a series as a completed session, so the learner can give feedback"""
+    series, day = _series_occurrence(request, series_id, occurrence_date)
+    materialize(series, day, status='Completed')
+    messages.success(request, f'Session on {day:%d %b %Y} marked as completed!')
+    return redirect('enhanced_student_dashboard')
+
+
+@login_required
+@require_POST
+def skip_occurrence_view(request, series_id, occurrence_date):
+    """Cancel one occurrence of a series without touching the others"""
+    series, day = _series_occurrence(request, series_id, occurrence_date)
+    if series.sessions.filter(occurrence_date=day).exists():
+        messages.error(request, 'This session has already been recorded')
+    else:
+        skip_occurrence(series, day)
+        messages.success(request, f'Session on {day:%d %b %Y} skipped')
+    return redirect('enhanced_student_dashboard')
+
+
 @login_required
 def submit_feedback(request, session_id):
     """Submit feedback for a completed session"""
@@ -1876,6 +1990,8 @@ def learner_feedback_submit(request):
 
 
 @login_required
+@cache_control(private=True, max_age=CATALOG_MAX_AGE)
+@condition(etag_func=tutor_years_etag)
 def get_years_for_program(request):
     """AJAX endpoint to get years for a selected program
 
@@ -1884,17 +2000,151 @@ def get_years_for_program(request):
     """
     program_id = request.GET.get('program_id')
     if program_id:
-        # Check if user has a student profile to filter years
-        try:
-            student_profile = request.user.student_profile
-            # Only return years below student's current year
-            years = Year.objects.filter(
-                program_id=program_id,
-                year_number__lt=student_profile.year.year_number
-            ).values('id', 'name', 'year_number').order_by('year_number')
-        except Student.DoesNotExist:
-            # No student profile, return all years for the program
-            years = Year.objects.filter(program_id=program_id).values('id', 'name', 'year_number').order_by('year_number')
+        # Only return years below the student's current year (all years without a profile)
+        years = [
+            {'id': year.id, 'name': year.name, 'year_number': year.year_number}
+            for year in get_catalog().years_for_program(program_id, below=tutor_year_limit(request))
+        ]
 
-        return JsonResponse({'years': list(years)})
+        return JsonResponse({'years': years})
     return JsonResponse({'years': []})
+
+
+@login_required
+def tutor_matches(request):
+    """JSON endpoint: best available tutors for a course
+
+    Learners get matches for themselves; admins and managers may pass
+    ``learner_id``. Optional ``days``, ``times`` (comma-separated) and
+    ``mode`` describe the learner's preferences.
+    """
+    course = get_catalog().course(request.GET.get('course_id'))
+    if course is None:
+        return JsonResponse({'error': 'Unknown course'}, status=400)
+
+    learner = request.user
+    if request.GET.get('learner_id') and request.user.role in ['Admin', 'Manager']:
+        try:
+            learner = User.objects.filter(pk=int(request.GET['learner_id'])).first()
+        except ValueError:
+            learner = None
+        if learner is None:
+            return JsonResponse({'error': 'Unknown learner'}, status=400)
+
+    try:
+        limit = min(max(int(request.GET.get('limit', DEFAULT_LIMIT)), 1), 50)
+    except ValueError:
+        limit = DEFAULT_LIMIT
+
+    matches = find_tutors(
+        course,
+        learner=learner if learner.role == 'Student' else None,
+        days=[d.strip() for d in request.GET.get('days', '').split(',') if d.strip()],
+        times=[t.strip() for t in request.GET.get('times', '').split(',') if t.strip()],
+        mode=request.GET.get('mode', ''),
+        limit=limit,
+    )
+    return JsonResponse({'course_id': course.id, 'tutors': [match.as_dict() for match in matches]})
+
+
+@login_required
+@cache_control(private=True, max_age=CATALOG_MAX_AGE)
+def tutor_search(request):
+    """JSON typeahead: eligible tutors whose name starts with ``q`` (at most ``limit``)
+
+    Learners only see the tutors they could pick on the feedback form.
+    """
+    try:
+        limit = min(max(int(request.GET.get('limit', TUTOR_SEARCH_LIMIT)), 1), 50)
+    except ValueError:
+        limit = TUTOR_SEARCH_LIMIT
+    tutors = get_directory().search(request.GET.get('q', ''), *learner_scope(request.user), limit=limit)
+    return JsonResponse({'tutors': [tutor.as_dict() for tutor in tutors]})
+
+
+@login_required
+def learner_search(request):
+    """JSON typeahead for tutors: learners in the tutor's courses, in their year or earlier ones
+
+    ``q`` matches the start of a first name, last name or student ID; an
+    optional ``course_id`` narrows the search to one course.
+    """
+    if request.user.role != 'Tutor':
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    try:
+        course_id = int(request.GET['course_id'])
+    except (KeyError, ValueError):
+        course_id = None
+    learners = search_learners(teaching_scope(request.user), request.GET.get('q', ''), course_id=course_id)
+    return JsonResponse({'learners': learners})
+
+
+@login_required
+def tutor_weekly_load(request):
+    """JSON endpoint: sessions booked per approved tutor in a week (Admin/Manager only)
+
+    ``week`` is any date in the week (default: this week). Loads come from the
+    weekly counters, so the cost does not grow with the number of sessions.
+    """
+    if request.user.role not in ['Admin', 'Manager']:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+
+    try:
+        day = date.fromisoformat(request.GET['week'])
+    except KeyError:
+        day = timezone.localdate()
+    except ValueError:
+        return JsonResponse({'error': 'Invalid week'}, status=400)
+    week_start = week_of(day)
+
+    tutors = TutorApplication.objects.filter(status='Approved', user__is_active=True).values(
+        'user_id', 'user__first_name', 'user__last_name'
+    ).annotate(capacity=Max('max_sessions_per_week')).order_by('user__first_name', 'user__last_name')
+    tutors = list(tutors)
+    loads = weekly_loads([tutor['user_id'] for tutor in tutors], week_start)
+
+    rows = []
+    for tutor in tutors:
+        sessions = loads.get(tutor['user_id'], 0)
+        capacity = tutor['capacity']
+        rows.append({
+            'tutor_id': tutor['user_id'],
+            'name': f"{tutor['user__first_name']} {tutor['user__last_name']}".strip(),
+            'sessions': sessions,
+            'max_sessions_per_week': capacity,
+            'remaining': max(capacity - sessions, 0) if capacity else None,
+        })
+    return JsonResponse({'week_start': week_start.isoformat(), 'tutors': rows})
+
+
+@login_required
+@cache_control(private=True, max_age=CATALOG_MAX_AGE)
+@condition(etag_func=catalog_etag)
+def get_courses_for_program(request):
+    """AJAX endpoint to get the courses of a program
+
+    With ``year_number`` only courses from Year 1 up to and including that year
+    are returned (cumulative course visibility).
+    """
+    catalog = get_catalog()
+    program_id = request.GET.get('program_id')
+    try:
+        year_number = int(request.GET['year_number'])
+    except (KeyError, ValueError):
+        year_number = None
+
+    if year_number is None:
+        courses = catalog.program_courses(program_id)
+    else:
+        courses = catalog.cumulative_courses(program_id, year_number)
+
+    return JsonResponse({'courses': [
+        {
+            'id': course.id,
+            'code': course.code,
+            'name': course.name,
+            'year_id': course.year.id,
+            'year_number': course.year.year_number,
+        }
+        for course in courses
+    ]})
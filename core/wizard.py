@@ -0,0 +1,119 @@
+"""Registration wizard state kept in a signed cookie instead of the session table
+
+Each wizard step only reads and writes a signed, compressed cookie, so a
+registration touches the database once, when the final step commits. State
+that outgrows a cookie is moved to the cache and the cookie keeps a signed
+pointer to it. Signed cookies are readable by the visitor, so a wizard can
+name private keys (grades, personal statements) whose state never leaves the
+server: while one of them is set the whole state lives in the cache.
+"""
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+# Abandoned registrations expire after a day
+WIZARD_MAX_AGE = 60 * 60 * 24
+
+# Browsers reject cookies above ~4KB (name and attributes included)
+MAX_COOKIE_VALUE = 3500
+
+COOKIE_PATH = '/register/'
+
+
+class WizardState:
+    """Dict-like state of one wizard for the current visitor
+
+    The signature is salted with the user id, so a cookie cannot be replayed
+    by another account. Keys listed in ``private`` are only ever stored in the
+    cache.
+    """
+
+    def __init__(self, request, name, private=()):
+        self.cookie_name = f'wizard_{name}'
+        self.salt = f'core.wizard.{name}.{request.user.pk or "anonymous"}'
+        self.private = frozenset(private)
+        self.modified = False
+        self._cache_key = None
+        self._data = self._load(request.COOKIES.get(self.cookie_name))
+
+    def _load(self, value):
+        if not value:
+            return {}
+        try:
+            payload = signing.loads(value, salt=self.salt, max_age=WIZARD_MAX_AGE)
+        except signing.BadSignature:
+            # Tampered, expired or signed for another user: start over
+            self.modified = True
+            return {}
+        if 'cache' in payload:
+            self._cache_key = payload['cache']
+            data = cache.get(self._cache_key)
+            if data is None:
+                self.modified = True
+                return {}
+            return data
+        return payload.get('data', {})
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self._data[key]
+        self.modified = True
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def clear(self):
+        self._data = {}
+        self.modified = True
+
+    def save(self, response):
+        """Write the state to ``response`` if it changed during the request"""
+        if not self.modified:
+            return
+        if self._cache_key:
+            cache.delete(self._cache_key)
+            self._cache_key = None
+        if not self._data:
+            response.delete_cookie(self.cookie_name, path=COOKIE_PATH)
+            return
+
+        value = None
+        if not self.private.intersection(self._data):
+            value = signing.dumps({'data': self._data}, salt=self.salt, compress=True)
+        if value is None or len(value) > MAX_COOKIE_VALUE:
+            self._cache_key = f'wizard:{uuid.uuid4().hex}'
+            cache.set(self._cache_key, self._data, WIZARD_MAX_AGE)
+            value = signing.dumps({'cache': self._cache_key}, salt=self.salt)
+        response.set_cookie(
+            self.cookie_name, value,
+            max_age=WIZARD_MAX_AGE,
+            path=COOKIE_PATH,
+            secure=settings.SESSION_COOKIE_SECURE,
+            httponly=True,
+            samesite='Lax',
+        )
+
+
+def uses_wizard(name, private=()):
+    """View decorator exposing the named wizard's state as ``request.wizard``"""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            request.wizard = WizardState(request, name, private)
+            response = view(request, *args, **kwargs)
+            request.wizard.save(response)
+            return response
+        return wrapped
+    return decorator
@@ -0,0 +1,114 @@
+"""Per-tutor, per-week session counters
+
+``TutorWeeklyLoad`` holds the number of non-cancelled sessions each tutor has
+in each ISO week. Session signals keep it current with atomic ``F()``
+updates, so enforcing ``max_sessions_per_week`` reads one row instead of
+counting sessions. Occurrences of recurring series are not rows until they
+are completed, so a series adds each of its occurrences to the counts when
+it is booked; skipping a date, editing or deleting the series takes them out
+again, and a completed occurrence keeps its place as a session row.
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.db.models import F, Max
+from django.utils import timezone
+
+
+def week_of(value):
+    """Monday (a date) of the ISO week an aware datetime or date falls in"""
+    if hasattr(value, 'tzinfo'):
+        value = timezone.localdate(value)
+    return value - timedelta(days=value.weekday())
+
+
+def _weeks_range(first_week, last_week):
+    start = timezone.make_aware(datetime.combine(first_week, time.min))
+    end = timezone.make_aware(datetime.combine(last_week + timedelta(days=7), time.min))
+    return start, end
+
+
+def bump_load(tutor_id, week_start, delta):
+    """Add ``delta`` to a tutor's count for one week, creating the row when needed"""
+    from .models import TutorWeeklyLoad
+
+    if not tutor_id or not delta:
+        return
+    bucket = TutorWeeklyLoad.objects.filter(tutor_id=tutor_id, week_start=week_start)
+    if bucket.update(sessions=F('sessions') + delta) or delta < 0:
+        return
+    TutorWeeklyLoad.objects.get_or_create(tutor_id=tutor_id, week_start=week_start)
+    bucket.update(sessions=F('sessions') + delta)
+
+
+def series_loads(series):
+    """Counter of (tutor id, week start) -> occurrences of a saved series not recorded as sessions"""
+    from .series import expand
+
+    start, end = _weeks_range(week_of(series.start_date), week_of(series.end_date))
+    return Counter((series.tutor_id, week_of(occurrence.session_date))
+                   for occurrence in expand([series], start, end))
+
+
+def tutor_loads(tutor_id, week_starts):
+    """Dict of week start -> sessions the tutor has that week, series occurrences included"""
+    from .models import TutorWeeklyLoad
+
+    weeks = set(week_starts)
+    counted = dict(TutorWeeklyLoad.objects.filter(tutor_id=tutor_id, week_start__in=weeks).values_list(
+        'week_start', 'sessions'
+    )) if weeks else {}
+    return {week: counted.get(week, 0) for week in weeks}
+
+
+def tutor_load(tutor_id, week_start):
+    """Sessions the tutor has in the week starting ``week_start``"""
+    return tutor_loads(tutor_id, [week_start])[week_start]
+
+
+def weekly_loads(tutor_ids, week_start):
+    """Dict of tutor id -> sessions in the week starting ``week_start``"""
+    from .models import TutorWeeklyLoad
+
+    return dict(TutorWeeklyLoad.objects.filter(
+        tutor_id__in=tutor_ids, week_start=week_start
+    ).values_list('tutor_id', 'sessions'))
+
+
+def reserve_load(tutor_id, week_start, capacity):
+    """Count one more session in the tutor's week unless the week is full; returns whether it was counted
+
+    The check and the increment are one conditional UPDATE, so concurrent
+    bookings cannot both take the last place. The session saved afterwards
+    must carry ``_reserved_week`` (a series ``_reserved_loads``) so its signal
+    does not count it again.
+    """
+    from .models import TutorWeeklyLoad
+
+    TutorWeeklyLoad.objects.get_or_create(tutor_id=tutor_id, week_start=week_start)
+    return bool(TutorWeeklyLoad.objects.filter(
+        tutor_id=tutor_id, week_start=week_start, sessions__lt=capacity,
+    ).update(sessions=F('sessions') + 1))
+
+
+def lock_tutor(tutor_id):
+    """Hold the tutor's row until the transaction ends, so one booking of theirs is checked at a time"""
+    from .models import User
+
+    User.objects.select_for_update().filter(pk=tutor_id).values_list('pk', flat=True).first()
+
+
+def weekly_capacity(tutor_id):
+    """Highest ``max_sessions_per_week`` of the tutor's approved applications (None when unlimited)"""
+    from .models import TutorApplication
+
+    return TutorApplication.objects.filter(user_id=tutor_id, status='Approved').aggregate(
+        capacity=Max('max_sessions_per_week')
+    )['capacity']
+
+
+def counted_week(tutor_id, session_date, status):
+    """(tutor id, week) a session counts towards, or None for cancelled sessions"""
+    if status == 'Cancelled' or not tutor_id or session_date is None:
+        return None
+    return tutor_id, week_of(session_date)